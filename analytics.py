@@ -1,5 +1,15 @@
+import bisect
+import numpy as np
 import pandas as pd
 from datetime import datetime
+import instrumentation
+import timeseries
+
+MULTIPLIER = 100
+
+def _num(value):
+    """float() that maps missing values (None, NaN, pd.NA) to NaN."""
+    return float('nan') if pd.isna(value) else float(value)
 
 def calculate_trade_metrics(trade_row, exit_data):
     """
@@ -13,18 +23,15 @@ def calculate_trade_metrics(trade_row, exit_data):
     
     # Extract Entry Data
     entry_date = pd.to_datetime(trade_row['Entry_Date'])
-    lots = float(trade_row['Lots'])
-    spread_entry_price = float(trade_row['Spread_Entry_Price'])
-    credit_received = float(trade_row['Credit_Received'])
-    max_loss = float(trade_row['Max_Loss'])
-    margin_used = float(trade_row['Margin_Used'])
+    lots = _num(trade_row['Lots'])
+    spread_entry_price = _num(trade_row['Spread_Entry_Price'])
+    credit_received = _num(trade_row['Credit_Received'])
+    max_loss = _num(trade_row['Max_Loss'])
+    margin_used = _num(trade_row['Margin_Used'])
     
     # Extract Exit Data
     exit_date = pd.to_datetime(exit_data['Exit_Date'])
-    spread_exit_price = float(exit_data['Spread_Exit_Price'])
-    
-    # Constants
-    MULTIPLIER = 100
+    spread_exit_price = _num(exit_data['Spread_Exit_Price'])
     
     # Calculations
     days_in_trade = (exit_date - entry_date).days
@@ -86,6 +93,65 @@ def calculate_trade_metrics(trade_row, exit_data):
         "Rule_Violation_Flag": rule_violation_flag
     }
 
+def _safe_divide(numerator, denominator):
+    """Elementwise numerator / denominator, 0.0 where the denominator is 0 (same as the scalar checks)."""
+    out = np.zeros(len(numerator), dtype=float)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+def calculate_trade_metrics_batch(df_entries, df_exits):
+    """
+    Vectorized calculate_trade_metrics for many trades at once.
+    
+    df_entries: DataFrame of entry data (same fields as trade_row).
+    df_exits: DataFrame with Exit_Date and Spread_Exit_Price; row i is the
+              exit for row i of df_entries.
+    
+    Returns: DataFrame of calculated metrics (same keys as calculate_trade_metrics),
+             indexed like df_entries.
+    """
+    if len(df_entries) != len(df_exits):
+        raise ValueError("df_entries and df_exits must have the same number of rows.")
+    
+    def col(df, name):
+        return pd.to_numeric(df[name], errors='raise').to_numpy(dtype=float, na_value=np.nan)
+    
+    # Extract Entry Data
+    entry_date = pd.to_datetime(df_entries['Entry_Date']).to_numpy()
+    lots = col(df_entries, 'Lots')
+    spread_entry_price = col(df_entries, 'Spread_Entry_Price')
+    credit_received = col(df_entries, 'Credit_Received')
+    max_loss = col(df_entries, 'Max_Loss')
+    margin_used = col(df_entries, 'Margin_Used')
+    
+    # Extract Exit Data
+    exit_date = pd.to_datetime(df_exits['Exit_Date']).to_numpy()
+    spread_exit_price = col(df_exits, 'Spread_Exit_Price')
+    
+    # Calculations (same formulas, in the same order, as calculate_trade_metrics)
+    days_in_trade = pd.TimedeltaIndex(exit_date - entry_date).days
+    realized_pnl = (spread_entry_price - spread_exit_price) * lots * MULTIPLIER
+    win_loss = np.where(realized_pnl > 0, "Win", "Loss")
+    return_on_margin = _safe_divide(realized_pnl, margin_used) * 100
+    yield_per_trade = _safe_divide(realized_pnl, margin_used)
+    max_profit = credit_received * lots * MULTIPLIER
+    exit_efficiency = _safe_divide(realized_pnl, max_profit) * 100
+    risk_utilization = _safe_divide(np.abs(realized_pnl), max_loss) * 100
+    rule_violation_flag = (risk_utilization > 60).astype(int)
+    
+    return pd.DataFrame({
+        "Days_in_Trade": days_in_trade,
+        "Multiplier": MULTIPLIER,
+        "Realized_PnL": realized_pnl,
+        "Win_Loss": win_loss,
+        "Return_on_Margin_%": return_on_margin,
+        "Yield_per_Trade": yield_per_trade,
+        "Max_Profit": max_profit,
+        "Exit_Efficiency_%": exit_efficiency,
+        "Risk_Utilization_%": risk_utilization,
+        "Rule_Violation_Flag": rule_violation_flag
+    }, index=df_entries.index)
+
 def calculate_portfolio_metrics(df_closed):
     """
     Calculates portfolio-level analytics for closed trades.
@@ -104,6 +170,9 @@ def calculate_portfolio_metrics(df_closed):
             "Total_Trades": 0
         }
         
+    # Work on plain floats (nullable Float64 columns can't be used as masks when they hold NA)
+    df_closed = df_closed.assign(Realized_PnL=pd.to_numeric(df_closed['Realized_PnL']).astype(float))
+    
     # Cumulative PnL
     cumulative_pnl = df_closed['Realized_PnL'].sum()
     
@@ -148,3 +217,238 @@ def calculate_portfolio_metrics(df_closed):
         "Win_Rate": win_rate * 100, # Percentage
         "Total_Trades": total_trades
     }
+
+# Default rolling windows: trade counts, or day spans as strings
+ROLLING_WINDOWS = (20, 50, 100, "30D", "90D")
+
+# Columns rolling_metrics needs from the journal
+ROLLING_COLUMNS = ['Exit_Date', 'Realized_PnL', 'Risk_Utilization_%', 'Rule_Violation_Flag']
+
+def rolling_metrics(df_closed, windows=ROLLING_WINDOWS):
+    """
+    Rolling win rate, expectancy, average Risk_Utilization_% and
+    Rule_Violation_Flag rate over closed trades, for every trade at once.
+    
+    df_closed: DataFrame of closed trades (at least ROLLING_COLUMNS).
+    windows: ints are the last N trades (NaN until N trades have closed);
+             strings like "30D" are the trades that exited in the last 30
+             days up to and including each trade's Exit_Date.
+    
+    Returns: DataFrame in Exit_Date order (same-day trades keep their order),
+             indexed like df_closed, with Exit_Date and one column per window
+             and metric: Win_Rate_20, Expectancy_20, Risk_Utilization_20,
+             Violation_Rate_20, Win_Rate_30D, ...
+    
+    Each window is a difference of running totals, so the whole history
+    costs O(n) per window instead of a calculate_portfolio_metrics call per
+    trade. Wins, losses and Expectancy follow calculate_portfolio_metrics
+    (a missing PnL counts as a trade that is neither).
+    """
+    dates = pd.to_datetime(df_closed['Exit_Date']).to_numpy(dtype='datetime64[ns]')
+    order = np.argsort(dates, kind='stable')
+    dates = dates[order]
+    
+    def col(name):
+        return pd.to_numeric(df_closed[name], errors='coerce').to_numpy(dtype=float, na_value=np.nan)[order]
+    
+    def running(values):
+        # Leading 0, so the total over trades [start, end) is total[end] - total[start]
+        return np.concatenate([[0.0], np.cumsum(values, dtype=float)])
+    
+    pnl = col('Realized_PnL')
+    risk = col('Risk_Utilization_%')
+    flag = col('Rule_Violation_Flag')
+    trade_count = np.arange(len(dates) + 1, dtype=float)
+    wins = running(pnl > 0)
+    pnl_sum = running(np.nan_to_num(pnl))
+    risk_sum, risk_count = running(np.nan_to_num(risk)), running(~np.isnan(risk))
+    flag_sum, flag_count = running(np.nan_to_num(flag)), running(~np.isnan(flag))
+    
+    end = np.arange(1, len(dates) + 1)
+    out = {'Exit_Date': dates}
+    for window in windows:
+        if isinstance(window, str):
+            start = np.searchsorted(dates, dates - pd.Timedelta(window).to_timedelta64(), side='right')
+            full = np.ones(len(dates), dtype=bool)
+        else:
+            start = np.maximum(end - window, 0)
+            full = end >= window
+        
+        def ratio(total, count):
+            n = count[end] - count[start]
+            result = np.full(len(dates), np.nan)
+            np.divide(total[end] - total[start], n, out=result, where=full & (n > 0))
+            return result
+        
+        out[f'Win_Rate_{window}'] = ratio(wins, trade_count) * 100
+        out[f'Expectancy_{window}'] = ratio(pnl_sum, trade_count)
+        out[f'Risk_Utilization_{window}'] = ratio(risk_sum, risk_count)
+        out[f'Violation_Rate_{window}'] = ratio(flag_sum, flag_count) * 100
+    
+    return pd.DataFrame(out, index=df_closed.index[order])
+
+class PortfolioAccumulator:
+    """
+    Running version of calculate_portfolio_metrics.
+    
+    Closed trades are folded in one at a time with add_trade(), which is
+    O(1) amortized as long as trades arrive in Exit_Date order (the usual
+    case: you close today's trade after yesterday's). A trade closed out of
+    order is inserted in its place and the running state is rebuilt.
+    
+    Trades with the same Exit_Date keep the order they were added in.
+    """
+    
+    # Running totals kept alongside the lists (see _reset_totals)
+    _TOTALS = ("cumulative_pnl", "peak", "drawdown", "max_drawdown", "win_count", "win_sum", "loss_count", "loss_sum")
+    
+    def __init__(self):
+        self._dates = []   # sorted exit dates, as int64 nanoseconds (cheap to restore from an array)
+        self._pnls = []    # Realized_PnL, same order as _dates
+        self._equity = []  # cumulative PnL after each trade
+        self.rebuilds = 0
+        self._reset_totals()
+        
+    def _reset_totals(self):
+        self.cumulative_pnl = 0.0
+        self.peak = None
+        self.drawdown = 0.0
+        self.max_drawdown = 0.0
+        self.win_count = 0
+        self.win_sum = 0.0
+        self.loss_count = 0
+        self.loss_sum = 0.0
+        
+    @classmethod
+    def from_frame(cls, df_closed):
+        """Builds an accumulator from a DataFrame of closed trades."""
+        acc = cls()
+        if df_closed.empty:
+            return acc
+        dates = pd.to_datetime(df_closed['Exit_Date'])
+        order = np.argsort(dates.to_numpy(), kind='stable')
+        acc._dates = dates.to_numpy(dtype='datetime64[ns]')[order].view(np.int64).tolist()
+        acc._pnls = [_num(v) for v in df_closed['Realized_PnL'].iloc[order]]
+        acc._rebuild()
+        acc.rebuilds = 0
+        return acc
+        
+    @property
+    def total_trades(self):
+        return len(self._pnls)
+        
+    def add_trade(self, realized_pnl, exit_date):
+        """Folds one newly closed trade into the running metrics."""
+        exit_date = pd.Timestamp(exit_date).value
+        realized_pnl = _num(realized_pnl)
+        
+        if self._dates and exit_date < self._dates[-1]:
+            # Closed out of Exit_Date order: put it in place and recompute
+            pos = bisect.bisect_right(self._dates, exit_date)
+            self._dates.insert(pos, exit_date)
+            self._pnls.insert(pos, realized_pnl)
+            self._rebuild()
+            return
+            
+        self._dates.append(exit_date)
+        self._pnls.append(realized_pnl)
+        self._fold(realized_pnl)
+        
+    def _fold(self, pnl):
+        if pnl != pnl:  # NaN: counts as a trade, but moves nothing
+            self._equity.append(self.cumulative_pnl)
+            return
+        self.cumulative_pnl += pnl
+        self._equity.append(self.cumulative_pnl)
+        
+        # Drawdown from the peak accumulated PnL
+        if self.peak is None or self.cumulative_pnl > self.peak:
+            self.peak = self.cumulative_pnl
+        self.drawdown = self.cumulative_pnl - self.peak
+        self.max_drawdown = min(self.max_drawdown, self.drawdown)
+        
+        if pnl > 0:
+            self.win_count += 1
+            self.win_sum += pnl
+        else:
+            self.loss_count += 1
+            self.loss_sum += pnl
+            
+    def _rebuild(self):
+        self.rebuilds += 1
+        self._reset_totals()
+        self._equity = []
+        for pnl in self._pnls:
+            self._fold(pnl)
+            
+    def metrics(self, curve_tail=None):
+        """
+        Returns the same dict as calculate_portfolio_metrics.
+        
+        curve_tail: only return the last N points of Equity_Curve (keeps
+                    this call O(1) when the caller only shows recent points).
+        """
+        total_trades = self.total_trades
+        if total_trades == 0:
+            return {
+                "Cumulative_PnL": 0.0,
+                "Drawdown": 0.0,
+                "Max_Drawdown": 0.0,
+                "Expectancy": 0.0,
+                "Win_Rate": 0.0,
+                "Total_Trades": 0
+            }
+            
+        win_rate = self.win_count / total_trades
+        loss_rate = self.loss_count / total_trades
+        avg_win = self.win_sum / self.win_count if self.win_count else 0
+        avg_loss = abs(self.loss_sum / self.loss_count) if self.loss_count else 0
+        expectancy = (win_rate * avg_win) - (loss_rate * avg_loss)
+        
+        curve = self._equity if curve_tail is None else self._equity[-curve_tail:]
+        
+        return {
+            "Cumulative_PnL": self.cumulative_pnl,
+            "Equity_Curve": list(curve),
+            "Drawdown": self.drawdown,
+            "Max_Drawdown": self.max_drawdown,
+            "Expectancy": expectancy,
+            "Win_Rate": win_rate * 100, # Percentage
+            "Total_Trades": total_trades
+        }
+
+    def series(self, freq=None):
+        """
+        Equity, drawdown and underwater-duration arrays for the trades folded in
+        so far (see timeseries.EquitySeries.from_trades for freq).
+        """
+        dates = np.array(self._dates, dtype=np.int64).view('datetime64[ns]')
+        return timeseries.EquitySeries.from_trades(dates, self._pnls, freq)
+
+    def state(self):
+        """
+        A copy of the accumulator for from_state(): NumPy arrays "dates",
+        "pnls" and "equity", and "totals" (a dict of the running totals).
+        """
+        return {
+            "dates": np.array(self._dates, dtype=np.int64).view('datetime64[ns]'),
+            "pnls": np.array(self._pnls, dtype=float),
+            "equity": np.array(self._equity, dtype=float),
+            "totals": {key: getattr(self, key) for key in self._TOTALS},
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Restores an accumulator from state(), without folding the trades in again."""
+        acc = cls()
+        acc._dates = np.asarray(state["dates"], dtype='datetime64[ns]').view(np.int64).tolist()
+        acc._pnls = np.asarray(state["pnls"], dtype=float).tolist()
+        acc._equity = np.asarray(state["equity"], dtype=float).tolist()
+        for key in cls._TOTALS:
+            setattr(acc, key, state["totals"][key])
+        return acc
+
+# Timings for every public function when TRADE_JOURNAL_PROFILE is set
+instrumentation.instrument_module(globals(), "analytics")
+instrumentation.instrument_class(PortfolioAccumulator, "analytics.PortfolioAccumulator",
+                                 names=("from_frame", "add_trade", "metrics", "series"))
@@ -0,0 +1,255 @@
+"""
+Benchmarks for data_manager and analytics at realistic journal sizes.
+
+Builds a synthetic journal for each size, times the hot paths and records
+peak memory, then prints (or writes) the results as JSON so runs can be
+compared before a rollout:
+
+    python benchmark.py --sizes 1000 10000 100000 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import analytics
+import cube
+import data_manager
+import expiries
+import exposure
+import snapshot
+
+SYMBOLS = ["SPX", "RUT", "NDX", "SPY", "QQQ", "IWM"]
+WIDTHS = {"SPX": 25, "RUT": 10, "NDX": 50, "SPY": 5, "QQQ": 5, "IWM": 5}
+
+
+def generate_trades(n, seed=0, closed_fraction=0.9, start="2021-01-04"):
+    """
+    Returns a DataFrame of n synthetic trades with every column in COLUMNS.
+
+    Roughly 60% are Credit Spreads (Bullish/Bearish) and 40% Iron Condors
+    (Neutral). Leg prices add up to Spread_Entry_Price, and Max_Loss and
+    Margin_Used follow from Width and Lots. closed_fraction of the trades
+    have exit data, with metrics from analytics.calculate_trade_metrics_batch.
+    """
+    rng = np.random.default_rng(seed)
+    symbols = rng.choice(SYMBOLS, n)
+    width = np.array([WIDTHS[s] for s in symbols], dtype=float)
+    is_ic = rng.random(n) < 0.4
+    lots = rng.integers(1, 11, n).astype(float)
+    dte = rng.integers(7, 61, n)
+    entry_date = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, 3 * 365, n), unit="D")
+
+    credit = np.round(width * rng.uniform(0.15, 0.35, n), 2)
+    max_loss = np.round((width - credit) * lots * analytics.MULTIPLIER, 2)
+
+    df = pd.DataFrame({col: [None] * n for col in data_manager.COLUMNS})
+    df["Trade_ID"] = np.arange(1, n + 1)
+    df["Trade_Status"] = "OPEN"
+    df["Entry_Date"] = entry_date
+    df["Symbol"] = symbols
+    df["Strategy"] = np.where(is_ic, "Iron Condor", "Credit Spread")
+    df["Direction"] = np.where(is_ic, "Neutral", rng.choice(["Bullish", "Bearish"], n))
+    df["Lots"] = lots
+    df["Width"] = width
+    df["Credit_Received"] = credit
+    df["Max_Loss"] = max_loss
+    df["Margin_Used"] = max_loss
+    df["DTE_Entry"] = dte
+    df["Spread_Entry_Price"] = credit
+
+    # Leg prices: short - long = credit for a spread; an iron condor splits
+    # the credit between its call and put spreads
+    long_leg = np.round(rng.uniform(0.10, 1.50, n), 2)
+    call_share = np.round(credit * rng.uniform(0.4, 0.6, n), 2)
+    long_call = np.round(rng.uniform(0.05, 1.00, n), 2)
+    long_put = np.round(rng.uniform(0.05, 1.00, n), 2)
+    df["Short_Leg_Entry"] = np.where(is_ic, np.nan, long_leg + credit)
+    df["Long_Leg_Entry"] = np.where(is_ic, np.nan, long_leg)
+    df["Short_Call_Entry"] = np.where(is_ic, long_call + call_share, np.nan)
+    df["Long_Call_Entry"] = np.where(is_ic, long_call, np.nan)
+    df["Short_Put_Entry"] = np.where(is_ic, long_put + credit - call_share, np.nan)
+    df["Long_Put_Entry"] = np.where(is_ic, long_put, np.nan)
+
+    df["Sell_Strike_Delta"] = np.round(rng.uniform(0.08, 0.30, n), 2)
+    df["IV_Entry"] = np.round(rng.uniform(10, 45, n), 1)
+    df["IV_Percentile_Entry"] = np.round(rng.uniform(0, 100, n), 0)
+    df["IV_HV_Percent"] = np.round(rng.uniform(80, 160, n), 0)
+    df["VIX_Entry"] = np.round(rng.uniform(11, 35, n), 1)
+    df["Planned_Exit_Percent"] = rng.choice([50.0, 65.0, 75.0], n)
+    df["Entry_Confidence"] = rng.integers(1, 6, n)
+
+    closed = rng.random(n) < closed_fraction
+    if closed.any():
+        idx = np.flatnonzero(closed)
+        k = len(idx)
+        held = np.minimum(rng.integers(1, 61, k), dte[idx])
+        # Most trades are bought back for a fraction of the credit; some lose
+        exit_ratio = np.where(rng.random(k) < 0.75, rng.uniform(0.0, 0.6, k), rng.uniform(1.0, 3.0, k))
+        exit_price = np.round(np.minimum(credit[idx] * exit_ratio, width[idx]), 2)
+        exit_ratio = np.divide(exit_price, credit[idx], out=np.zeros(k), where=credit[idx] != 0)
+
+        df.loc[idx, "Trade_Status"] = "CLOSED"
+        df.loc[idx, "Exit_Date"] = entry_date[idx] + pd.to_timedelta(held, unit="D")
+        df.loc[idx, "Spread_Exit_Price"] = exit_price
+        for leg in ["Short_Leg", "Long_Leg", "Short_Call", "Long_Call", "Short_Put", "Long_Put"]:
+            df.loc[idx, f"{leg}_Exit"] = np.round(df.loc[idx, f"{leg}_Entry"].astype(float) * exit_ratio, 2)
+        df.loc[idx, "Adjustment_Made"] = rng.choice(["None", "Roll", "Hedge"], k, p=[0.8, 0.15, 0.05])
+        df.loc[idx, "Exit_Emotion"] = rng.choice(["Calm", "Fear", "Greed"], k, p=[0.7, 0.2, 0.1])
+        df.loc[idx, "Rule_Broken"] = rng.choice(["No", "Yes"], k, p=[0.9, 0.1])
+
+        metrics = analytics.calculate_trade_metrics_batch(df.loc[idx], df.loc[idx, ["Exit_Date", "Spread_Exit_Price"]])
+        for col in metrics.columns:
+            df.loc[idx, col] = metrics[col].to_numpy()
+
+    return data_manager.apply_schema(df)
+
+
+def sample_entry(rng):
+    """One new-trade dict as the GUI's save_trade would build it."""
+    width = 5.0
+    credit = round(width * rng.uniform(0.15, 0.35), 2)
+    return {
+        "Entry_Date": "2024-06-03", "Symbol": "SPY", "Strategy": "Credit Spread", "Direction": "Bullish",
+        "Lots": 2.0, "Width": width, "Credit_Received": credit,
+        "Max_Loss": (width - credit) * 200, "Margin_Used": (width - credit) * 200, "DTE_Entry": 30,
+        "Spread_Entry_Price": credit, "Short_Leg_Entry": credit + 0.4, "Long_Leg_Entry": 0.4,
+        "Sell_Strike_Delta": 0.2, "IV_Entry": 18.0, "IV_Percentile_Entry": 40.0, "IV_HV_Percent": 110.0,
+        "VIX_Entry": 16.0, "Planned_Exit_Percent": 50.0, "Entry_Confidence": 3,
+    }
+
+
+def _time_calls(fn, calls):
+    """Runs fn() `calls` times and returns per-call latencies in ms."""
+    latencies = []
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return latencies
+
+
+def _peak_kb(fn):
+    """Peak Python heap allocation (KiB) during one call of fn()."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def _result(size, operation, latencies, peak_kb, rows):
+    return {
+        "size": size,
+        "operation": operation,
+        "calls": len(latencies),
+        "mean_ms": statistics.fmean(latencies),
+        "p50_ms": statistics.median(latencies),
+        "max_ms": max(latencies),
+        "peak_kb": round(peak_kb, 1),
+        "rows": rows,
+    }
+
+
+def run_size(size, calls=20, store_format="sqlite", seed=0):
+    """Benchmarks one journal size in a scratch store; returns a list of result dicts."""
+    rng = np.random.default_rng(seed + 1)
+    workdir = tempfile.mkdtemp(prefix="journal_bench_")
+    old_backend = data_manager._backend
+    try:
+        store = os.path.join(workdir, os.path.basename(data_manager.STORE_FILES[store_format]))
+        data_manager.set_backend(data_manager.open_store(store))
+        data_manager.get_backend().initialize(data_manager.COLUMNS)
+        data_manager.save_db(generate_trades(size, seed=seed))
+
+        results = []
+
+        def bench(operation, fn, rows, n=calls, cold=False):
+            def run():
+                if cold:
+                    data_manager._cache.invalidate()
+                fn()
+            latencies = _time_calls(run, n)
+            results.append(_result(size, operation, latencies, _peak_kb(run), rows))
+
+        bench("get_open_trades (cold)", data_manager.get_open_trades, size, n=max(3, calls // 5), cold=True)
+        bench("get_open_trades", data_manager.get_open_trades, size)
+        bench("get_open_trades (stream)", lambda: data_manager.get_open_trades(stream=True), size, n=max(3, calls // 5))
+        bench("save_new_trade", lambda: data_manager.save_new_trade(sample_entry(rng)), 1)
+
+        open_ids = iter(list(data_manager.get_open_trades()['Trade_ID'])[: 2 * calls + 2])
+        exit_data = {"Exit_Date": "2024-07-01", "Spread_Exit_Price": 0.3}
+
+        def close_next():
+            trade_id = next(open_ids)
+            trade_row = data_manager.get_trade(trade_id)
+            computed = analytics.calculate_trade_metrics(trade_row, exit_data)
+            data_manager.update_trade_to_closed(trade_id, exit_data, computed)
+
+        bench("update_trade_to_closed", close_next, 1)
+
+        closed = data_manager.get_closed_trades()
+        row = closed.iloc[0]
+        row_exit = {"Exit_Date": row["Exit_Date"], "Spread_Exit_Price": row["Spread_Exit_Price"]}
+        bench("calculate_trade_metrics", lambda: analytics.calculate_trade_metrics(row, row_exit), 1, n=calls * 10)
+        bench("calculate_trade_metrics_batch", lambda: analytics.calculate_trade_metrics_batch(
+            closed, closed[["Exit_Date", "Spread_Exit_Price"]]), len(closed), n=max(3, calls // 5))
+        bench("calculate_portfolio_metrics", lambda: analytics.calculate_portfolio_metrics(closed), len(closed))
+        bench("rolling_metrics", lambda: analytics.rolling_metrics(closed), len(closed))
+        trade_ids, hashes = snapshot.fingerprint(closed)
+        saved = snapshot.AnalyticsSnapshot.build(trade_ids, hashes, analytics.PortfolioAccumulator.from_frame(closed),
+                                                 cube.AnalyticsCube.from_frame(closed), closed, 2000)
+        saved_path = snapshot.path_for(store)
+        saved.save(saved_path)
+        bench("AnalyticsSnapshot.load", lambda: snapshot.AnalyticsSnapshot.load(saved_path), len(closed))
+        bench("AnalyticsSnapshot.new_trades", lambda: saved.new_trades(*snapshot.fingerprint(closed)), len(closed))
+        open_trades = data_manager.get_open_trades(columns=exposure.COLUMNS)
+        bench("ExposureBook.from_frame", lambda: exposure.ExposureBook.from_frame(open_trades), len(open_trades))
+        bench("ExpiryIndex.from_frame", lambda: expiries.ExpiryIndex.from_frame(open_trades), len(open_trades))
+        index = expiries.ExpiryIndex.from_frame(open_trades)
+        bench("ExpiryIndex.next_expiries", lambda: index.next_expiries(10, start="2022-01-01"), 10, n=calls * 10)
+        return results
+    finally:
+        data_manager.set_backend(old_backend)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark data_manager and analytics")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--calls", type=int, default=20, help="timed calls per operation")
+    parser.add_argument("--store", choices=sorted(data_manager.STORE_FILES), default="sqlite")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "store": args.store,
+        "results": [],
+    }
+    for size in args.sizes:
+        print(f"Benchmarking {size} rows...", file=sys.stderr)
+        report["results"].extend(run_size(size, calls=args.calls, store_format=args.store))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
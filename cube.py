@@ -0,0 +1,271 @@
+"""
+Closed-trade metrics sliced by Symbol, Strategy, Direction, Entry_Confidence,
+IV percentile bucket and entry month.
+
+AnalyticsCube aggregates the closed trades once into cells, one per
+combination of those dimensions, holding additive sums (trades, wins, win
+and loss PnL, Return_on_Margin_% and Exit_Efficiency_% totals). Any slice
+is then a sum over the matching cells instead of a pass over the journal.
+Drawdown is not additive, so the cube also keeps every trade's PnL in
+Exit_Date order, tagged with its cell, and replays only the matching ones.
+"""
+import numpy as np
+import pandas as pd
+import instrumentation
+
+DIMENSIONS = ("Symbol", "Strategy", "Direction", "Entry_Confidence", "IV_Bucket", "Entry_Month")
+
+# Columns a cube needs from the journal
+COLUMNS = ["Symbol", "Strategy", "Direction", "Entry_Confidence", "IV_Percentile_Entry", "Entry_Date",
+           "Exit_Date", "Realized_PnL", "Return_on_Margin_%", "Exit_Efficiency_%"]
+
+# IV_Percentile_Entry bucket edges; IV_Bucket is labelled "0-20", "20-40", ...
+IV_BUCKETS = [0, 20, 40, 60, 80, 100]
+
+# Dimension value of trades with the field left blank
+MISSING = "n/a"
+
+# Columns of the per-cell sums
+_TRADES, _WINS, _WIN_SUM, _LOSSES, _LOSS_SUM, _ROM_SUM, _ROM_COUNT, _EFF_SUM, _EFF_COUNT = range(9)
+_STATS = 9
+
+
+def _blank_to_missing(values):
+    values = values.astype(object)
+    return values.where(values.notna(), MISSING)
+
+
+def dimension_values(df):
+    """The cube's dimension columns (DIMENSIONS) for a frame of trades."""
+    iv = pd.to_numeric(df["IV_Percentile_Entry"], errors="coerce").astype(float)
+    labels = [f"{lo}-{hi}" for lo, hi in zip(IV_BUCKETS, IV_BUCKETS[1:])]
+    entry = pd.to_datetime(df["Entry_Date"], errors="coerce")
+    months = pd.Series(np.datetime_as_string(entry.to_numpy(dtype="datetime64[M]")), index=df.index)  # much faster than strftime
+    return pd.DataFrame({
+        "Symbol": _blank_to_missing(df["Symbol"]),
+        "Strategy": _blank_to_missing(df["Strategy"]),
+        "Direction": _blank_to_missing(df["Direction"]),
+        "Entry_Confidence": _blank_to_missing(pd.to_numeric(df["Entry_Confidence"], errors="coerce").astype("Int64")),
+        "IV_Bucket": _blank_to_missing(pd.cut(iv, IV_BUCKETS, labels=labels, include_lowest=True)),
+        "Entry_Month": months.where(entry.notna(), MISSING).astype(object),
+    }, index=df.index)
+
+
+def _numeric(values):
+    return pd.to_numeric(values, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+
+def _trade_stats(df):
+    """Per-trade rows of the _STATS sums, as a float array."""
+    pnl = _numeric(df["Realized_PnL"])
+    rom = _numeric(df["Return_on_Margin_%"])
+    eff = _numeric(df["Exit_Efficiency_%"])
+    stats = np.zeros((len(df), _STATS))
+    stats[:, _TRADES] = 1
+    stats[:, _WINS] = pnl > 0
+    stats[:, _WIN_SUM] = np.where(pnl > 0, pnl, 0.0)
+    stats[:, _LOSSES] = pnl <= 0
+    stats[:, _LOSS_SUM] = np.where(pnl <= 0, pnl, 0.0)
+    stats[:, _ROM_SUM] = np.nan_to_num(rom)
+    stats[:, _ROM_COUNT] = ~np.isnan(rom)
+    stats[:, _EFF_SUM] = np.nan_to_num(eff)
+    stats[:, _EFF_COUNT] = ~np.isnan(eff)
+    return stats
+
+
+# Keys of slice() and columns of breakdown()
+METRICS = ["Total_Trades", "Win_Rate", "Expectancy", "Cumulative_PnL", "Drawdown", "Max_Drawdown",
+           "Avg_Return_on_Margin_%", "Avg_Exit_Efficiency_%"]
+
+
+def _metrics(sums, pnls):
+    """Metrics of one slice from its summed stats and its PnLs in Exit_Date order."""
+    trades = int(sums[_TRADES])
+    if trades == 0:
+        return {
+            "Total_Trades": 0, "Win_Rate": 0.0, "Expectancy": 0.0, "Cumulative_PnL": 0.0,
+            "Drawdown": 0.0, "Max_Drawdown": 0.0,
+            "Avg_Return_on_Margin_%": 0.0, "Avg_Exit_Efficiency_%": 0.0,
+        }
+    win_rate = sums[_WINS] / trades
+    loss_rate = sums[_LOSSES] / trades
+    avg_win = sums[_WIN_SUM] / sums[_WINS] if sums[_WINS] else 0
+    avg_loss = abs(sums[_LOSS_SUM] / sums[_LOSSES]) if sums[_LOSSES] else 0
+
+    equity = np.cumsum(np.nan_to_num(pnls))
+    drawdown = equity - np.maximum.accumulate(equity)
+    return {
+        "Total_Trades": trades,
+        "Win_Rate": win_rate * 100, # Percentage
+        "Expectancy": (win_rate * avg_win) - (loss_rate * avg_loss),
+        "Cumulative_PnL": sums[_WIN_SUM] + sums[_LOSS_SUM],
+        "Drawdown": float(drawdown[-1]),
+        "Max_Drawdown": float(drawdown.min()),
+        "Avg_Return_on_Margin_%": sums[_ROM_SUM] / sums[_ROM_COUNT] if sums[_ROM_COUNT] else 0.0,
+        "Avg_Exit_Efficiency_%": sums[_EFF_SUM] / sums[_EFF_COUNT] if sums[_EFF_COUNT] else 0.0,
+    }
+
+
+class AnalyticsCube:
+    """
+    Win rate, expectancy, drawdown, average Return_on_Margin_% and
+    Exit_Efficiency_% for any slice of the closed trades.
+
+    Build it with from_frame() (one factorize + bincount pass), fold newly
+    closed trades in with add_trade() or add_trades(), then ask
+    slice(Strategy="Iron Condor") or breakdown("Symbol", Direction=["Bullish",
+    "Bearish"]). Filters take a value or a list of values per dimension.
+    """
+
+    def __init__(self):
+        self._keys = {}                       # dimension tuple -> cell number
+        self._cells = []                      # dimension tuples, by cell number
+        self._dims = None                     # cached per-dimension arrays of _cells
+        self._sums = np.zeros((0, _STATS))    # per-cell sums
+        self._exit = np.array([], dtype="datetime64[ns]")  # every trade, in Exit_Date order
+        self._pnl = np.array([], dtype=float)
+        self._cell = np.array([], dtype=np.intp)
+        self._added = []                      # (exit, pnl, cell) arrays of trades added since the last merge
+
+    @classmethod
+    def from_frame(cls, df_closed):
+        """Builds a cube from a DataFrame of closed trades (at least COLUMNS)."""
+        cube = cls()
+        if df_closed.empty:
+            return cube
+        codes, uniques = pd.factorize(pd.MultiIndex.from_frame(dimension_values(df_closed)))
+        stats = _trade_stats(df_closed)
+        cube._cells = list(uniques)
+        cube._keys = {key: i for i, key in enumerate(cube._cells)}
+        cube._sums = np.column_stack([
+            np.bincount(codes, weights=stats[:, s], minlength=len(uniques)) for s in range(_STATS)
+        ])
+
+        exit_dates = pd.to_datetime(df_closed["Exit_Date"]).to_numpy(dtype="datetime64[ns]")
+        order = np.argsort(exit_dates, kind="stable")
+        cube._exit = exit_dates[order]
+        cube._pnl = _numeric(df_closed["Realized_PnL"])[order]
+        cube._cell = codes[order].astype(np.intp)
+        return cube
+
+    def state(self):
+        """
+        A copy of the cube's contents for from_state(): "cells" (a list of
+        DIMENSIONS tuples) and NumPy arrays "sums", "exit", "pnl" and "cell".
+        """
+        self._merge_added()
+        return {"cells": list(self._cells), "sums": self._sums.copy(), "exit": self._exit.copy(),
+                "pnl": self._pnl.copy(), "cell": self._cell.copy()}
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuilds a cube from state(), without going back to the trades."""
+        cube = cls()
+        cube._cells = [tuple(cell) for cell in state["cells"]]
+        cube._keys = {key: i for i, key in enumerate(cube._cells)}
+        cube._sums = np.array(state["sums"], dtype=float).reshape(len(cube._cells), _STATS)
+        cube._exit = np.array(state["exit"], dtype="datetime64[ns]")
+        cube._pnl = np.array(state["pnl"], dtype=float)
+        cube._cell = np.array(state["cell"], dtype=np.intp)
+        return cube
+
+    def __len__(self):
+        return len(self._pnl) + sum(len(pnls) for _, pnls, _ in self._added)
+
+    def add_trade(self, row):
+        """Folds in one newly closed trade (a Series or dict with COLUMNS)."""
+        self.add_trades(pd.DataFrame([dict(row)]))
+
+    def add_trades(self, df_closed):
+        """Folds in newly closed trades (a DataFrame with COLUMNS), in one pass over them."""
+        if df_closed.empty:
+            return
+        cells = []
+        for key in dimension_values(df_closed).itertuples(index=False, name=None):
+            cell = self._keys.get(key)
+            if cell is None:
+                cell = self._keys[key] = len(self._cells)
+                self._cells.append(key)
+                self._dims = None
+            cells.append(cell)
+        if len(self._cells) > len(self._sums):
+            self._sums = np.vstack([self._sums, np.zeros((len(self._cells) - len(self._sums), _STATS))])
+        cells = np.array(cells, dtype=np.intp)
+        np.add.at(self._sums, cells, _trade_stats(df_closed))
+
+        # Merged into the Exit_Date-ordered arrays when they are next read, so folding
+        # in trades one at a time copies the arrays once rather than once per trade
+        exit_dates = pd.to_datetime(df_closed["Exit_Date"]).to_numpy(dtype="datetime64[ns]")
+        self._added.append((exit_dates, _numeric(df_closed["Realized_PnL"]), cells))
+
+    def _merge_added(self):
+        if not self._added:
+            return
+        exit_dates, pnls, cells = (np.concatenate(parts) for parts in zip(*self._added))
+        # Same-date trades keep the order they were added in, as in PortfolioAccumulator
+        order = np.argsort(exit_dates, kind="stable")
+        pos = np.searchsorted(self._exit, exit_dates[order], side="right")
+        self._exit = np.insert(self._exit, pos, exit_dates[order])
+        self._pnl = np.insert(self._pnl, pos, pnls[order])
+        self._cell = np.insert(self._cell, pos, cells[order])
+        self._added = []
+
+    def _dimension_arrays(self):
+        if self._dims is None:
+            columns = list(zip(*self._cells)) if self._cells else [()] * len(DIMENSIONS)
+            self._dims = {dim: np.array(values, dtype=object) for dim, values in zip(DIMENSIONS, columns)}
+        return self._dims
+
+    def _cell_mask(self, filters):
+        dims = self._dimension_arrays()
+        mask = np.ones(len(self._cells), dtype=bool)
+        for dim, wanted in filters.items():
+            if dim not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension {dim!r}; expected one of {DIMENSIONS}")
+            values = dims[dim]
+            if isinstance(wanted, (list, tuple, set, frozenset)):
+                mask &= pd.Index(values).isin(list(wanted))
+            else:
+                mask &= values == wanted
+        return mask
+
+    def slice(self, **filters):
+        """Metrics of the closed trades matching every filter (all trades with none)."""
+        mask = self._cell_mask(filters)
+        self._merge_added()
+        return _metrics(self._sums[mask].sum(axis=0), self._pnl[mask[self._cell]])
+
+    def breakdown(self, by, **filters):
+        """
+        Metrics per value of `by` (a dimension or a list of them) within the
+        filtered slice, as a DataFrame indexed by those values.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        for dim in by:
+            if dim not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension {dim!r}; expected one of {DIMENSIONS}")
+        mask = self._cell_mask(filters)
+        self._merge_added()
+        cells = np.flatnonzero(mask)
+        dims = self._dimension_arrays()
+        if len(cells) == 0:
+            return pd.DataFrame(columns=METRICS)
+
+        groups, labels = pd.factorize(pd.MultiIndex.from_arrays([dims[d][cells] for d in by], names=by))
+        sums = np.column_stack([
+            np.bincount(groups, weights=self._sums[cells, s], minlength=len(labels)) for s in range(_STATS)
+        ])
+        # Group of every trade in the slice (-1 outside it), for the per-group drawdowns
+        cell_group = np.full(len(self._cells), -1)
+        cell_group[cells] = groups
+        trade_group = cell_group[self._cell]
+        rows = [_metrics(sums[g], self._pnl[trade_group == g]) for g in range(len(labels))]
+        index = labels if len(by) > 1 else pd.Index(labels.get_level_values(0), name=by[0])
+        # Dimension values mix numbers and MISSING, so order them as text
+        return pd.DataFrame(rows, index=index).sort_index(key=lambda values: values.map(str))
+
+
+# Timings when TRADE_JOURNAL_PROFILE is set
+instrumentation.instrument_module(globals(), "cube")
+instrumentation.instrument_class(AnalyticsCube, "cube.AnalyticsCube",
+                                 names=("from_frame", "add_trade", "add_trades", "slice", "breakdown"))
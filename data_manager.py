@@ -1,8 +1,25 @@
 import pandas as pd
+import csv
 import os
+import time
+from contextlib import contextmanager
 from datetime import datetime
+import analytics
+import instrumentation
+import validation
+from storage import SQLiteBackend, ExcelBackend, FeatherBackend, ConflictError, backend_for_path, CHUNKSIZE
 
-DB_FILE = "trade_journal.xlsx"
+# Primary store format: "sqlite" (default), "feather" (columnar, opt-in: needs pyarrow, which
+# requirements.txt leaves out) or "excel" (legacy). The Excel workbook is otherwise only
+# written by export_to_excel().
+STORE_FORMAT = os.environ.get("TRADE_JOURNAL_STORE", "sqlite").lower()
+STORE_FILES = {
+    "sqlite": "trade_journal.db",
+    "feather": "trade_journal.arrow",
+    "excel": "trade_journal.xlsx",
+}
+DB_FILE = STORE_FILES[STORE_FORMAT]
+EXCEL_FILE = "trade_journal.xlsx"
 
 COLUMNS = [
     "Trade_ID", "Trade_Status",
@@ -26,97 +43,697 @@ COLUMNS = [
     "Exit_Efficiency_%", "Risk_Utilization_%", "Rule_Violation_Flag"
 ]
 
-def initialize_db():
-    """Creates the Excel file with headers if it doesn't exist."""
-    if not os.path.exists(DB_FILE):
-        df = pd.DataFrame(columns=COLUMNS)
-        df.to_excel(DB_FILE, index=False)
-        print(f"Created {DB_FILE}")
-    else:
-        # Check if columns match, if not, we might need to handle migration, but for now just assume it's correct or print warning
-        # In a strict environment, we'd validate headers.
+# In-memory dtype of every column, applied on load and on insert
+DTYPES = {
+    "Trade_ID": "Int64", "Trade_Status": "category",
+    # Entry Fields
+    "Entry_Date": "datetime64[ns]", "Symbol": "category", "Strategy": "category", "Direction": "category",
+    "Lots": "Float64", "Width": "Float64", "Credit_Received": "Float64", "Max_Loss": "Float64",
+    "Margin_Used": "Float64", "DTE_Entry": "Int64",
+    "Spread_Entry_Price": "Float64",
+    "Short_Leg_Entry": "Float64", "Long_Leg_Entry": "Float64",
+    "Short_Call_Entry": "Float64", "Long_Call_Entry": "Float64", "Short_Put_Entry": "Float64", "Long_Put_Entry": "Float64",
+    "Sell_Strike_Delta": "Float64",
+    "IV_Entry": "Float64", "IV_Percentile_Entry": "Float64", "IV_HV_Percent": "Float64", "VIX_Entry": "Float64",
+    "Planned_Exit_Percent": "Float64", "Entry_Confidence": "Int64",
+    # Exit Fields
+    "Exit_Date": "datetime64[ns]", "Spread_Exit_Price": "Float64",
+    "Short_Leg_Exit": "Float64", "Long_Leg_Exit": "Float64",
+    "Short_Call_Exit": "Float64", "Long_Call_Exit": "Float64", "Short_Put_Exit": "Float64", "Long_Put_Exit": "Float64",
+    "Adjustment_Made": "category", "Exit_Emotion": "category", "Rule_Broken": "category", "Rule_Broken_Which": "string",
+    # Calculated Fields
+    "Days_in_Trade": "Int64", "Multiplier": "Int64", "Realized_PnL": "Float64", "Win_Loss": "category",
+    "Return_on_Margin_%": "Float64", "Yield_per_Trade": "Float64", "Max_Profit": "Float64",
+    "Exit_Efficiency_%": "Float64", "Risk_Utilization_%": "Float64", "Rule_Violation_Flag": "boolean"
+}
+
+# Known values of the categorical columns. Values outside these lists
+# (e.g. from manual edits) are kept as extra categories, never dropped.
+CATEGORIES = {
+    "Trade_Status": ["OPEN", "CLOSED"],
+    "Strategy": ["Credit Spread", "Iron Condor"],
+    "Direction": ["Neutral", "Bullish", "Bearish"],
+    "Adjustment_Made": ["None", "Roll", "Hedge"],
+    "Exit_Emotion": ["Calm", "Fear", "Greed"],
+    "Rule_Broken": ["No", "Yes"],
+    "Win_Loss": ["Win", "Loss"],
+}
+
+def _cast_column(series, col):
+    """Casts one column to its DTYPES entry."""
+    dtype = DTYPES.get(col)
+    if dtype is None:
+        return series
+    if dtype == "category":
+        values = series.astype(object).where(series.notna(), None)
+        known = CATEGORIES.get(col, [])
+        extra = [v for v in pd.unique(values.dropna()) if v not in known]
+        return pd.Series(pd.Categorical(values, categories=known + extra), index=series.index, name=col)
+    if dtype.startswith("datetime64"):
+        return pd.to_datetime(series, errors='coerce')
+    if dtype == "string":
+        return series.astype(object).where(series.notna(), None).astype("string")
+    numeric = pd.to_numeric(series, errors='coerce')
+    if dtype == "Int64":
+        try:
+            return numeric.astype("Int64")
+        except TypeError:
+            return numeric.astype("Float64")  # non-integral values: keep them rather than fail
+    return numeric.astype(dtype)
+
+def apply_schema(df):
+    """Returns a copy of df with every known column cast to its DTYPES entry."""
+    return pd.DataFrame({col: _cast_column(df[col], col) for col in df.columns}, index=df.index)
+
+def coerce_value(col, value):
+    """
+    Converts one value to the Python type stored in col, raising ValueError
+    if it can't be (e.g. a malformed date). Missing values come back as None.
+    """
+    dtype = DTYPES.get(col)
+    if value is None or dtype is None:
+        return value
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
         pass
+    try:
+        if dtype.startswith("datetime64"):
+            return pd.Timestamp(value)
+        if dtype == "Float64":
+            return float(value)
+        if dtype == "Int64":
+            value = float(value)
+            return int(value) if value.is_integer() else value
+        if dtype == "boolean":
+            return bool(value)
+        if dtype in ("string", "category") and hasattr(value, "item"):
+            return value.item()
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid value for {col}: {value!r}")
+    return value
+
+_backend = None
+_defer_checkpoints = False
+
+
+class JournalCache:
+    """
+    Keeps the parsed journal DataFrame in memory.
+
+    The frame is reloaded from the backend only when the store file changes
+    on disk (mtime/size). Writes made through this module are applied to the
+    cached frame directly, so they don't force a reload either.
+
+    Inserted rows are buffered and concatenated onto the frame in one go
+    the next time it is read, so a run of inserts copies the frame once.
+
+    It also maintains a Trade_ID -> row label index so single-trade lookups
+    and updates don't scan the frame. Non-numeric and duplicate IDs are
+    found once, when the frame is loaded, and listed in `issues`.
+    """
+
+    def __init__(self):
+        self._df = None
+        self._pending = []
+        self.index = {}
+        self.issues = []
+        self._stamp = None
+        self.hits = 0
+        self.misses = 0
+
+    def refresh(self, backend):
+        """Reloads the frame if the store changed on disk; counts a hit or a miss."""
+        stamp = backend.stamp()
+        if self._df is None or stamp != self._stamp:
+            self.misses += 1
+            self._df = apply_schema(backend.load())
+            self._pending = []
+            self._stamp = stamp
+            self._build_index()
+        else:
+            self.hits += 1
+
+    @property
+    def df(self):
+        """The cached frame (None if nothing is loaded), with any buffered inserts applied."""
+        if self._pending:
+            self._df = _append_rows(self._df, self._pending)
+            self._pending = []
+        return self._df
+
+    def _build_index(self):
+        ids = pd.to_numeric(self.df['Trade_ID'], errors='coerce')
+        self.issues = []
+        bad = self.df.index[ids.isna()]
+        if len(bad):
+            self.issues.append(f"{len(bad)} row(s) with a missing or non-numeric Trade_ID (rows {list(bad[:5])})")
+        dups = ids[ids.duplicated() & ids.notna()].unique()
+        if len(dups):
+            self.issues.append(f"Duplicate Trade_ID(s): {sorted(int(i) for i in dups[:5])}")
+        # First occurrence wins for duplicates, matching the old mask-and-iloc[0] lookup
+        valid = ids.notna() & ~ids.duplicated()
+        self.index = dict(zip(ids[valid].astype(int), self.df.index[valid]))
+
+    def lookup(self, trade_id):
+        """Returns the row label for a Trade_ID, or None."""
+        try:
+            return self.index.get(int(trade_id))
+        except (TypeError, ValueError):
+            return None
+
+    def invalidate(self):
+        self._df = None
+        self._pending = []
+        self.index = {}
+        self._stamp = None
+
+    def record_append(self, backend, row):
+        if self._df is None:
+            return
+        self._pending.append(row)
+        # Rows keep a RangeIndex, so the new row's label is its position
+        self.index[int(row['Trade_ID'])] = len(self._df) + len(self._pending) - 1
+        self._stamp = backend.stamp()
+
+    def record_checkpoint(self, backend, before):
+        # A checkpoint rewrites the store file without changing the journal
+        if self._df is not None and self._stamp == before:
+            self._stamp = backend.stamp()
+
+    def record_update(self, backend, trade_id, fields):
+        if self._df is None:
+            return
+        label = self.lookup(trade_id)
+        if label is None:
+            self.invalidate()
+            return
+        _set_fields(self.df, label, fields)
+        self._stamp = backend.stamp()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_cache = JournalCache()
+_listeners = []
+
+def add_listener(callback):
+    """
+    Registers callback(event, row) to be told about journal changes:
+      "insert" - a new trade was saved (row: dict of the new trade)
+      "close"  - a trade was closed (row: Series of the updated trade)
+      "reload" - the journal was (re)loaded from disk, e.g. another process
+                 changed it; row is None and any derived state should be rebuilt.
+    """
+    _listeners.append(callback)
+
+def remove_listener(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+def _notify(event, row=None):
+    for callback in list(_listeners):
+        callback(event, row)
+
+def _append_rows(df, rows):
+    """Appends rows (dicts already passed through coerce_value) to a typed frame, keeping every column's dtype."""
+    new_rows = {}
+    for col in df.columns:
+        values = [row.get(col) for row in rows]
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            unseen = [v for v in dict.fromkeys(values) if v is not None and v not in dtype.categories]
+            if unseen:
+                df[col] = df[col].cat.add_categories(unseen)
+                dtype = df[col].dtype
+            new_rows[col] = pd.Categorical(values, dtype=dtype)
+        else:
+            new_rows[col] = pd.array(values, dtype=dtype)
+    new_rows = pd.DataFrame(new_rows, index=pd.RangeIndex(len(df), len(df) + len(rows)))
+    if df.empty:
+        return new_rows.reset_index(drop=True)
+    return pd.concat([df, new_rows], ignore_index=True)
+
+def _set_fields(df, idx, fields):
+    """Sets fields on one row, growing categories (or widening the column) when the value doesn't fit."""
+    for key, value in fields.items():
+        if key not in df.columns:
+            continue
+        col = df[key]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            if value is not None and value not in col.cat.categories:
+                df[key] = col.cat.add_categories([value])
+        elif key not in DTYPES:
+            df[key] = col.astype(object)
+        elif DTYPES[key] == "Int64" and isinstance(value, float):
+            df[key] = col.astype("Float64")
+        df.at[idx, key] = value
+
+def get_backend():
+    """Returns the storage backend behind the journal, creating the default one on first use."""
+    global _backend
+    if _backend is None:
+        _backend = open_store(DB_FILE)
+        _backend.defer_checkpoint = _defer_checkpoints
+    return _backend
+
+def open_store(path):
+    """Returns a backend for a journal store file, chosen by its extension."""
+    return backend_for_path(path, COLUMNS, DTYPES)
+
+def set_backend(backend):
+    """Swaps the storage backend (e.g. ExcelBackend for the legacy workbook-only setup)."""
+    global _backend
+    _backend = backend
+    if backend is not None:
+        backend.defer_checkpoint = _defer_checkpoints
+    _cache.invalidate()
+    _notify("reload")
+
+def defer_checkpoints(enabled=True):
+    """
+    With enabled, writes to a store with a write-ahead log (the Excel
+    workbook) return as soon as the log record is on disk; the store file
+    is only rewritten by checkpoint(). Other stores are unaffected.
+    """
+    global _defer_checkpoints
+    _defer_checkpoints = enabled
+    get_backend().defer_checkpoint = enabled
+
+def checkpoint():
+    """Folds logged writes into the store file (see defer_checkpoints)."""
+    backend = get_backend()
+    if not backend.needs_checkpoint():
+        return  # without taking the lock, which would move the generation on
+    with _writing(backend):
+        before = backend.stamp()
+        backend.checkpoint()
+        _cache.record_checkpoint(backend, before)
+
+@contextmanager
+def _writing(backend, expected_generation=None):
+    """
+    Holds the store's inter-process write lock for the duration of a write.
+    expected_generation: raise ConflictError unless the journal is still at this generation.
+    """
+    backend.lock.begin_write(expected_generation)
+    try:
+        yield
+    finally:
+        backend.lock.end_write()
+
+def journal_generation():
+    """
+    Returns the journal's generation, which every write through this module
+    moves on. Pass it back as expected_generation to only write if nobody
+    else has changed the journal since.
+    """
+    return get_backend().lock.generation()
+
+def cache_stats():
+    """Returns hit/miss counts for the in-memory journal cache."""
+    return _cache.stats()
+
+def _sync():
+    """Creates the store if needed and brings the cache up to date with it."""
+    backend = get_backend()
+    if not backend.exists():
+        initialize_db()
+    misses = _cache.misses
+    _cache.refresh(backend)
+    if _cache.misses != misses:
+        _notify("reload")
+
+def _journal():
+    """Returns the cached journal DataFrame (shared, do not modify), reloading it if the store changed."""
+    _sync()
+    return _cache.df
+
+def check_for_changes():
+    """Reloads the journal if the store changed on disk (listeners get a "reload" event)."""
+    _sync()
+
+def initialize_db():
+    """
+    Creates the journal store if it doesn't exist, migrating an existing Excel workbook into it.
+    An existing store gets any writes left in its write-ahead log by a crash replayed into it.
+    """
+    backend = get_backend()
+    with _writing(backend):
+        if backend.exists():
+            backend.checkpoint()
+            return
+        if os.path.exists(EXCEL_FILE) and not isinstance(backend, ExcelBackend):
+            migrate_store(EXCEL_FILE, backend)
+        else:
+            backend.initialize(COLUMNS)
+            print(f"Created {backend.path}")
+
+def migrate_store(source, target=None):
+    """
+    Copies every trade from one store into another, e.g. an existing
+    trade_journal.xlsx into the SQLite or Feather store.
+    source/target: a backend or a store path. target defaults to the current store.
+    Returns the number of trades copied.
+    """
+    source = open_store(source) if isinstance(source, str) else source
+    target = target or get_backend()
+    target = open_store(target) if isinstance(target, str) else target
+    
+    chunks = []
+    for chunk in source.iter_chunks():
+        chunk = chunk.reindex(columns=COLUMNS)
+        chunk['Trade_ID'] = pd.to_numeric(chunk['Trade_ID'], errors='coerce').astype('Int64')
+        chunks.append(chunk)
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=COLUMNS)
+    with _writing(target):
+        target.initialize(COLUMNS)
+        target.replace(df)
+    if target is _backend:
+        _cache.invalidate()
+        _notify("reload")
+    print(f"Migrated {len(df)} trade(s) from {source.path} into {target.path}")
+    return len(df)
 
 def load_db():
     """Loads the database into a DataFrame."""
-    if not os.path.exists(DB_FILE):
-        initialize_db()
-    return pd.read_excel(DB_FILE)
+    return _journal().copy()
+
+def load_snapshot():
+    """
+    Returns (df, generation): a copy of the journal and the generation it
+    was read at, for a later save_db(df, expected_generation=generation).
+    
+    Doesn't wait for the write lock unless a write overlaps the read, in
+    which case the read is retried once that write has finished.
+    """
+    lock = get_backend().lock
+    for _ in range(3):
+        generation = lock.generation()
+        if generation % 2 == 0:
+            df = load_db()
+            if lock.generation() == generation:
+                return df, generation
+        with lock:
+            pass  # wait for the write in progress
+    with lock:  # journal too busy: read under the lock
+        return load_db(), lock.generation()
 
-def save_db(df):
-    """Saves the DataFrame to the Excel file."""
-    df.to_excel(DB_FILE, index=False)
+def save_db(df, expected_generation=None):
+    """
+    Overwrites the database with the DataFrame.
+    expected_generation: only write if the journal is still at this
+    generation (see load_snapshot); raises ConflictError otherwise.
+    """
+    backend = get_backend()
+    with _writing(backend, expected_generation):
+        backend.replace(df)
+        _cache.invalidate()
+    _notify("reload")
+
+def get_trade(trade_id):
+    """Returns the row for one trade as a Series. Raises ValueError if it doesn't exist."""
+    df = _journal()
+    label = _cache.lookup(trade_id)
+    if label is None:
+        raise ValueError(f"Trade ID {trade_id} not found.")
+    return df.loc[label].copy()
+
+def journal_issues():
+    """Returns the data problems (bad or duplicate Trade_IDs) found when the journal was loaded."""
+    _sync()
+    return list(_cache.issues)
+
+def export_to_excel(path=None, force=False):
+    """
+    Writes the journal out to an Excel workbook for viewing. The workbook is not read back.
+    The export is skipped when the workbook is already newer than the store (unless force=True).
+    """
+    path = path or EXCEL_FILE
+    backend = get_backend()
+    if not backend.exists():
+        initialize_db()
+    stamp = backend.stamp()
+    if not force and stamp and os.path.exists(path) and os.stat(path).st_mtime_ns > stamp[0]:
+        return path
+    backend.export_excel(path)
+    return path
 
 def save_new_trade(trade_data):
     """
     Appends a new trade to the database.
     trade_data: dict containing entry fields.
     """
-    df = load_db()
+    backend = get_backend()
     
-    # Generate Trade_ID
-    if df.empty:
-        new_id = 1
-    else:
-        # simple incremental ID. 
-        # Convert Trade_ID to numeric to find max, handling potential non-numeric issues if manual edits happened
-        df['Trade_ID'] = pd.to_numeric(df['Trade_ID'], errors='coerce')
-        new_id = df['Trade_ID'].max() + 1
-        if pd.isna(new_id):
-            new_id = 1
-            
-    trade_data['Trade_ID'] = int(new_id)
-    trade_data['Trade_Status'] = "OPEN"
+    # Ensure all columns are present in trade_data, fill missing with None.
+    # Values are converted (and validated) before an ID is handed out.
+    row_data = {col: coerce_value(col, trade_data.get(col, None)) for col in COLUMNS}
     
-    # Ensure all columns are present in trade_data, fill missing with None
-    row_data = {col: trade_data.get(col, None) for col in COLUMNS}
+    with _writing(backend):
+        _sync()
+        # Generate Trade_ID from the store's persisted sequence
+        new_id = backend.allocate_trade_id()
+                
+        trade_data['Trade_ID'] = row_data['Trade_ID'] = int(new_id)
+        trade_data['Trade_Status'] = row_data['Trade_Status'] = "OPEN"
+        
+        backend.append(row_data)
+        _cache.record_append(backend, row_data)
+    _notify("insert", row_data)
+    return new_id
+
+def save_new_trades(trades):
+    """
+    Appends several new trades in a single write.
+    trades: list of dicts containing entry fields.
     
-    # Convert to DataFrame and append
-    new_row = pd.DataFrame([row_data])
-    df = pd.concat([df, new_row], ignore_index=True)
+    Every trade is converted first, so one bad value rejects the whole batch
+    before any IDs are used. The trades get consecutive Trade_IDs; returns
+    the list of IDs in order.
+    """
+    if not trades:
+        return []
     
-    save_db(df)
-    return new_id
+    backend = get_backend()
+    rows = [{col: coerce_value(col, trade.get(col, None)) for col in COLUMNS} for trade in trades]
+    with _writing(backend):
+        _sync()
+        first_id = int(backend.allocate_trade_ids(len(rows)))
+        for offset, row in enumerate(rows):
+            row['Trade_ID'] = first_id + offset
+            row['Trade_Status'] = "OPEN"
+        
+        backend.append_many(pd.DataFrame(rows, columns=COLUMNS))
+        for row in rows:
+            _cache.record_append(backend, row)
+    for row in rows:
+        _notify("insert", row)
+    return [row['Trade_ID'] for row in rows]
 
-def get_open_trades():
-    """Returns a DataFrame of trades with Trade_Status == 'OPEN'."""
-    df = load_db()
-    if df.empty:
-        return df
-    return df[df['Trade_Status'] == 'OPEN']
+def bulk_import(path, encoding="utf-8-sig"):
+    """
+    Imports new trades from a CSV file (e.g. a broker fill export) in one write.
+    
+    The CSV header must use journal column names. Rows are streamed and each
+    one is checked with the same rules as the New Trade form
+    (validation.parse_entry, then the column types); rejected rows are
+    skipped and reported, the rest get a contiguous block of Trade_IDs.
+    Trade_ID and Trade_Status in the file are ignored.
+    
+    Returns a dict: imported (list of new Trade_IDs), rejected (list of
+    (line number, reason)), ignored_columns, rows, seconds, rows_per_sec.
+    """
+    start = time.perf_counter()
+    trades, rejected = [], []
+    with open(path, newline="", encoding=encoding) as f:
+        reader = csv.DictReader(f)
+        header = reader.fieldnames or []
+        ignored = [c for c in header if c not in COLUMNS or c in ("Trade_ID", "Trade_Status")]
+        for row in reader:
+            if not any(v.strip() for v in row.values() if isinstance(v, str)):
+                continue
+            try:
+                data = validation.parse_entry(row)
+                for col, value in data.items():
+                    coerce_value(col, value)
+            except ValueError as e:
+                rejected.append((reader.line_num, str(e)))
+                continue
+            trades.append(data)
+    
+    imported = save_new_trades(trades)
+    seconds = time.perf_counter() - start
+    rows = len(imported) + len(rejected)
+    return {
+        "imported": imported,
+        "rejected": rejected,
+        "ignored_columns": ignored,
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds if seconds else 0.0,
+    }
+
+def iter_trades(columns=None, where=None, chunksize=CHUNKSIZE):
+    """
+    Streams the journal straight from the store in DataFrame chunks.
+    
+    columns: only read these columns.
+    where: {column: value} filters, e.g. {"Trade_Status": "OPEN"}.
+    
+    Nothing is added to the in-memory cache, so memory stays bounded by
+    chunksize however large the journal is.
+    """
+    backend = get_backend()
+    if not backend.exists():
+        initialize_db()
+    return (apply_schema(chunk) for chunk in backend.iter_chunks(columns, where, chunksize))
 
-def get_closed_trades():
-    """Returns a DataFrame of trades with Trade_Status == 'CLOSED'."""
-    df = load_db()
+def _trades_with_status(status, columns, stream):
+    if stream:
+        chunks = [c for c in iter_trades(columns, {"Trade_Status": status}) if not c.empty]
+        if not chunks:
+            return apply_schema(pd.DataFrame(columns=columns or COLUMNS))
+        return pd.concat(chunks, ignore_index=True)
+    df = _journal()
     if df.empty:
-        return df
-    return df[df['Trade_Status'] == 'CLOSED']
+        df = df.copy()
+    else:
+        df = df[df['Trade_Status'] == status]
+    return df if columns is None else df.reindex(columns=columns)
+
+def get_open_trades(columns=None, stream=False):
+    """
+    Returns a DataFrame of trades with Trade_Status == 'OPEN'.
+    columns: only return these columns.
+    stream: read straight from the store in chunks instead of through the cache.
+    """
+    return _trades_with_status('OPEN', columns, stream)
 
-def update_trade_to_closed(trade_id, exit_data, computed_metrics):
+def get_closed_trades(columns=None, stream=False):
+    """
+    Returns a DataFrame of trades with Trade_Status == 'CLOSED'.
+    columns: only return these columns.
+    stream: read straight from the store in chunks instead of through the cache.
+    """
+    return _trades_with_status('CLOSED', columns, stream)
+
+def update_trade_to_closed(trade_id, exit_data, computed_metrics, expected_generation=None):
     """
     Updates a specific trade to CLOSED with exit data and computed metrics.
     trade_id: The ID of the trade to update.
     exit_data: dict of exit fields.
     computed_metrics: dict of calculated fields.
+    expected_generation: only write if the journal is still at this
+    generation; raises ConflictError otherwise.
     """
-    df = load_db()
-    
-    # Find the index of the trade
-    mask = df['Trade_ID'] == trade_id
-    if not mask.any():
-        raise ValueError(f"Trade ID {trade_id} not found.")
-        
-    idx = df.index[mask][0]
-    
-    # Update fields
+    fields = {}
     for key, value in exit_data.items():
         if key in COLUMNS:
-            df.at[idx, key] = value
+            fields[key] = coerce_value(key, value)
             
     for key, value in computed_metrics.items():
         if key in COLUMNS:
-            df.at[idx, key] = value
+            fields[key] = coerce_value(key, value)
             
-    df.at[idx, 'Trade_Status'] = "CLOSED"
+    fields['Trade_Status'] = "CLOSED"
+    
+    backend = get_backend()
+    with _writing(backend, expected_generation):
+        _sync()
+        if _cache.lookup(trade_id) is None:
+            raise ValueError(f"Trade ID {trade_id} not found.")
+        backend.update(trade_id, fields)
+        _cache.record_update(backend, trade_id, fields)
+    label = _cache.lookup(trade_id)
+    if label is None:
+        _notify("reload")
+    else:
+        _notify("close", _cache.df.loc[label].copy())
+
+def close_trades_batch(closes):
+    """
+    Closes several trades at once, e.g. everything expiring today.
+    closes: list of (trade_id, exit_data) pairs.
     
-    save_db(df)
+    The metrics for every trade are computed in one vectorized pass
+    (analytics.calculate_trade_metrics_batch) and all updates are written
+    in a single store write. Raises ValueError, without changing anything,
+    if a Trade_ID is unknown or listed twice.
+    Returns the computed metrics as a DataFrame indexed by Trade_ID.
+    """
+    if not closes:
+        return pd.DataFrame(columns=["Trade_ID"]).set_index("Trade_ID")
+    trade_ids = [trade_id for trade_id, _ in closes]
+    if len(set(trade_ids)) != len(trade_ids):
+        raise ValueError("A trade can only be closed once per batch.")
+    
+    backend = get_backend()
+    with _writing(backend):
+        df = _journal()
+        labels = []
+        for trade_id in trade_ids:
+            label = _cache.lookup(trade_id)
+            if label is None:
+                raise ValueError(f"Trade ID {trade_id} not found.")
+            labels.append(label)
+        
+        entries = df.loc[labels]
+        exits = pd.DataFrame([exit_data for _, exit_data in closes], index=entries.index)
+        metrics = analytics.calculate_trade_metrics_batch(entries, exits)
+        
+        updates = []
+        for (trade_id, exit_data), computed in zip(closes, metrics.to_dict('records')):
+            fields = {key: coerce_value(key, value) for key, value in exit_data.items() if key in COLUMNS}
+            fields.update({key: coerce_value(key, value) for key, value in computed.items() if key in COLUMNS})
+            fields['Trade_Status'] = "CLOSED"
+            updates.append((trade_id, fields))
+        
+        backend.update_many(updates)
+        for trade_id, fields in updates:
+            _cache.record_update(backend, trade_id, fields)
+    for trade_id, _ in updates:
+        label = _cache.lookup(trade_id)
+        if label is None:
+            _notify("reload")
+            break
+        _notify("close", _cache.df.loc[label].copy())
+    
+    metrics.index = pd.Index(trade_ids, name="Trade_ID")
+    return metrics
+
+# Timings for every public function when TRADE_JOURNAL_PROFILE is set
+# (iter_trades returns a generator, so its reads are counted by whoever consumes it)
+instrumentation.instrument_module(globals(), "data_manager", exclude=("coerce_value", "iter_trades"))
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Trade journal store maintenance")
+    parser.add_argument("--migrate", metavar="SOURCE", help="copy an existing store (e.g. trade_journal.xlsx) into the current store")
+    parser.add_argument("--to", metavar="TARGET", help="target store for --migrate (default: %s)" % DB_FILE)
+    parser.add_argument("--import", dest="import_csv", metavar="CSV", help="add the trades in a CSV file (journal column names) to the current store")
+    parser.add_argument("--export", action="store_true", help="regenerate %s" % EXCEL_FILE)
+    args = parser.parse_args()
+    if args.migrate:
+        migrate_store(args.migrate, args.to)
+    if args.import_csv:
+        report = bulk_import(args.import_csv)
+        if report['ignored_columns']:
+            print(f"Ignored columns: {', '.join(report['ignored_columns'])}")
+        for line, reason in report['rejected']:
+            print(f"Rejected line {line}: {reason}")
+        ids = report['imported']
+        if ids:
+            print(f"Imported {len(ids)} trade(s) as Trade_ID {ids[0]}-{ids[-1]}")
+        else:
+            print("Imported 0 trades")
+        print(f"{report['rows']} row(s) in {report['seconds']:.2f}s ({report['rows_per_sec']:.0f} rows/s)")
+    if args.export:
+        print(f"Exported to {export_to_excel(force=True)}")
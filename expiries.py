@@ -0,0 +1,127 @@
+"""
+Expiry calendar of the open trades.
+
+A trade's expiry is Entry_Date + DTE_Entry days. ExpiryIndex keeps the
+open trades as a list of (expiry, Trade_ID) sorted with bisect, so
+"what expires between d1 and d2" and "the next N expiry dates" are a
+binary search plus the matching trades, not a pass over the journal.
+Build it once with from_frame(), then add_trade() and remove_trade() as
+trades are opened and closed.
+"""
+import bisect
+import datetime
+import pandas as pd
+import instrumentation
+
+# Columns an index needs from get_open_trades()
+COLUMNS = ["Trade_ID", "Entry_Date", "DTE_Entry"]
+
+_LAST = float("inf")  # sorts after every Trade_ID with the same expiry
+
+
+def expiry_dates(df):
+    """Expiry of each trade in df as a datetime64 Series (NaT where Entry_Date or DTE_Entry is blank)."""
+    entry = pd.to_datetime(df["Entry_Date"], errors="coerce").dt.normalize()
+    return entry + pd.to_timedelta(pd.to_numeric(df["DTE_Entry"], errors="coerce"), unit="D")
+
+
+def expiry_date(entry_date, dte):
+    """One trade's expiry as a datetime.date, None if either field is blank."""
+    try:
+        date = pd.Timestamp(entry_date) + pd.Timedelta(days=int(dte))
+    except (TypeError, ValueError):
+        return None
+    return None if pd.isna(date) else date.date()
+
+
+def _date(value):
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return value
+    return pd.Timestamp(value).date()
+
+
+def days_left(expiry, today=None):
+    """Calendar days from today to expiry (negative once it has passed)."""
+    return (expiry - (today or datetime.date.today())).days
+
+
+class ExpiryIndex:
+    """
+    Open trades by expiry date. Trades without an Entry_Date or DTE_Entry
+    have no expiry and are left out.
+    """
+
+    def __init__(self):
+        self._keys = []    # sorted (expiry, Trade_ID)
+        self._expiry = {}  # Trade_ID -> expiry
+
+    @classmethod
+    def from_frame(cls, df_open):
+        """Builds an index from a DataFrame of open trades with COLUMNS."""
+        index = cls()
+        df = df_open.reindex(columns=COLUMNS)
+        dates = expiry_dates(df)
+        known = dates.notna() & df["Trade_ID"].notna()
+        ids = pd.to_numeric(df["Trade_ID"][known]).astype("int64").tolist()
+        index._expiry = dict(zip(ids, dates[known].dt.date))
+        index._keys = sorted((expiry, trade_id) for trade_id, expiry in index._expiry.items())
+        return index
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, trade_id):
+        return trade_id in self._expiry
+
+    def add_trade(self, row):
+        """
+        Adds an open trade (a dict or Series with COLUMNS, e.g. the row of a
+        data_manager "insert" event). A Trade_ID already indexed is moved.
+        """
+        trade_id = int(row["Trade_ID"])
+        self.remove_trade(trade_id)
+        expiry = expiry_date(row.get("Entry_Date"), row.get("DTE_Entry"))
+        if expiry is not None:
+            self._expiry[trade_id] = expiry
+            bisect.insort(self._keys, (expiry, trade_id))
+
+    def remove_trade(self, trade_id):
+        """Takes a closed trade out of the index; unknown Trade_IDs are ignored."""
+        expiry = self._expiry.pop(int(trade_id), None)
+        if expiry is not None:
+            del self._keys[bisect.bisect_left(self._keys, (expiry, int(trade_id)))]
+
+    def expiry(self, trade_id):
+        """A trade's expiry date, None if it isn't indexed."""
+        return self._expiry.get(trade_id)
+
+    def dates(self):
+        """{Trade_ID: expiry date} of every indexed trade."""
+        return dict(self._expiry)
+
+    def between(self, start, end):
+        """
+        [(expiry, Trade_ID)] expiring from start to end, both inclusive,
+        soonest first. None leaves that end open.
+        """
+        lo = 0 if start is None else bisect.bisect_left(self._keys, (_date(start),))
+        hi = len(self._keys) if end is None else bisect.bisect_right(self._keys, (_date(end), _LAST))
+        return self._keys[lo:hi]
+
+    def next_expiries(self, count, start=None):
+        """
+        The first `count` expiry dates on or after start (default: the
+        earliest, overdue ones included) as [(expiry, [Trade_IDs])].
+        """
+        pos = 0 if start is None else bisect.bisect_left(self._keys, (_date(start),))
+        groups = []
+        while pos < len(self._keys) and len(groups) < count:
+            expiry = self._keys[pos][0]
+            end = bisect.bisect_right(self._keys, (expiry, _LAST), pos)
+            groups.append((expiry, [trade_id for _, trade_id in self._keys[pos:end]]))
+            pos = end
+        return groups
+
+
+# Timings when TRADE_JOURNAL_PROFILE is set
+instrumentation.instrument_class(ExpiryIndex, "expiries.ExpiryIndex", names=("from_frame",))
@@ -0,0 +1,238 @@
+"""
+Portfolio exposure of the open trades.
+
+ExposureBook keeps running totals over the open trades: Margin_Used,
+Max_Loss (the worst case if every trade lost the most it can) and a net
+delta proxy, overall and per Symbol, Strategy and expiry date (Entry_Date
++ DTE_Entry). Build it once with from_frame(), then add_trade() and
+remove_trade() as trades are opened and closed, so reading the totals
+never rescans the journal.
+
+check() tells whether a new trade would take the book past a set of
+limits, e.g. parse_limits("Margin_Used=25000,Symbol_Margin=10000").
+"""
+import pandas as pd
+import expiries
+import instrumentation
+
+# Columns a book needs from get_open_trades()
+COLUMNS = ["Trade_ID", "Symbol", "Strategy", "Direction", "Entry_Date", "DTE_Entry",
+           "Lots", "Margin_Used", "Max_Loss", "Sell_Strike_Delta"]
+
+# Concentration is tracked per value of each of these
+GROUPS = ("Symbol", "Strategy", "Expiry")
+
+# Sign of the delta a trade's short strike leaves the position with
+DIRECTION_SIGN = {"Bullish": 1.0, "Bearish": -1.0, "Neutral": 0.0}
+
+# Group value of trades with the field left blank
+MISSING = "n/a"
+
+# Keys of totals() and of each concentration() row
+TOTALS = ["Open_Trades", "Margin_Used", "Max_Loss", "Net_Delta"]
+
+# What parse_limits() accepts: caps on the totals, and on the Margin_Used of any one group
+LIMITS = ["Margin_Used", "Max_Loss", "Net_Delta"] + [f"{group}_Margin" for group in GROUPS]
+
+
+def _number(value):
+    """float(value), 0.0 if missing or not a number."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if value != value else value
+
+
+def _label(value):
+    if value is None or value != value or (isinstance(value, str) and not value.strip()):
+        return MISSING
+    return str(value)
+
+
+def expiry(entry_date, dte):
+    """Expiry date as YYYY-MM-DD text (expiries.expiry_date), MISSING if either field is blank."""
+    date = expiries.expiry_date(entry_date, dte)
+    return MISSING if date is None else date.strftime("%Y-%m-%d")
+
+
+def parse_limits(text):
+    """
+    Limits from "Key=value,Key=value" text (keys from LIMITS), as a dict.
+    Blank text means no limits. Raises ValueError.
+    """
+    limits = {}
+    for item in (text or "").split(","):
+        if not item.strip():
+            continue
+        key, sep, value = item.partition("=")
+        key = key.strip()
+        if not sep or key not in LIMITS:
+            raise ValueError(f"Unknown exposure limit {item.strip()!r}; expected one of {', '.join(LIMITS)}.")
+        try:
+            limits[key] = float(value)
+        except ValueError:
+            raise ValueError(f"Exposure limit {key}: could not convert {value.strip()!r} to a number.")
+    return limits
+
+
+class ExposureBook:
+    """
+    Running exposure totals of the open trades.
+
+    Per trade: Margin_Used and Max_Loss as journaled, and
+    Delta = |Sell_Strike_Delta| x Lots, signed by Direction (DIRECTION_SIGN;
+    Neutral trades such as Iron Condors count as flat). Net_Delta is the
+    sum, a proxy for which way the book leans.
+    """
+
+    def __init__(self):
+        self._trades = {}  # Trade_ID -> (margin, max_loss, delta, {group: value})
+        self._totals = dict.fromkeys(TOTALS, 0.0)
+        self._groups = {group: {} for group in GROUPS}  # group -> value -> totals
+
+    @classmethod
+    def from_frame(cls, df_open):
+        """Builds a book from a DataFrame of open trades with COLUMNS, in one vectorized pass."""
+        book = cls()
+        df = df_open.reindex(columns=COLUMNS).dropna(subset=["Trade_ID"])
+        if df.empty:
+            return book
+
+        def number(col):
+            return pd.to_numeric(df[col], errors="coerce").astype(float).fillna(0.0)
+
+        def label(col):
+            values = df[col].astype(object)
+            blank = values.isna() | (values.astype(str).str.strip() == "")
+            return values.astype(str).where(~blank, MISSING)
+
+        sign = df["Direction"].astype(object).map(DIRECTION_SIGN).astype(float).fillna(0.0)
+        delta = sign * number("Sell_Strike_Delta").abs() * number("Lots")
+        dates = expiries.expiry_dates(df)
+        frame = pd.DataFrame({
+            "Margin_Used": number("Margin_Used"), "Max_Loss": number("Max_Loss"), "Net_Delta": delta,
+            "Symbol": label("Symbol"), "Strategy": label("Strategy"),
+            "Expiry": dates.dt.strftime("%Y-%m-%d").where(dates.notna(), MISSING),
+        })
+        frame.index = pd.to_numeric(df["Trade_ID"]).astype("int64").to_numpy()
+        frame = frame[~frame.index.duplicated(keep="last")]
+
+        for trade_id, margin, max_loss, delta, *values in frame.itertuples(name=None):
+            book._trades[int(trade_id)] = (margin, max_loss, delta, dict(zip(GROUPS, values)))
+        sums = ["Margin_Used", "Max_Loss", "Net_Delta"]
+        book._totals = {key: float(value) for key, value in frame[sums].sum().items()}
+        book._totals["Open_Trades"] = float(len(frame))
+        for group in GROUPS:
+            grouped = frame.groupby(group, sort=False)[sums].sum()
+            grouped["Open_Trades"] = frame.groupby(group, sort=False).size().astype(float)
+            book._groups[group] = {value: {key: float(row[key]) for key in TOTALS}
+                                   for value, row in grouped.to_dict("index").items()}
+        return book
+
+    def __len__(self):
+        return len(self._trades)
+
+    def __contains__(self, trade_id):
+        return trade_id in self._trades
+
+    @staticmethod
+    def _exposure(row):
+        sign = DIRECTION_SIGN.get(_label(row.get("Direction")), 0.0)
+        delta = sign * abs(_number(row.get("Sell_Strike_Delta"))) * _number(row.get("Lots"))
+        groups = {
+            "Symbol": _label(row.get("Symbol")),
+            "Strategy": _label(row.get("Strategy")),
+            "Expiry": expiry(row.get("Entry_Date"), row.get("DTE_Entry")),
+        }
+        return _number(row.get("Margin_Used")), _number(row.get("Max_Loss")), delta, groups
+
+    @staticmethod
+    def _move(totals, margin, max_loss, delta, step):
+        totals["Open_Trades"] += step
+        totals["Margin_Used"] += step * margin
+        totals["Max_Loss"] += step * max_loss
+        totals["Net_Delta"] += step * delta
+
+    def add_trade(self, row):
+        """
+        Adds an open trade (a dict or Series with COLUMNS, e.g. the row of a
+        data_manager "insert" event). A Trade_ID already in the book is replaced.
+        """
+        trade_id = int(row["Trade_ID"])
+        if trade_id in self._trades:
+            self.remove_trade(trade_id)
+        margin, max_loss, delta, groups = self._exposure(row)
+        self._trades[trade_id] = (margin, max_loss, delta, groups)
+        self._move(self._totals, margin, max_loss, delta, 1)
+        for group, value in groups.items():
+            totals = self._groups[group].setdefault(value, dict.fromkeys(TOTALS, 0.0))
+            self._move(totals, margin, max_loss, delta, 1)
+
+    def remove_trade(self, trade_id):
+        """Takes a closed trade out of the book; unknown Trade_IDs are ignored."""
+        entry = self._trades.pop(int(trade_id), None)
+        if entry is None:
+            return
+        margin, max_loss, delta, groups = entry
+        self._move(self._totals, margin, max_loss, delta, -1)
+        if not self._trades:
+            self._totals = dict.fromkeys(TOTALS, 0.0)  # drop the rounding left over from the subtractions
+        for group, value in groups.items():
+            totals = self._groups[group][value]
+            self._move(totals, margin, max_loss, delta, -1)
+            if not totals["Open_Trades"]:
+                del self._groups[group][value]
+
+    def totals(self):
+        """TOTALS over every open trade, as a dict."""
+        totals = dict(self._totals)
+        totals["Open_Trades"] = int(totals["Open_Trades"])
+        return totals
+
+    def concentration(self, by):
+        """
+        [(value, TOTALS dict with Margin_%)] for one of GROUPS, largest
+        Margin_Used first. Margin_% is the value's share of the total margin.
+        """
+        if by not in self._groups:
+            raise ValueError(f"Unknown exposure group {by!r}; expected one of {', '.join(GROUPS)}.")
+        margin = self._totals["Margin_Used"]
+        rows = []
+        for value, totals in self._groups[by].items():
+            row = dict(totals, Open_Trades=int(totals["Open_Trades"]))
+            row["Margin_%"] = totals["Margin_Used"] / margin * 100 if margin else 0.0
+            rows.append((value, row))
+        rows.sort(key=lambda item: (-item[1]["Margin_Used"], item[0]))
+        return rows
+
+    def check(self, trade, limits):
+        """
+        Warnings (a list of text, empty if none) for the limits a new trade
+        would breach: the totals, and the group totals of its Symbol,
+        Strategy and Expiry, with the trade added. Nothing is changed.
+        trade: a dict with COLUMNS (e.g. from validation.parse_entry).
+        limits: a dict from parse_limits().
+        """
+        margin, max_loss, delta, groups = self._exposure(trade)
+        after = dict(self._totals)
+        self._move(after, margin, max_loss, delta, 1)
+        warnings = []
+        for key in ("Margin_Used", "Max_Loss"):
+            if key in limits and after[key] > limits[key]:
+                warnings.append(f"{key} would be {after[key]:,.2f}, over the {limits[key]:,.2f} limit.")
+        if "Net_Delta" in limits and abs(after["Net_Delta"]) > limits["Net_Delta"]:
+            warnings.append(f"Net_Delta would be {after['Net_Delta']:+,.2f}, "
+                            f"over the {limits['Net_Delta']:,.2f} limit either way.")
+        for group, value in groups.items():
+            key = f"{group}_Margin"
+            if key in limits:
+                group_margin = self._groups[group].get(value, {}).get("Margin_Used", 0.0) + margin
+                if group_margin > limits[key]:
+                    warnings.append(f"Margin_Used in {group} {value} would be {group_margin:,.2f}, "
+                                    f"over the {limits[key]:,.2f} limit.")
+        return warnings
+
+
+# Timings when TRADE_JOURNAL_PROFILE is set
+instrumentation.instrument_class(ExposureBook, "exposure.ExposureBook", names=("from_frame", "check"))
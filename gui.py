@@ -1,9 +1,64 @@
+import importlib
+import os
+import queue
+import subprocess
+import sys
 import tkinter as tk
-from tkinter import ttk, messagebox
-import pandas as pd
-from datetime import datetime
-import data_manager
-import analytics
+from tkinter import ttk, messagebox, filedialog
+from datetime import datetime, timedelta
+import instrumentation
+import validation
+from io_executor import IOExecutor
+from trade_view import (OpenTradesModel, VirtualTreeview, rows_from_frame, with_expiry, with_marks,
+                        OPEN_TRADE_COLUMNS, EXPIRY_COLUMNS, MARK_COLUMNS)
+
+class _DeferredModule:
+    """Stands in for a module that is only imported when one of its attributes is first used."""
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+# The pandas-backed modules take seconds to import, so they are first
+# imported by load_journal() on the I/O thread, after the window is up.
+data_manager = _DeferredModule("data_manager")
+analytics = _DeferredModule("analytics")
+cube = _DeferredModule("cube")
+marking = _DeferredModule("marking")
+exposure = _DeferredModule("exposure")
+expiries = _DeferredModule("expiries")
+snapshot = _DeferredModule("snapshot")
+
+# Entry form widget key -> journal field
+ENTRY_FIELDS = {
+    "lots": "Lots", "width": "Width", "credit": "Credit_Received", "max_loss": "Max_Loss",
+    "margin": "Margin_Used", "dte": "DTE_Entry", "spread_price": "Spread_Entry_Price",
+    "sell_strike_delta": "Sell_Strike_Delta", "iv": "IV_Entry", "iv_rank": "IV_Percentile_Entry",
+    "iv_hv": "IV_HV_Percent", "vix": "VIX_Entry", "plan_exit": "Planned_Exit_Percent",
+    "confidence": "Entry_Confidence",
+}
+
+# Points drawn for the Analytics equity curve, however long the history
+CURVE_POINTS = 500
+
+# Upcoming expiry dates listed beside the Open Trades list (after any overdue trades)
+EXPIRY_GROUPS = 10
+
+# Live quotes for the open trades: a CSV file replayed in real time or host:port of a line feed
+QUOTE_FEED = os.environ.get("TRADE_JOURNAL_QUOTES")
+# Open Trades marks refresh at most this often (ms), however fast quotes arrive
+MARK_INTERVAL_MS = 250
+
+# Exposure limits a new trade is checked against, e.g. "Margin_Used=25000,Symbol_Margin=10000"
+# (keys: exposure.LIMITS)
+EXPOSURE_LIMITS = os.environ.get("TRADE_JOURNAL_LIMITS", "")
+
+# Writes are acknowledged once logged (stores with a write-ahead log); the store file is rewritten by a follow-up checkpoint job
+DEFER_CHECKPOINTS = True
+
+# Analytics "Breakdown by" choices (cube.DIMENSIONS, listed here so gui doesn't import pandas)
+BREAKDOWN_DIMENSIONS = ["Strategy", "Symbol", "Direction", "Entry_Confidence", "IV_Bucket", "Entry_Month"]
 
 class TradeJournalGUI:
     def __init__(self, root):
@@ -15,6 +70,26 @@ class TradeJournalGUI:
         style = ttk.Style()
         style.theme_use('clam')
         
+        # Menu
+        menubar = tk.Menu(root)
+        file_menu = tk.Menu(menubar, tearoff=0)
+        file_menu.add_command(label="Open in Excel", command=self.open_in_excel)
+        file_menu.add_command(label="Export to Excel", command=self.export_excel)
+        file_menu.add_separator()
+        file_menu.add_command(label="Diagnostics...", command=self.show_diagnostics)
+        menubar.add_cascade(label="File", menu=file_menu)
+        root.config(menu=menubar)
+        
+        # Status bar (busy indicator for background I/O)
+        status_bar = ttk.Frame(root)
+        status_bar.pack(side="bottom", fill="x")
+        self.status_label = ttk.Label(status_bar, text="Ready")
+        self.status_label.pack(side="left", padx=5)
+        self.busy_bar = ttk.Progressbar(status_bar, mode="indeterminate", length=120)
+        
+        # All journal reads/writes run on one background thread
+        self.io = IOExecutor(root, on_busy_changed=self.on_busy_changed, on_error=self.show_error)
+        
         # Tabs
         self.tab_control = ttk.Notebook(root)
         
@@ -35,6 +110,193 @@ class TradeJournalGUI:
         
         # Bind tab change to refresh
         self.tab_control.bind("<<NotebookTabChanged>>", self.on_tab_change)
+        
+        # Running portfolio metrics and the sliced metrics cube, kept up to date as trades are closed,
+        # and the open trades' exposure and expiry calendar, kept up to date as trades are opened and closed
+        self.portfolio = None
+        self.cube = None
+        self.exposure_book = None
+        self.expiry_index = None
+        self.expiry_groups = {}
+        # Last Analytics results, as saved next to the journal (snapshot.AnalyticsSnapshot), and whether
+        # they have been checked against the journal since it last changed (a "close" or "reload" event)
+        self.analytics = None
+        self.analytics_current = False
+        
+        # Mark-to-market from QUOTE_FEED: the book is filled on the I/O thread, quotes arrive on the feed's thread
+        self.mark_book = None
+        self.mark_service = None
+        self.mark_updates = queue.Queue()
+        self.open_rows = {}
+        self.open_marks = {}
+
+    def load_journal(self, timer=None, on_done=None):
+        """
+        Imports the data modules, opens the journal and loads the open
+        trades, all on the I/O thread. Call it once the window is showing;
+        jobs submitted afterwards run after it.
+        timer: optional StartupTimer, told as each phase finishes.
+        on_done(): called on the Tk thread once the open trades are shown.
+        """
+        self.io.submit(self._load_journal_io, timer,
+                       on_success=lambda rows: self.on_journal_loaded(rows, on_done))
+
+    def _load_journal_io(self, timer):
+        # Runs on the I/O thread
+        mark = timer.mark if timer is not None else (lambda phase: None)
+        importlib.import_module("data_manager")
+        importlib.import_module("analytics")
+        mark("import data modules")
+        
+        data_manager.defer_checkpoints(DEFER_CHECKPOINTS)
+        data_manager.add_listener(self.on_journal_event)
+        data_manager.initialize_db()
+        mark("initialize_db")
+        if QUOTE_FEED:
+            self.mark_book = marking.MarkBook()
+        
+        rows = self._open_rows_io()  # also fills the journal cache for later tabs
+        mark("load journal")
+        return rows
+
+    def on_journal_loaded(self, rows, on_done=None):
+        self.show_open_rows(rows)
+        self.refresh_exposure()
+        self.refresh_expiries()
+        self.io.submit(data_manager.journal_issues, on_success=self.show_journal_issues)
+        if QUOTE_FEED:
+            self.start_quote_feed()
+        if on_done is not None:
+            on_done()
+
+    def show_journal_issues(self, issues):
+        if issues:
+            messagebox.showwarning("Journal Issues", "The journal has rows that need fixing:\n\n" + "\n".join(issues))
+
+    def start_quote_feed(self):
+        self.mark_service = marking.MarkToMarketService(
+            self.mark_book, marking.source_from_spec(QUOTE_FEED), self.mark_updates.put,
+            interval=MARK_INTERVAL_MS / 1000)
+        self.mark_service.start_thread(on_error=self.mark_updates.put)
+        self.root.after(MARK_INTERVAL_MS, self._poll_marks)
+
+    def _poll_marks(self):
+        # Merges the marks the feed thread has queued since the last poll
+        changed = {}
+        while True:
+            try:
+                update = self.mark_updates.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(update, Exception):
+                self.status_label.config(text=f"Quote feed stopped: {update}")
+                continue
+            changed.update(update)
+        if changed:
+            self.open_marks.update(changed)
+            shown = {i: v for i, v in self.open_rows.items() if i in self.open_view.model.rows}
+            self.open_view.set_rows(with_marks(shown, self.open_marks))
+        self.root.after(MARK_INTERVAL_MS, self._poll_marks)
+
+    def show_open_rows(self, rows):
+        self.open_rows = rows
+        self.open_view.set_rows(with_marks(rows, self.open_marks) if QUOTE_FEED else rows)
+
+    def on_busy_changed(self, pending):
+        if pending:
+            self.status_label.config(text=f"Working... ({pending} pending)")
+            if not self.busy_bar.winfo_ismapped():
+                self.busy_bar.pack(side="right", padx=5)
+                self.busy_bar.start(10)
+        else:
+            self.status_label.config(text="Ready")
+            self.busy_bar.stop()
+            self.busy_bar.pack_forget()
+
+    def show_error(self, e):
+        if isinstance(e, ValueError):
+            messagebox.showerror("Error", f"Invalid Input: {e}")
+        else:
+            messagebox.showerror("Error", f"System Error: {e}")
+
+    def on_journal_event(self, event, row):
+        # Called on the I/O thread, alongside the refresh jobs that use self.portfolio
+        if event == "insert":
+            if self.exposure_book is not None:
+                self.exposure_book.add_trade(row)
+            if self.expiry_index is not None:
+                self.expiry_index.add_trade(row)
+        elif event == "close":
+            if self.exposure_book is not None:
+                self.exposure_book.remove_trade(row['Trade_ID'])
+            if self.expiry_index is not None:
+                self.expiry_index.remove_trade(row['Trade_ID'])
+            if self.portfolio is not None:
+                self.portfolio.add_trade(row['Realized_PnL'], row['Exit_Date'])
+            if self.cube is not None:
+                self.cube.add_trade(row)
+            self.analytics_current = False
+        elif event == "reload":
+            # rebuilt on the next analytics refresh
+            self.portfolio = None
+            self.cube = None
+            self.exposure_book = None
+            self.expiry_index = None
+            self.analytics = None  # re-read: the journal (or the store) may be a different one
+            self.analytics_current = False
+
+    def export_excel(self):
+        self.io.submit(
+            data_manager.export_to_excel, force=True,
+            on_success=lambda path: messagebox.showinfo("Export", f"Journal exported to {path}"),
+            on_error=lambda e: messagebox.showerror("Error", f"Export failed: {e}"),
+        )
+
+    def open_in_excel(self):
+        # Only regenerates the workbook if the journal changed since the last export
+        self.io.submit(data_manager.export_to_excel, on_success=self._open_file)
+
+    def _open_file(self, path):
+        if sys.platform.startswith("win"):
+            os.startfile(path)
+        elif sys.platform == "darwin":
+            subprocess.Popen(["open", path])
+        else:
+            subprocess.Popen(["xdg-open", path])
+
+    def show_diagnostics(self):
+        # Timings collected by instrumentation (TRADE_JOURNAL_PROFILE=1)
+        win = tk.Toplevel(self.root)
+        win.title("Diagnostics")
+        win.geometry("860x400")
+        text = tk.Text(win, font=("Courier", 9), wrap="none")
+        
+        def refresh():
+            text.config(state="normal")
+            text.delete(1.0, tk.END)
+            if instrumentation.ENABLED:
+                text.insert(tk.END, instrumentation.format_table())
+            else:
+                text.insert(tk.END, "Timings are off. Start the journal with TRADE_JOURNAL_PROFILE=1 to collect them.")
+            text.config(state="disabled")
+        
+        def reset():
+            instrumentation.reset()
+            refresh()
+        
+        def save():
+            path = filedialog.asksaveasfilename(parent=win, defaultextension=".json",
+                                                filetypes=[("JSON", "*.json")], initialfile="trade_journal_profile.json")
+            if path:
+                instrumentation.dump_json(path)
+        
+        buttons = ttk.Frame(win)
+        buttons.pack(side="bottom", fill="x", pady=5)
+        ttk.Button(buttons, text="Refresh", command=refresh).pack(side="left", padx=5)
+        ttk.Button(buttons, text="Reset", command=reset).pack(side="left", padx=5)
+        ttk.Button(buttons, text="Save JSON...", command=save).pack(side="left", padx=5)
+        text.pack(fill="both", expand=True, padx=5, pady=5)
+        refresh()
 
     def on_tab_change(self, event):
         selected_tab = event.widget.select()
@@ -151,50 +413,50 @@ class TradeJournalGUI:
             self.leg_widgets[key] = entry
 
     def save_trade(self):
+        raw = {
+            "Entry_Date": self.entry_date.get(),
+            "Symbol": self.symbol.get(),
+            "Strategy": self.strategy.get(),
+            "Direction": self.direction.get(),
+        }
+        for key, field in ENTRY_FIELDS.items():
+            raw[field] = self.entry_vars[key].get()
+        
+        # Add dynamic legs
+        for key, widget in self.leg_widgets.items():
+            raw[key] = widget.get()
+        
         # Validation
         try:
-            data = {
-                "Entry_Date": self.entry_date.get(),
-                "Symbol": self.symbol.get(),
-                "Strategy": self.strategy.get(),
-                "Direction": self.direction.get(),
-                "Lots": float(self.entry_vars['lots'].get()),
-                "Width": float(self.entry_vars['width'].get()),
-                "Credit_Received": float(self.entry_vars['credit'].get()),
-                "Max_Loss": float(self.entry_vars['max_loss'].get()),
-                "Margin_Used": float(self.entry_vars['margin'].get()),
-                "DTE_Entry": int(self.entry_vars['dte'].get()),
-                "Spread_Entry_Price": float(self.entry_vars['spread_price'].get()),
-                "Sell_Strike_Delta": float(self.entry_vars['sell_strike_delta'].get() or 0),
-                
-                "IV_Entry": float(self.entry_vars['iv'].get() or 0),
-                "IV_Percentile_Entry": float(self.entry_vars['iv_rank'].get() or 0),
-                "IV_HV_Percent": float(self.entry_vars['iv_hv'].get() or 0),
-                "VIX_Entry": float(self.entry_vars['vix'].get() or 0),
-                
-                "Planned_Exit_Percent": float(self.entry_vars['plan_exit'].get() or 0),
-                "Entry_Confidence": int(self.entry_vars['confidence'].get() or 3)
-            }
-            
-            # Add dynamic legs
-            for key, widget in self.leg_widgets.items():
-                val = widget.get()
-                data[key] = float(val) if val else 0.0
-            
-            if not data['Symbol'] or not data['Strategy']:
-                raise ValueError("Symbol and Strategy are required.")
-
-            trade_id = data_manager.save_new_trade(data)
-            messagebox.showinfo("Success", f"Trade saved with ID {trade_id}")
-            
-            # Clear fields (Optional, but good UX)
-            self.symbol.delete(0, tk.END)
-            # ... clear others ...
-            
+            data = validation.parse_entry(raw)
         except ValueError as e:
             messagebox.showerror("Error", f"Invalid Input: {e}")
-        except Exception as e:
-            messagebox.showerror("Error", f"System Error: {e}")
+            return
+        
+        self.io.submit(self._check_exposure_io, data, on_success=lambda warnings: self.confirm_save(data, warnings))
+
+    def _check_exposure_io(self, data):
+        # Runs on the I/O thread
+        return self._exposure_book_io().check(data, exposure.parse_limits(EXPOSURE_LIMITS))
+
+    def confirm_save(self, data, warnings):
+        if warnings and not messagebox.askyesno(
+                "Exposure Limits", "This trade would breach:\n\n" + "\n".join(warnings) + "\n\nSave it anyway?"):
+            return
+        self.io.submit(data_manager.save_new_trade, data, on_success=self.on_trade_saved)
+        self.submit_checkpoint()
+
+    def submit_checkpoint(self):
+        # Queued behind a write, so the write is acknowledged before the store file is rewritten
+        if DEFER_CHECKPOINTS:
+            self.io.submit(data_manager.checkpoint)
+
+    def on_trade_saved(self, trade_id):
+        messagebox.showinfo("Success", f"Trade saved with ID {trade_id}")
+        
+        # Clear fields (Optional, but good UX)
+        self.symbol.delete(0, tk.END)
+        # ... clear others ...
 
     def setup_manage_tab(self):
         # Paned Window: Top list, Bottom form
@@ -205,14 +467,36 @@ class TradeJournalGUI:
         list_frame = ttk.LabelFrame(paned, text="Open Trades")
         paned.add(list_frame, weight=1)
         
-        cols = ("ID", "Date", "Symbol", "Strategy", "Lots", "Spread Price")
-        self.tree = ttk.Treeview(list_frame, columns=cols, show="headings", height=8)
-        for col in cols:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=100)
-        
-        self.tree.pack(fill="both", expand=True)
-        self.tree.bind("<<TreeviewSelect>>", self.on_trade_select)
+        # Filter box: matches any column, applied in memory
+        filter_row = ttk.Frame(list_frame)
+        filter_row.pack(fill="x")
+        ttk.Label(filter_row, text="Filter:").pack(side="left", padx=5)
+        self.open_filter = tk.StringVar()
+        self.open_filter.trace_add("write", lambda *_: self.open_view.set_filter(self.open_filter.get()))
+        ttk.Entry(filter_row, textvariable=self.open_filter).pack(side="left", fill="x", expand=True, padx=5)
+        
+        # Totals over every open trade, whatever the filter shows
+        self.exposure_label = ttk.Label(list_frame, text="")
+        self.exposure_label.pack(fill="x", padx=5)
+        
+        body = ttk.Frame(list_frame)
+        body.pack(fill="both", expand=True)
+        
+        # Trades by expiry date, overdue first; clicking a date selects its trades
+        self.expiry_tree = ttk.Treeview(body, columns=("Expiry", "Days Left", "Trades"), show="headings",
+                                        height=8, selectmode="browse")
+        for heading, width in (("Expiry", 90), ("Days Left", 70), ("Trades", 60)):
+            self.expiry_tree.heading(heading, text=heading)
+            self.expiry_tree.column(heading, width=width, anchor="center")
+        self.expiry_tree.pack(side="right", fill="y", padx=(5, 0))
+        self.expiry_tree.bind("<<TreeviewSelect>>", self.on_expiry_select)
+        
+        # Only the visible rows are in the Treeview; click a heading to sort.
+        # Ctrl/Shift-click selects several trades to close together
+        columns = OPEN_TRADE_COLUMNS + EXPIRY_COLUMNS + (MARK_COLUMNS if QUOTE_FEED else [])
+        self.open_view = VirtualTreeview(body, OpenTradesModel(columns), on_select=self.on_trade_select,
+                                         height=8, selectmode="extended")
+        self.open_view.pack(side="left", fill="both", expand=True)
         
         # Bottom: Exit Form
         self.exit_frame = ttk.LabelFrame(paned, text="Close Trade")
@@ -254,36 +538,130 @@ class TradeJournalGUI:
         self.btn_close.grid(row=4, column=0, columnspan=4, pady=20)
 
     def refresh_open_trades(self):
-        # Clear tree
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-            
-        df = data_manager.get_open_trades()
-        if not df.empty:
-            for _, row in df.iterrows():
-                self.tree.insert("", "end", values=(
-                    row['Trade_ID'], row['Entry_Date'], row['Symbol'], 
-                    row['Strategy'], row['Lots'], row['Spread_Entry_Price']
-                ))
-
-    def on_trade_select(self, event):
-        selected_item = self.tree.selection()
-        if not selected_item:
+        self.io.submit(self._open_rows_io, on_success=self.show_open_rows)
+        self.refresh_exposure()
+        self.refresh_expiries()
+
+    def refresh_exposure(self):
+        self.io.submit(self._exposure_io, on_success=self.show_exposure)
+
+    def _exposure_book_io(self):
+        # Runs on the I/O thread: built on first use, then kept up to date by on_journal_event
+        if self.exposure_book is None:
+            df = data_manager.get_open_trades(columns=exposure.COLUMNS)
+            self.exposure_book = exposure.ExposureBook.from_frame(df)
+        return self.exposure_book
+
+    def _exposure_io(self):
+        # Runs on the I/O thread
+        book = self._exposure_book_io()
+        largest = [(group, book.concentration(group)[:1]) for group in exposure.GROUPS]
+        return book.totals(), [(group, rows[0]) for group, rows in largest if rows]
+
+    def show_exposure(self, summary):
+        totals, largest = summary
+        text = (f"Exposure: {totals['Open_Trades']} open   Margin ${totals['Margin_Used']:,.0f}   "
+                f"Worst case ${totals['Max_Loss']:,.0f}   Net delta {totals['Net_Delta']:+.2f}")
+        if largest:
+            text += "   Largest: " + ", ".join(f"{value} {row['Margin_%']:.0f}%" for _, (value, row) in largest)
+        self.exposure_label.config(text=text)
+
+    def _open_rows_io(self):
+        # Runs on the I/O thread; the view diffs the result against what it shows
+        columns = [field for _, field in OPEN_TRADE_COLUMNS]
+        if self.mark_book is None:
+            df = data_manager.get_open_trades(columns=columns)
+        else:
+            df = data_manager.get_open_trades(columns=list(dict.fromkeys(columns + marking.POSITION_COLUMNS)))
+            self.mark_book.set_positions(df)
+        dates = self._expiry_index_io().dates()
+        return with_expiry(rows_from_frame(df), dates, datetime.now().date())
+
+    def refresh_expiries(self):
+        self.io.submit(self._expiry_groups_io, on_success=self.show_expiry_groups)
+
+    def _expiry_index_io(self):
+        # Runs on the I/O thread: built on first use, then kept up to date by on_journal_event
+        if self.expiry_index is None:
+            df = data_manager.get_open_trades(columns=expiries.COLUMNS)
+            self.expiry_index = expiries.ExpiryIndex.from_frame(df)
+        return self.expiry_index
+
+    def _expiry_groups_io(self):
+        # Runs on the I/O thread: [(label, days left, Trade_IDs)]
+        index = self._expiry_index_io()
+        today = datetime.now().date()
+        groups = []
+        overdue = index.between(None, today - timedelta(days=1))
+        if overdue:
+            groups.append(("Overdue", expiries.days_left(overdue[0][0], today), [i for _, i in overdue]))
+        for expiry, trade_ids in index.next_expiries(EXPIRY_GROUPS, start=today):
+            groups.append((expiry.isoformat(), expiries.days_left(expiry, today), trade_ids))
+        return groups
+
+    def show_expiry_groups(self, groups):
+        self.expiry_groups = {label: trade_ids for label, _, trade_ids in groups}
+        self.expiry_tree.delete(*self.expiry_tree.get_children())
+        for label, days, trade_ids in groups:
+            self.expiry_tree.insert("", "end", iid=label, values=(label, days, len(trade_ids)))
+
+    def on_expiry_select(self, event):
+        for label in self.expiry_tree.selection():
+            self.open_view.select(self.expiry_groups.get(label, []))
+
+    def on_trade_select(self, trade_ids):
+        if not trade_ids:
+            # e.g. filtered out or deselected: nothing is left to close
+            self.clear_exit_form()
+            return
+        
+        if len(trade_ids) > 1:
+            self.show_batch_exit(trade_ids)
             return
             
-        item = self.tree.item(selected_item)
-        trade_id = int(item['values'][0])
+        # Nothing can be closed until this trade's legs are shown: the old ones would close it
+        # with another trade's strategy and prices
+        self.clear_exit_form()
+        self.selected_strategy = None
+        trade_id = trade_ids[0]
         self.selected_trade_id = trade_id
         
         # Get full trade details to know strategy
-        df = data_manager.load_db()
-        trade_row = df[df['Trade_ID'] == trade_id].iloc[0]
+        self.io.submit(data_manager.get_trade, trade_id, on_success=self.show_exit_legs)
+
+    def show_batch_exit(self, trade_ids):
+        # Several trades selected: shared exit date/discipline fields, one exit price per trade
+        self.selected_trade_id = None
+        self.batch_trade_ids = []
+        for w in self.exit_legs_frame.winfo_children():
+            w.destroy()
+        self.exit_leg_widgets = {}
+        self.exit_price.config(state="disabled")
+        
+        ttk.Label(self.exit_legs_frame, text="Trade").grid(row=0, column=0, padx=5)
+        ttk.Label(self.exit_legs_frame, text="Spread Exit Price").grid(row=0, column=1, padx=5)
+        for i, trade_id in enumerate(trade_ids, start=1):
+            values = self.open_view.model.rows[trade_id]
+            ttk.Label(self.exit_legs_frame, text=f"#{trade_id} {values[2]} {values[3]}").grid(row=i, column=0, sticky="w", padx=5)
+            e = ttk.Entry(self.exit_legs_frame, width=10)
+            e.insert(0, "0")  # expired worthless
+            e.grid(row=i, column=1, padx=5)
+            self.batch_trade_ids.append(trade_id)
+            self.exit_leg_widgets[trade_id] = e
+        
+        self.btn_close.config(text=f"CLOSE {len(trade_ids)} TRADES", state="normal")
+
+    def show_exit_legs(self, trade_row):
+        if trade_row['Trade_ID'] != getattr(self, 'selected_trade_id', None):
+            return  # selection changed while loading
         strategy = trade_row['Strategy']
+        self.selected_strategy = strategy
         
         # Setup exit leg fields
         for w in self.exit_legs_frame.winfo_children():
             w.destroy()
         self.exit_leg_widgets = {}
+        self.exit_price.config(state="normal")
         
         if strategy == "Credit Spread":
             labels = ["Short Leg Exit", "Long Leg Exit"]
@@ -301,44 +679,102 @@ class TradeJournalGUI:
             e.grid(row=1, column=i, padx=5)
             self.exit_leg_widgets[key] = e
             
-        self.btn_close.config(state="normal")
+        self.btn_close.config(text="CLOSE TRADE", state="normal")
 
     def close_trade(self):
-        if not hasattr(self, 'selected_trade_id'):
+        if getattr(self, 'batch_trade_ids', None):
+            self.close_trades()
+            return
+        if getattr(self, 'selected_trade_id', None) is None:
             return
 
+        # Gather Exit Data
+        raw = {
+            "Exit_Date": self.exit_date.get(),
+            "Spread_Exit_Price": self.exit_price.get(),
+            "Adjustment_Made": self.adj.get(),
+            "Exit_Emotion": self.emo.get(),
+            "Rule_Broken": self.rule.get(),
+            "Rule_Broken_Which": self.rule_which.get()
+        }
+        for key, widget in self.exit_leg_widgets.items():
+            raw[key] = widget.get()
+        
         try:
-            # Gather Exit Data
-            exit_data = {
-                "Exit_Date": self.exit_date.get(),
-                "Spread_Exit_Price": float(self.exit_price.get()),
-                "Adjustment_Made": self.adj.get(),
-                "Exit_Emotion": self.emo.get(),
-                "Rule_Broken": self.rule.get(),
-                "Rule_Broken_Which": self.rule_which.get()
-            }
-            
-            for key, widget in self.exit_leg_widgets.items():
-                val = widget.get()
-                exit_data[key] = float(val) if val else 0.0
-                
-            # Perform Calculations
-            df = data_manager.load_db()
-            trade_row = df[df['Trade_ID'] == self.selected_trade_id].iloc[0]
-            
-            computed = analytics.calculate_trade_metrics(trade_row, exit_data)
-            
-            # Save
-            data_manager.update_trade_to_closed(self.selected_trade_id, exit_data, computed)
-            
-            messagebox.showinfo("Success", "Trade Closed Successfully")
-            self.refresh_open_trades()
-            self.btn_close.config(state="disabled")
-            
+            exit_data = validation.parse_exit(raw, self.selected_strategy)
         except ValueError as e:
             messagebox.showerror("Error", f"Invalid Input: {e}")
-        except Exception as e:
-            messagebox.showerror("Error", f"System Error: {e}")
+            return
+        
+        self.btn_close.config(state="disabled")
+        self.io.submit(
+            self._close_trade_io, self.selected_trade_id, exit_data,
+            on_success=self.on_trade_closed,
+            on_error=self.on_close_failed,
+        )
+        self.submit_checkpoint()
+
+    @staticmethod
+    def _close_trade_io(trade_id, exit_data):
+        # Runs on the I/O thread
+        trade_row = data_manager.get_trade(trade_id)
+        
+        # Perform Calculations
+        computed = analytics.calculate_trade_metrics(trade_row, exit_data)
+        
+        # Save
+        data_manager.update_trade_to_closed(trade_id, exit_data, computed)
+        return trade_id
+
+    def close_trades(self):
+        shared = {
+            "Exit_Date": self.exit_date.get(),
+            "Adjustment_Made": self.adj.get(),
+            "Exit_Emotion": self.emo.get(),
+            "Rule_Broken": self.rule.get(),
+            "Rule_Broken_Which": self.rule_which.get()
+        }
+        closes = []
+        for trade_id in self.batch_trade_ids:
+            raw = dict(shared, Spread_Exit_Price=self.exit_leg_widgets[trade_id].get())
+            try:
+                closes.append((trade_id, validation.parse_exit(raw, None)))
+            except ValueError as e:
+                messagebox.showerror("Error", f"Invalid Input: Trade {trade_id}: {e}")
+                return
+        
+        self.btn_close.config(state="disabled")
+        self.io.submit(
+            data_manager.close_trades_batch, closes,
+            on_success=self.on_trades_closed,
+            on_error=self.on_close_failed,
+        )
+        self.submit_checkpoint()
+
+    def on_trade_closed(self, trade_id):
+        self.open_view.remove([trade_id])
+        messagebox.showinfo("Success", "Trade Closed Successfully")
+        self.refresh_open_trades()
+
+    def on_trades_closed(self, metrics):
+        self.open_view.remove(list(metrics.index))
+        messagebox.showinfo("Success", f"{len(metrics)} Trades Closed Successfully")
+        self.clear_exit_form()
+        self.refresh_open_trades()
+
+    def clear_exit_form(self):
+        # No trade selected: drop the single-trade and batch exit fields
+        self.selected_trade_id = None
+        self.batch_trade_ids = []
+        for w in self.exit_legs_frame.winfo_children():
+            w.destroy()
+        self.exit_leg_widgets = {}
+        self.exit_price.config(state="normal")
+        self.btn_close.config(text="CLOSE TRADE", state="disabled")
+
+    def on_close_failed(self, e):
+        self.btn_close.config(state="normal")
+        self.show_error(e)
 
     def setup_analytics_tab(self):
         # Create a Frame for the Dashboard
@@ -349,9 +785,10 @@ class TradeJournalGUI:
         self.canvas = tk.Canvas(self.dash_frame, bg="#1e1e1e", highlightthickness=0)
         self.canvas.place(relx=0, rely=0, relwidth=1, relheight=1)
 
-        # Draw some stylized candlesticks in background
-        self.draw_background_candles()
-        self.canvas.bind("<Configure>", lambda e: self.draw_background_candles())
+        # Equity curve and drawdown in the background (stylized candlesticks until there are trades)
+        self.curve = None
+        self.draw_background()
+        self.canvas.bind("<Configure>", lambda e: self.draw_background())
 
         # Dashboard Content Container (Transparent-ish via placement)
         # Using a Frame on top might block the canvas, so we place widgets directly or use a frame with care.
@@ -359,13 +796,49 @@ class TradeJournalGUI:
 
         # PnL Display
         self.pnl_label = tk.Label(self.dash_frame, text="$0.00", font=("Helvetica", 48, "bold"), bg="#1e1e1e", fg="white")
-        self.pnl_label.place(relx=0.5, rely=0.3, anchor="center")
+        self.pnl_label.place(relx=0.5, rely=0.18, anchor="center")
 
-        tk.Label(self.dash_frame, text="Cumulative PnL", font=("Helvetica", 14), bg="#1e1e1e", fg="#aaaaaa").place(relx=0.5, rely=0.4, anchor="center")
+        tk.Label(self.dash_frame, text="Cumulative PnL", font=("Helvetica", 14), bg="#1e1e1e", fg="#aaaaaa").place(relx=0.5, rely=0.28, anchor="center")
+
+        # Per-slice metrics from the analytics cube
+        breakdown_bar = tk.Frame(self.dash_frame, bg="#1e1e1e")
+        breakdown_bar.place(relx=0.5, rely=0.36, anchor="center")
+        tk.Label(breakdown_bar, text="Breakdown by:", bg="#1e1e1e", fg="#aaaaaa").pack(side="left", padx=5)
+        self.breakdown_by = ttk.Combobox(breakdown_bar, values=BREAKDOWN_DIMENSIONS, state="readonly", width=18)
+        self.breakdown_by.set("Strategy")
+        self.breakdown_by.pack(side="left")
+        self.breakdown_by.bind("<<ComboboxSelected>>", lambda e: self.refresh_analytics())
 
         # Stats Text Area (made smaller and styled)
-        self.stats_text = tk.Text(self.dash_frame, height=12, width=60, bg="#2d2d2d", fg="white", relief="flat", font=("Consolas", 10))
-        self.stats_text.place(relx=0.5, rely=0.7, anchor="center")
+        self.stats_text = tk.Text(self.dash_frame, width=78, bg="#2d2d2d", fg="white", relief="flat", font=("Consolas", 10))
+        self.stats_text.place(relx=0.5, rely=0.41, relheight=0.56, anchor="n")
+
+    def draw_background(self):
+        if self.curve is not None and len(self.curve) >= 2:
+            self.draw_equity_curve()
+        else:
+            self.draw_background_candles()
+
+    def draw_equity_curve(self):
+        # self.curve is already downsampled to CURVE_POINTS, so this stays cheap for any journal size
+        self.canvas.delete("all")
+        w = self.canvas.winfo_width()
+        h = self.canvas.winfo_height()
+
+        if w < 100: return # too small
+
+        curve = self.curve
+        t = curve.dates.astype("int64").astype(float)
+        xs = (t - t[0]) / ((t[-1] - t[0]) or 1) * (w - 40) + 20
+
+        # Equity between 15% and 65% of the height, drawdown hanging below the 75% line
+        lo, hi = curve.equity.min(), curve.equity.max()
+        eq_ys = h * 0.65 - (curve.equity - lo) / ((hi - lo) or 1) * h * 0.5
+        dd_ys = h * 0.75 + curve.drawdown / (-curve.drawdown.min() or 1) * -h * 0.2
+
+        underwater = [xs[0], h * 0.75] + [v for p in zip(xs, dd_ys) for v in p] + [xs[-1], h * 0.75]
+        self.canvas.create_polygon(underwater, fill="#3a2020", outline="")
+        self.canvas.create_line([v for p in zip(xs, eq_ys) for v in p], fill="#2f5f3a", width=2)
 
     def draw_background_candles(self):
         self.canvas.delete("all")
@@ -405,8 +878,63 @@ class TradeJournalGUI:
             self.canvas.create_rectangle(x - candle_width*0.3, open_y, x + candle_width*0.3, close_y, fill=color, outline=outline)
 
     def refresh_analytics(self):
-        df_closed = data_manager.get_closed_trades()
-        metrics = analytics.calculate_portfolio_metrics(df_closed)
+        self.io.submit(self._portfolio_metrics_io, self.breakdown_by.get(), on_success=self.show_analytics)
+
+    def _portfolio_metrics_io(self, breakdown_by, use_stale=True):
+        # Runs on the I/O thread. With use_stale, results saved for an older journal are
+        # returned as they are (marked Stale) and show_analytics asks for a rebuild.
+        data_manager.check_for_changes()  # a "reload" event if the store changed on disk
+        if self.analytics_current:
+            # Nothing closed or reloaded since the results were checked: no need to read the trades
+            metrics = self.analytics.results()
+            metrics['Breakdown'] = self.cube.breakdown(breakdown_by)
+            return metrics
+        
+        df_closed = data_manager.get_closed_trades(columns=snapshot.COLUMNS)
+        trade_ids, hashes = snapshot.fingerprint(df_closed)
+        path = snapshot.path_for(data_manager.get_backend().path)
+        if self.analytics is None:
+            self.analytics = snapshot.AnalyticsSnapshot.load(path)
+        saved = self.analytics
+        new = None if saved is None else saved.new_trades(trade_ids, hashes)
+        
+        if new is not None and not new.any():
+            # Nothing closed since the results were saved
+            if self.cube is None:
+                self.cube = saved.restore_cube()
+            self.analytics_current = True
+            metrics = saved.results()
+            metrics['Breakdown'] = self.cube.breakdown(breakdown_by)
+            return metrics
+        
+        if self.portfolio is None or self.cube is None:
+            if new is not None and new.sum() <= snapshot.FOLD_LIMIT:
+                # Only trades closed since the results were saved need folding in
+                self.cube, self.portfolio = saved.fold(df_closed[new])
+            elif saved is not None and use_stale:
+                metrics = saved.results()
+                metrics['Breakdown'] = saved.restore_cube().breakdown(breakdown_by)
+                metrics['Stale'] = True
+                return metrics
+            else:
+                self.portfolio = analytics.PortfolioAccumulator.from_frame(df_closed)
+                self.cube = cube.AnalyticsCube.from_frame(df_closed)
+        
+        self.analytics = snapshot.AnalyticsSnapshot.build(trade_ids, hashes, self.portfolio, self.cube,
+                                                          df_closed, CURVE_POINTS)
+        self.analytics_current = True
+        try:
+            self.analytics.save(path)
+        except OSError:
+            pass  # e.g. a read-only folder: the results are still shown, just rebuilt next start
+        metrics = self.analytics.results()
+        metrics['Breakdown'] = self.cube.breakdown(breakdown_by)
+        return metrics
+
+    def show_analytics(self, metrics):
+        if metrics.get('Stale'):
+            # Saved results of an older journal: shown while they are rebuilt
+            self.io.submit(self._portfolio_metrics_io, self.breakdown_by.get(), False, on_success=self.show_analytics)
         
         # Update PnL
         pnl = metrics['Cumulative_PnL']
@@ -418,27 +946,53 @@ class TradeJournalGUI:
             self.pnl_label.config(fg="#ff4444") # Red
 
         # Update Stats Text
-        text = f"PORTFOLIO METRICS\n"
+        text = f"PORTFOLIO METRICS{' (updating...)' if metrics.get('Stale') else ''}\n"
         text += f"-----------------\n"
         text += f"Trades:      {metrics['Total_Trades']}\n"
         text += f"Win Rate:    {metrics['Win_Rate']:.1f}%\n"
         text += f"Expectancy:  ${metrics['Expectancy']:.2f}\n"
         text += f"Max DD:      ${metrics['Max_Drawdown']:.2f}\n"
-        text += f"Current DD:  ${metrics['Drawdown']:.2f}\n\n"
+        text += f"Current DD:  ${metrics['Drawdown']:.2f}\n"
+        text += f"Underwater:  {metrics['Longest_Underwater']:.0f} days max\n\n"
+        
+        rolling = metrics['Rolling']
+        if rolling is not None:
+            windows = analytics.ROLLING_WINDOWS
+            text += "Rolling      " + "".join(f"{w:>9}" for w in windows) + "\n"
+            for label, metric in (("Win %", "Win_Rate"), ("Expectancy", "Expectancy"),
+                                  ("Risk Util %", "Risk_Utilization"), ("Violation %", "Violation_Rate")):
+                values = [rolling[f'{metric}_{w}'] for w in windows]
+                # NaN until a trade-count window has filled up
+                text += f"{label:<13}" + "".join(f"{v:>9.1f}" if v == v else f"{'-':>9}" for v in values) + "\n"
+            text += "\n"
         
         text += "Recent Equity Curve:\n"
         if metrics.get('Equity_Curve'):
-            curve = metrics['Equity_Curve'][-8:] # Last 8
+            curve = metrics['Equity_Curve'] # Last 8
             curve_str = " -> ".join([f"${v:.0f}" for v in curve])
             text += curve_str
         else:
             text += "No data."
         
+        breakdown = metrics['Breakdown']
+        if len(breakdown):
+            text += f"\n\n{breakdown.index.name:<16}{'Trades':>7}{'Win %':>8}{'Expect.':>10}{'Max DD':>11}{'RoM %':>8}{'Eff. %':>8}\n"
+            for label, row in breakdown.iterrows():
+                text += (f"{str(label):<16}{row['Total_Trades']:>7.0f}{row['Win_Rate']:>8.1f}{row['Expectancy']:>10.2f}"
+                         f"{row['Max_Drawdown']:>11.2f}{row['Avg_Return_on_Margin_%']:>8.1f}{row['Avg_Exit_Efficiency_%']:>8.1f}\n")
+        
         self.stats_text.delete(1.0, tk.END)
         self.stats_text.insert(tk.END, text)
+        
+        self.curve = metrics['Curve']
+        self.draw_background()
+
+# Times every event handler when TRADE_JOURNAL_PROFILE is set
+instrumentation.instrument_class(TradeJournalGUI, "gui")
 
 if __name__ == "__main__":
-    data_manager.initialize_db()
     root = tk.Tk()
     app = TradeJournalGUI(root)
+    root.update()
+    app.load_journal()
     root.mainloop()
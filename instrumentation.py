@@ -0,0 +1,260 @@
+"""
+Timing and metrics for the journal's hot paths.
+
+Turned on with TRADE_JOURNAL_PROFILE=1. When it is off, instrument_module()
+and instrument_class() leave everything untouched, so there is no cost.
+
+Every instrumented call records its latency (count, total, max and a
+histogram), the rows it returned or touched, and the bytes the storage
+layer read or wrote while it ran. Results are available from snapshot(),
+dump_json() and the GUI's Diagnostics window.
+
+    TRADE_JOURNAL_PROFILE=1                     collect timings
+    TRADE_JOURNAL_PROFILE_OUT=stats.json        also write them out at exit
+    TRADE_JOURNAL_CPROFILE=update_trade_to_closed,analytics.*
+                                                cProfile these operations too
+                                                (fnmatch patterns; saved as
+                                                <operation>.prof next to the JSON)
+"""
+import atexit
+import fnmatch
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("TRADE_JOURNAL_PROFILE", "").lower() in ("1", "true", "yes", "on")
+OUTPUT = os.environ.get("TRADE_JOURNAL_PROFILE_OUT")
+CPROFILE = [p.strip() for p in os.environ.get("TRADE_JOURNAL_CPROFILE", "").split(",") if p.strip()]
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+BUCKETS_MS = [0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000, 3000]
+
+
+class OperationStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+        self.rows = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.profile = None
+
+    def add(self, ms, failed, rows, bytes_read, bytes_written):
+        self.calls += 1
+        self.errors += failed
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        bucket = next((i for i, bound in enumerate(BUCKETS_MS) if ms <= bound), len(BUCKETS_MS))
+        self.histogram[bucket] += 1
+        self.rows += rows
+        self.bytes_read += bytes_read
+        self.bytes_written += bytes_written
+
+    def percentile(self, q):
+        """Upper bound (ms) of the histogram bucket holding the q-th percentile."""
+        target = q / 100 * self.calls
+        seen = 0
+        for bound, count in zip(BUCKETS_MS + [self.max_ms], self.histogram):
+            seen += count
+            if count and seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "max_ms": round(self.max_ms, 3),
+            "histogram": dict(zip([f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"], self.histogram)),
+            "rows": self.rows,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+        }
+
+
+_stats = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class _Span:
+    __slots__ = ("rows", "bytes_read", "bytes_written")
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+
+def _spans():
+    if not hasattr(_local, "spans"):
+        _local.spans = []
+    return _local.spans
+
+
+def record(rows=0, bytes_read=0, bytes_written=0):
+    """
+    Adds rows touched / bytes moved to every operation running on this
+    thread, e.g. from the storage layer after it reads a file.
+    """
+    for span in _spans():
+        span.rows += rows
+        span.bytes_read += bytes_read
+        span.bytes_written += bytes_written
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _rows_of(result):
+    if hasattr(result, "shape"):
+        return result.shape[0] if len(result.shape) else 0
+    if isinstance(result, (list, tuple, dict)):
+        return len(result)
+    return 0
+
+
+def _should_profile(name):
+    return any(fnmatch.fnmatchcase(name, p) or fnmatch.fnmatchcase(name.split(".")[-1], p) for p in CPROFILE)
+
+
+def timed(name):
+    """Decorator recording each call of the function under `name` (a no-op when disabled)."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        profile = _should_profile(name)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            spans = _spans()
+            span = _Span()
+            spans.append(span)
+            profiler = None
+            if profile and not getattr(_local, "profiling", False):
+                import cProfile
+                profiler = cProfile.Profile()
+                _local.profiling = True
+                profiler.enable()
+            failed = False
+            t0 = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                ms = (time.perf_counter() - t0) * 1000
+                if profiler is not None:
+                    profiler.disable()
+                    _local.profiling = False
+                spans.pop()
+                rows = span.rows
+                if not failed and not rows:
+                    rows = _rows_of(result)
+                with _lock:
+                    stats = _stats.setdefault(name, OperationStats())
+                    stats.add(ms, failed, rows, span.bytes_read, span.bytes_written)
+                    if profiler is not None:
+                        import pstats
+                        if stats.profile is None:
+                            stats.profile = pstats.Stats(profiler)
+                        else:
+                            stats.profile.add(profiler)
+            return result
+        return wrapper
+    return decorate
+
+
+def instrument_module(namespace, prefix, exclude=()):
+    """
+    Wraps every public function defined in a module (except `exclude`), e.g.
+    instrument_module(globals(), "data_manager") at the end of the module.
+    Calls made inside the module go through the wrappers too.
+    """
+    if not ENABLED:
+        return
+    module = namespace["__name__"]
+    for attr, value in list(namespace.items()):
+        if attr.startswith("_") or attr in exclude:
+            continue
+        if inspect.isfunction(value) and value.__module__ == module:
+            namespace[attr] = timed(f"{prefix}.{attr}")(value)
+
+
+def instrument_class(cls, prefix, names=None):
+    """
+    Wraps the public methods of cls, or just `names` (which may be
+    inherited), recorded as prefix.method.
+    """
+    if not ENABLED:
+        return cls
+    for attr in names if names is not None else list(vars(cls)):
+        if attr.startswith("_"):
+            continue
+        value = inspect.getattr_static(cls, attr)
+        name = f"{prefix}.{attr}"
+        if isinstance(value, staticmethod):
+            setattr(cls, attr, staticmethod(timed(name)(value.__func__)))
+        elif isinstance(value, classmethod):
+            setattr(cls, attr, classmethod(timed(name)(value.__func__)))
+        elif inspect.isfunction(value):
+            setattr(cls, attr, timed(name)(value))
+    return cls
+
+
+def snapshot():
+    """Returns {operation: stats dict}, slowest total time first."""
+    with _lock:
+        items = [(name, stats.as_dict()) for name, stats in _stats.items()]
+    return dict(sorted(items, key=lambda item: -item[1]["total_ms"]))
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def dump_json(path):
+    """
+    Writes snapshot() to path as JSON, plus one <operation>.prof file (pstats
+    format) per cProfiled operation in the same directory. Returns path.
+    """
+    with open(path, "w") as f:
+        json.dump({"enabled": ENABLED, "operations": snapshot()}, f, indent=2)
+    with _lock:
+        profiles = [(name, stats.profile) for name, stats in _stats.items() if stats.profile is not None]
+    folder = os.path.dirname(os.path.abspath(path))
+    for name, profile in profiles:
+        profile.dump_stats(os.path.join(folder, f"{name}.prof"))
+    return path
+
+
+def format_table(stats=None):
+    """snapshot() as a plain-text table, for the Diagnostics window and the console."""
+    stats = snapshot() if stats is None else stats
+    lines = [f"{'operation':<44}{'calls':>7}{'mean ms':>10}{'p95 ms':>9}{'max ms':>10}{'rows':>9}{'KiB read':>10}{'KiB written':>12}"]
+    for name, s in stats.items():
+        lines.append(
+            f"{name:<44}{s['calls']:>7}{s['mean_ms']:>10.2f}{s['p95_ms']:>9.1f}{s['max_ms']:>10.1f}"
+            f"{s['rows']:>9}{s['bytes_read'] / 1024:>10.1f}{s['bytes_written'] / 1024:>12.1f}"
+        )
+    return "\n".join(lines)
+
+
+if ENABLED and OUTPUT:
+    atexit.register(dump_json, OUTPUT)
@@ -0,0 +1,89 @@
+import queue
+import threading
+
+
+class IOExecutor:
+    """
+    Runs journal I/O (data_manager and analytics calls) off the Tk main loop.
+
+    There is a single worker thread, so jobs run one at a time in the order
+    they were submitted: writes are serialized and a close can't race a save.
+    Results are handed back to the main thread by polling a queue with
+    root.after, because Tk widgets must only be touched from the main thread.
+    """
+
+    POLL_MS = 30
+
+    def __init__(self, root, on_busy_changed=None, on_error=None):
+        self.root = root
+        self.on_busy_changed = on_busy_changed
+        self.on_error = on_error
+        self.pending = 0
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._polling = False
+        self._worker = threading.Thread(target=self._run, name="journal-io", daemon=True)
+        self._worker.start()
+
+    def submit(self, fn, *args, on_success=None, on_error=None, **kwargs):
+        """
+        Queues fn(*args, **kwargs) on the worker thread.
+
+        on_success(result) / on_error(exception) are called on the Tk main
+        thread once the job finishes. Without on_error, failures go to the
+        executor-wide on_error handler.
+        """
+        self.pending += 1
+        self._jobs.put((fn, args, kwargs, on_success, on_error))
+        self._busy_changed()
+        self._schedule_poll()
+
+    def shutdown(self):
+        """Stops the worker after the jobs already queued have run."""
+        self._jobs.put(None)
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            fn, args, kwargs, on_success, on_error = job
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self._results.put((on_error or self.on_error, e))
+            else:
+                self._results.put((on_success, result))
+
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_MS, self._poll)
+
+    def _poll(self):
+        self._polling = False
+        try:
+            while True:
+                try:
+                    callback, value = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                self.pending -= 1
+                try:
+                    if callback is not None:
+                        callback(value)
+                except Exception as e:
+                    # Reported like a failed job, so the results queued behind it are still delivered
+                    if self.on_error is None or callback is self.on_error:
+                        raise
+                    self.on_error(e)
+                finally:
+                    self._busy_changed()
+        finally:
+            # Even if a callback raised out of here, the remaining results get another poll
+            if self.pending:
+                self._schedule_poll()
+
+    def _busy_changed(self):
+        if self.on_busy_changed is not None:
+            self.on_busy_changed(self.pending)
@@ -0,0 +1,327 @@
+"""
+Live mark-to-market of open trades from a quote feed.
+
+The journal has no option symbols or strikes, so a quote names the trade
+and the leg it prices: Quote(Trade_ID, leg, price), where leg is one of
+LEGS ("Short_Leg", "Long_Call", ...) or "Spread" for the whole spread.
+A trade is marked once every leg of its strategy has a quote (a "Spread"
+quote takes precedence over leg quotes).
+
+MarkBook holds the open positions and their latest leg prices as NumPy
+arrays and reprices the touched trades in one vectorized step per batch of
+quotes. MarkToMarketService feeds a book from an async quote source
+(csv_replay() or socket_source(), or any async iterable of quote lists) and
+hands the changed marks to on_update() at most once per `interval`
+seconds, however fast quotes arrive.
+"""
+import asyncio
+import csv
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import analytics
+import instrumentation
+import validation
+
+Quote = namedtuple("Quote", "trade_id leg price")
+
+SPREAD = "Spread"
+
+# Leg names come from the entry fields: Short_Leg_Entry -> Short_Leg
+STRATEGY_LEGS = {
+    strategy: [field[:-len("_Entry")] for field in fields]
+    for strategy, fields in validation.ENTRY_LEGS.items()
+}
+LEGS = list(dict.fromkeys(leg for legs in STRATEGY_LEGS.values() for leg in legs))
+_COLUMN = {leg: i for i, leg in enumerate(LEGS + [SPREAD])}
+
+# Columns a MarkBook needs from get_open_trades()
+POSITION_COLUMNS = ["Trade_ID", "Strategy", "Spread_Entry_Price", "Lots", "Max_Loss",
+                    "Credit_Received", "Planned_Exit_Percent"]
+
+# What marks() returns per trade, in order
+MARK_FIELDS = ["Mark", "Unrealized_PnL", "Risk_Utilization_%", "Profit_Captured_%", "Target_Progress_%"]
+
+
+def _ratio(numerator, denominator):
+    """numerator / denominator, 0.0 where the denominator is 0 (as in analytics)."""
+    out = np.zeros(len(numerator))
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return np.where(np.isnan(numerator), np.nan, out)
+
+
+class MarkBook:
+    """
+    Open positions and their marks. apply() and set_positions() may be
+    called from different threads.
+
+    Per trade: Mark is the price to close the spread (short legs minus long
+    legs), Unrealized_PnL is (Spread_Entry_Price - Mark) x Lots x Multiplier,
+    Risk_Utilization_% is |Unrealized_PnL| / Max_Loss x 100 (the closed-trade
+    formulas), Profit_Captured_% is Unrealized_PnL as a % of the maximum
+    profit, and Target_Progress_% is Profit_Captured_% as a % of
+    Planned_Exit_Percent (100 = at the planned exit).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = np.array([], dtype=np.int64)       # sorted Trade_IDs
+        self._sign = np.zeros((0, len(_COLUMN)))        # +1 short leg, -1 long leg, 0 not used
+        self._prices = np.full((0, len(_COLUMN)), np.nan)
+        self._entry = self._lots = self._max_loss = self._max_profit = self._target = np.array([])
+        self._marks = np.full((0, len(MARK_FIELDS)), np.nan)
+        self._changed = set()
+        self.ignored = 0  # quotes for unknown trades or legs
+
+    def set_positions(self, df_open):
+        """
+        Replaces the open positions (a DataFrame with POSITION_COLUMNS). Quotes
+        already received for trades that are still open are kept.
+        """
+        df = df_open.dropna(subset=["Trade_ID"])
+        ids = pd.to_numeric(df["Trade_ID"]).to_numpy(dtype=np.int64)
+        order = np.argsort(ids)
+        ids = ids[order]
+
+        def col(name):
+            return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=float, na_value=np.nan)[order]
+
+        sign = np.zeros((len(ids), len(_COLUMN)))
+        strategies = df["Strategy"].astype(object).to_numpy()[order]
+        for strategy, legs in STRATEGY_LEGS.items():
+            rows = strategies == strategy
+            for leg in legs:
+                sign[rows, _COLUMN[leg]] = 1.0 if leg.startswith("Short") else -1.0
+        lots = col("Lots")
+
+        with self._lock:
+            prices = np.full((len(ids), len(_COLUMN)), np.nan)
+            kept = np.isin(ids, self._ids)
+            if kept.any():
+                prices[kept] = self._prices[np.searchsorted(self._ids, ids[kept])]
+            self._ids, self._sign, self._prices = ids, sign, prices
+            self._entry = col("Spread_Entry_Price")
+            self._lots = lots
+            self._max_loss = col("Max_Loss")
+            self._max_profit = col("Credit_Received") * lots * analytics.MULTIPLIER
+            self._target = col("Planned_Exit_Percent")
+            self._marks = np.full((len(ids), len(MARK_FIELDS)), np.nan)
+            self._reprice(np.arange(len(ids)))
+            self._changed = set(ids.tolist())
+
+    def __len__(self):
+        return len(self._ids)
+
+    def apply(self, quotes):
+        """
+        Applies a batch of Quote (the last quote wins when a leg is quoted
+        twice) and reprices the trades it touches. Returns how many were used.
+        """
+        if not quotes:
+            return 0
+        trade_ids = np.fromiter((q.trade_id for q in quotes), dtype=np.int64, count=len(quotes))
+        columns = np.fromiter((_COLUMN.get(q.leg, -1) for q in quotes), dtype=np.intp, count=len(quotes))
+        prices = np.fromiter((q.price for q in quotes), dtype=float, count=len(quotes))
+        with self._lock:
+            rows = np.searchsorted(self._ids, trade_ids)
+            known = (rows < len(self._ids)) & (columns >= 0)
+            known[known] = self._ids[rows[known]] == trade_ids[known]
+            self.ignored += len(quotes) - int(known.sum())
+            rows, columns, prices = rows[known], columns[known], prices[known]
+            if len(rows) == 0:
+                return 0
+            # Keep only the last quote per (trade, leg)
+            key = rows * len(_COLUMN) + columns
+            _, last = np.unique(key[::-1], return_index=True)
+            last = len(key) - 1 - last
+            self._prices[rows[last], columns[last]] = prices[last]
+            touched = np.unique(rows)
+            self._reprice(touched)
+            self._changed.update(self._ids[touched].tolist())
+            return len(rows)
+
+    def _reprice(self, rows):
+        prices = self._prices[rows]
+        sign = self._sign[rows]
+        missing_leg = ((sign != 0) & np.isnan(prices)).any(axis=1) | ~(sign != 0).any(axis=1)
+        from_legs = np.where(missing_leg, np.nan, (sign * np.nan_to_num(prices)).sum(axis=1))
+        spread = prices[:, _COLUMN[SPREAD]]
+        mark = np.where(np.isnan(spread), from_legs, spread)
+
+        unrealized = (self._entry[rows] - mark) * self._lots[rows] * analytics.MULTIPLIER
+        captured = _ratio(unrealized, self._max_profit[rows]) * 100
+        self._marks[rows] = np.column_stack([
+            mark,
+            unrealized,
+            _ratio(np.abs(unrealized), self._max_loss[rows]) * 100,
+            captured,
+            _ratio(captured, self._target[rows]) * 100,
+        ])
+
+    def marks(self, trade_ids=None):
+        """{Trade_ID: tuple of MARK_FIELDS} (NaN until a trade is fully quoted)."""
+        with self._lock:
+            if trade_ids is None:
+                rows = np.arange(len(self._ids))
+            else:
+                wanted = np.fromiter(trade_ids, dtype=np.int64)
+                rows = np.searchsorted(self._ids, wanted)
+                rows = rows[(rows < len(self._ids))]
+                rows = rows[np.isin(self._ids[rows], wanted)]
+            return dict(zip(self._ids[rows].tolist(), map(tuple, self._marks[rows].tolist())))
+
+    def take_changes(self):
+        """marks() of the trades repriced since the last call."""
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        return self.marks(changed) if changed else {}
+
+    def frame(self):
+        """All marks as a DataFrame indexed by Trade_ID."""
+        marks = self.marks()
+        return pd.DataFrame(list(marks.values()), index=pd.Index(list(marks), name="Trade_ID"), columns=MARK_FIELDS)
+
+
+def parse_quote(fields):
+    """Quote from (Trade_ID, leg, price) text fields; ValueError if malformed."""
+    trade_id, leg, price = (f.strip() for f in fields)
+    return Quote(int(trade_id), leg, float(price))
+
+
+async def csv_replay(path, speed=None, batch_size=500):
+    """
+    Quotes from a CSV file with Trade_ID, Leg and Price columns, in batches.
+
+    With a Time column (seconds) and speed, the quotes are replayed at
+    `speed` times their recorded pace (1.0 = real time); otherwise as fast as
+    the consumer takes them. Malformed rows are skipped.
+    """
+    start = time.monotonic()
+    first = None
+    batch = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            try:
+                quote = parse_quote((row["Trade_ID"], row["Leg"], row["Price"]))
+            except (KeyError, TypeError, ValueError, AttributeError):
+                continue
+            if speed and row.get("Time"):
+                t = float(row["Time"])
+                first = t if first is None else first
+                delay = (t - first) / speed - (time.monotonic() - start)
+                if delay > 0:
+                    if batch:
+                        yield batch
+                        batch = []
+                    await asyncio.sleep(delay)
+            batch.append(quote)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+                await asyncio.sleep(0)  # let the flusher run between batches
+    if batch:
+        yield batch
+
+
+async def socket_source(host, port):
+    """
+    Quotes from a TCP line feed, one "Trade_ID,Leg,Price" per line. Each
+    read yields every complete line received so far as one batch.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        pending = b""
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            batch = []
+            for line in lines:
+                try:
+                    batch.append(parse_quote(line.decode("utf-8").split(",")))
+                except ValueError:
+                    continue
+            if batch:
+                yield batch
+    finally:
+        writer.close()
+
+
+def source_from_spec(spec):
+    """A quote source from "host:port" (socket_source) or a CSV path (csv_replay in real time)."""
+    host, sep, port = spec.rpartition(":")
+    if sep and port.isdigit() and host:
+        return socket_source(host, int(port))
+    return csv_replay(spec, speed=1.0)
+
+
+class MarkToMarketService:
+    """
+    Feeds a MarkBook from an async quote source and calls
+    on_update({Trade_ID: marks}) with the trades whose marks changed, at most
+    once per `interval` seconds (and once more when the source ends).
+    """
+
+    def __init__(self, book, source, on_update, interval=0.25):
+        self.book = book
+        self.source = source
+        self.on_update = on_update
+        self.interval = interval
+        self.quotes = 0
+        self.updates = 0
+        self._loop = None
+        self._task = None
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        flusher = asyncio.create_task(self._flush_every_interval())
+        try:
+            async for batch in self.source:
+                self.quotes += len(batch)
+                self.book.apply(batch)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            flusher.cancel()
+            self._flush()
+
+    async def _flush_every_interval(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self._flush()
+
+    def _flush(self):
+        changed = self.book.take_changes()
+        if changed:
+            self.updates += 1
+            self.on_update(changed)
+
+    def start_thread(self, on_error=None):
+        """
+        Runs the service on its own event loop in a daemon thread.
+        on_error(exception) is called on that thread if the source fails.
+        """
+        def run():
+            try:
+                asyncio.run(self.run())
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(e)
+        thread = threading.Thread(target=run, name="mark-to-market", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Stops a running service from any thread."""
+        if self._loop is not None and self._task is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+
+# Timings when TRADE_JOURNAL_PROFILE is set
+instrumentation.instrument_class(MarkBook, "marking.MarkBook", names=("set_positions", "apply", "take_changes"))
@@ -0,0 +1,198 @@
+"""
+Monte Carlo simulation of future equity curves from the closed trades.
+
+Each path draws `horizon` trades with replacement from the journal's closed
+trades (Realized_PnL together with the Margin_Used it needed) and follows
+the account equity from `account_size`. Across many paths this gives the
+distribution of max drawdown, the time to recover from it, final equity and
+the risk of ruin: the share of paths where the account falls to
+`ruin_level` or cannot put up the margin of the next trade.
+
+Paths are generated as NumPy arrays in batches. With more than one batch,
+the batches run on a process pool. Every batch gets its own seed from
+`seed`, so results don't depend on the number of workers.
+
+    python simulation.py --account 25000 --paths 100000
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import instrumentation
+
+# Columns simulate_trades needs from the journal
+COLUMNS = ["Realized_PnL", "Margin_Used"]
+
+# Upper bound on the cells (paths x horizon) of one batch, about 16 MB per array
+BATCH_CELLS = 2_000_000
+
+
+class SimulationResult:
+    """
+    Per-path NumPy arrays:
+
+    max_drawdown:     deepest fall from a running equity peak ($, 0 or negative)
+    max_drawdown_pct: the same fall as a % of that peak
+    recovery:         trades from the deepest point back to the previous peak
+                      (NaN if the path never got back within the horizon)
+    final_equity:     equity after the last trade
+    ruined:           the path hit ruin_level or could not fund a trade's margin
+    """
+
+    def __init__(self, account_size, horizon, max_drawdown, max_drawdown_pct, recovery, final_equity, ruined):
+        self.account_size = account_size
+        self.horizon = horizon
+        self.max_drawdown = max_drawdown
+        self.max_drawdown_pct = max_drawdown_pct
+        self.recovery = recovery
+        self.final_equity = final_equity
+        self.ruined = ruined
+
+    def __len__(self):
+        return len(self.ruined)
+
+    @property
+    def risk_of_ruin(self):
+        """Share of paths ruined, in %."""
+        return float(self.ruined.mean() * 100) if len(self) else 0.0
+
+    def summary(self):
+        """
+        Headline numbers as a dict. Drawdown percentiles are "no worse than":
+        Max_Drawdown_p95 is the drawdown 95% of paths stayed within.
+        """
+        recovered = self.recovery[~np.isnan(self.recovery)]
+        return {
+            "Paths": len(self),
+            "Horizon": self.horizon,
+            "Account_Size": self.account_size,
+            "Risk_of_Ruin_%": self.risk_of_ruin,
+            "Max_Drawdown_p50": float(np.percentile(self.max_drawdown, 50)),
+            "Max_Drawdown_p95": float(np.percentile(self.max_drawdown, 5)),
+            "Max_Drawdown_p99": float(np.percentile(self.max_drawdown, 1)),
+            "Max_Drawdown_%_p50": float(np.percentile(self.max_drawdown_pct, 50)),
+            "Max_Drawdown_%_p95": float(np.percentile(self.max_drawdown_pct, 5)),
+            "Recovery_Trades_p50": float(np.percentile(recovered, 50)) if len(recovered) else float("nan"),
+            "Recovery_Trades_p95": float(np.percentile(recovered, 95)) if len(recovered) else float("nan"),
+            "Unrecovered_%": float(np.isnan(self.recovery).mean() * 100),
+            "Final_Equity_p5": float(np.percentile(self.final_equity, 5)),
+            "Final_Equity_p50": float(np.percentile(self.final_equity, 50)),
+            "Final_Equity_p95": float(np.percentile(self.final_equity, 95)),
+        }
+
+
+def simulate_batch(pnls, margins, account_size, horizon, paths, ruin_level, seed):
+    """
+    Simulates one batch of `paths` paths in this process. Returns a dict of
+    the SimulationResult arrays for the batch (module-level so a process
+    pool can run it).
+    """
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(pnls), size=(paths, horizon))
+    equity = account_size + np.cumsum(pnls[picks], axis=1)
+    before = np.concatenate([np.full((paths, 1), float(account_size)), equity[:, :-1]], axis=1)
+
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), account_size)
+    drawdown = equity - peak
+    trough = np.argmin(drawdown, axis=1)
+    rows = np.arange(paths)
+    max_drawdown = drawdown[rows, trough]
+    trough_peak = peak[rows, trough]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        max_drawdown_pct = np.where(trough_peak > 0, max_drawdown / trough_peak * 100, np.nan)
+
+    # First trade after the trough that gets back to the peak before it
+    back = (equity >= trough_peak[:, None]) & (np.arange(horizon) > trough[:, None])
+    recovered = back.any(axis=1) | (max_drawdown == 0)
+    recovery = np.where(recovered, np.argmax(back, axis=1) - trough, np.nan)
+    recovery[max_drawdown == 0] = 0
+
+    ruined = (equity <= ruin_level).any(axis=1)
+    if margins is not None:
+        ruined |= (before < margins[picks]).any(axis=1)
+
+    return {
+        "max_drawdown": max_drawdown, "max_drawdown_pct": max_drawdown_pct, "recovery": recovery,
+        "final_equity": equity[:, -1], "ruined": ruined,
+    }
+
+
+def simulate(pnls, account_size, paths=10000, horizon=None, margins=None, ruin_level=0.0,
+             seed=None, workers=None, batch_size=None):
+    """
+    Bootstraps `paths` equity curves from a PnL distribution.
+
+    pnls: Realized_PnL of each closed trade (missing values are dropped).
+    account_size: starting equity.
+    horizon: trades per path (default: as many as in pnls).
+    margins: Margin_Used of each trade, same order as pnls; if given, a path
+             is ruined when its equity can't cover the margin of the next trade.
+    ruin_level: a path is ruined when its equity falls to this or below.
+    seed: makes the result reproducible (for any workers/batch_size split,
+          as long as batch_size is the same).
+    workers: processes to use (default: os.cpu_count(); 1 runs in-process).
+    batch_size: paths per batch (default: as many as fit in BATCH_CELLS).
+
+    Returns: SimulationResult.
+    """
+    pnls = pd.to_numeric(pd.Series(pnls), errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    keep = ~np.isnan(pnls)
+    if margins is not None:
+        margins = pd.to_numeric(pd.Series(margins), errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        if len(margins) != len(pnls):
+            raise ValueError("pnls and margins must have the same length.")
+        margins = np.nan_to_num(margins[keep])
+    pnls = pnls[keep]
+    if len(pnls) == 0:
+        raise ValueError("Need at least one closed trade with a Realized_PnL to simulate.")
+    if paths < 1:
+        raise ValueError("paths must be at least 1.")
+    horizon = len(pnls) if horizon is None else int(horizon)
+    if horizon < 1:
+        raise ValueError("horizon must be at least 1.")
+
+    batch_size = batch_size or max(1, BATCH_CELLS // horizon)
+    sizes = [min(batch_size, paths - start) for start in range(0, paths, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(pnls, margins, account_size, horizon, n, ruin_level, s) for n, s in zip(sizes, seeds)]
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            batches = list(pool.map(simulate_batch, *zip(*jobs)))
+    else:
+        batches = [simulate_batch(*job) for job in jobs]
+
+    merged = {key: np.concatenate([b[key] for b in batches]) for key in batches[0]}
+    return SimulationResult(account_size, horizon, **merged)
+
+
+def simulate_trades(df_closed, account_size, **kwargs):
+    """simulate() over a DataFrame of closed trades (e.g. data_manager.get_closed_trades(columns=COLUMNS))."""
+    return simulate(df_closed["Realized_PnL"], account_size, margins=df_closed["Margin_Used"], **kwargs)
+
+
+# Timings when TRADE_JOURNAL_PROFILE is set
+instrumentation.instrument_module(globals(), "simulation", exclude=("simulate_batch",))
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import time
+    import data_manager
+
+    parser = argparse.ArgumentParser(description="Monte Carlo drawdown and risk-of-ruin simulation over the closed trades")
+    parser.add_argument("--account", type=float, required=True, help="starting account size")
+    parser.add_argument("--paths", type=int, default=10000)
+    parser.add_argument("--horizon", type=int, help="trades per path (default: number of closed trades)")
+    parser.add_argument("--ruin-level", type=float, default=0.0, help="equity at or below which an account is ruined")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int, help="processes (default: all cores)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = simulate_trades(data_manager.get_closed_trades(columns=COLUMNS), args.account, paths=args.paths,
+                             horizon=args.horizon, ruin_level=args.ruin_level, seed=args.seed, workers=args.workers)
+    summary = result.summary()
+    summary["Seconds"] = round(time.perf_counter() - start, 3)
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,183 @@
+"""
+Precomputed Analytics tab results, saved next to the journal.
+
+An AnalyticsSnapshot holds what the Analytics tab shows (the portfolio
+metrics, the downsampled equity curve and the latest rolling metrics)
+plus the PortfolioAccumulator and AnalyticsCube they come from. It is saved as
+<store>.analytics.npz and keyed by a fingerprint of the closed trades:
+one hash per trade over every column the analytics read (COLUMNS).
+
+Checking a snapshot against the journal is a hash and a set lookup, so
+the tab can show saved results in milliseconds. If trades were only
+closed since, fold() restores the accumulator and the cube from the
+snapshot and folds just those in. Anything else (a trade edited,
+reopened or removed, another journal) needs a rebuild from the trades.
+"""
+import json
+import zipfile
+import numpy as np
+import pandas as pd
+import analytics
+import cube
+import instrumentation
+import timeseries
+from storage import atomic_write
+
+# Bumped whenever the saved contents change; older snapshots are ignored
+VERSION = 2
+
+# Saved as <store path> + SUFFIX
+SUFFIX = ".analytics.npz"
+
+# Columns the analytics read, and so the columns a trade's fingerprint covers
+COLUMNS = list(dict.fromkeys(["Trade_ID"] + cube.COLUMNS + analytics.ROLLING_COLUMNS))
+
+# Above this many trades closed since a snapshot, rebuilding beats folding them in one at a time
+FOLD_LIMIT = 1000
+
+
+def path_for(store_path):
+    return store_path + SUFFIX
+
+
+def fingerprint(df_closed):
+    """
+    (Trade_IDs, hashes) of the closed trades: int64 IDs (-1 where missing)
+    and a uint64 hash of each trade's COLUMNS values.
+    """
+    df = df_closed.reindex(columns=COLUMNS)
+    ids = pd.to_numeric(df["Trade_ID"], errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+    return ids, hashes
+
+
+def _digest(hashes):
+    # Order-independent; uint64 addition wraps around
+    return int(np.add.reduce(hashes, dtype=np.uint64)) if len(hashes) else 0
+
+
+def _plain(value):
+    """JSON default for NumPy scalars."""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class AnalyticsSnapshot:
+    """
+    The Analytics tab's results for one set of closed trades.
+
+    Build one with build() from an up-to-date PortfolioAccumulator and
+    AnalyticsCube, save() it, and load() it on a later start.
+    """
+
+    def __init__(self, trade_ids, digest, metrics, curve, rolling, portfolio_state, cube_state):
+        self.trade_ids = trade_ids    # sorted int64 Trade_IDs covered
+        self.digest = digest          # _digest() of their fingerprint hashes
+        self.metrics = metrics        # PortfolioAccumulator.metrics(curve_tail=8) plus Longest_Underwater
+        self.curve = curve            # downsampled daily timeseries.EquitySeries
+        self.rolling = rolling        # {column: value} of the last rolling_metrics row (metrics only), or None
+        self.portfolio_state = portfolio_state  # PortfolioAccumulator.state()
+        self.cube_state = cube_state  # AnalyticsCube.state()
+
+    @classmethod
+    def build(cls, trade_ids, hashes, portfolio, cube_, df_closed, curve_points):
+        """
+        Takes a snapshot of the live analytics.
+        trade_ids, hashes: fingerprint(df_closed).
+        portfolio, cube_: PortfolioAccumulator and AnalyticsCube of df_closed.
+        df_closed: the closed trades with COLUMNS (for the rolling metrics).
+        curve_points: points kept of the daily equity curve.
+        """
+        metrics = portfolio.metrics(curve_tail=8)
+        series = portfolio.series("D")
+        metrics["Longest_Underwater"] = float(series.longest_underwater)
+        rolling = analytics.rolling_metrics(df_closed).drop(columns="Exit_Date")
+        last = {key: float(value) for key, value in rolling.iloc[-1].items()} if len(rolling) else None
+        return cls(np.sort(trade_ids), _digest(hashes), metrics, series.downsample(curve_points), last,
+                   portfolio.state(), cube_.state())
+
+    def __len__(self):
+        return len(self.trade_ids)
+
+    def new_trades(self, trade_ids, hashes):
+        """
+        Mask of the closed trades (from fingerprint()) that were closed after
+        the snapshot was taken, or None if a trade in the snapshot has changed
+        or is no longer closed. An all-False mask means the snapshot is current.
+        """
+        known = np.isin(trade_ids, self.trade_ids)
+        if known.sum() != len(self.trade_ids) or _digest(hashes[known]) != self.digest:
+            return None
+        return ~known
+
+    def results(self):
+        """The saved metrics, as _portfolio_metrics_io returns them (without the breakdown)."""
+        metrics = dict(self.metrics)
+        metrics["Equity_Curve"] = list(metrics.get("Equity_Curve", []))
+        metrics["Curve"] = self.curve
+        metrics["Rolling"] = None if self.rolling is None else pd.Series(self.rolling)
+        return metrics
+
+    def restore_cube(self):
+        """A new AnalyticsCube of the snapshot's trades."""
+        return cube.AnalyticsCube.from_state(self.cube_state)
+
+    def fold(self, df_new):
+        """
+        A new (AnalyticsCube, PortfolioAccumulator) of the snapshot's trades
+        plus df_new (closed trades with COLUMNS), folded in by Exit_Date.
+        """
+        cube_ = self.restore_cube()
+        portfolio = analytics.PortfolioAccumulator.from_state(self.portfolio_state)
+        order = np.argsort(pd.to_datetime(df_new["Exit_Date"]).to_numpy(), kind="stable")
+        df_new = df_new.iloc[order]
+        for exit_date, pnl in zip(df_new["Exit_Date"], df_new["Realized_PnL"]):
+            portfolio.add_trade(pnl, exit_date)
+        cube_.add_trades(df_new)
+        return cube_, portfolio
+
+    def save(self, path):
+        """Writes the snapshot to path, atomically."""
+        meta = {
+            "version": VERSION,
+            "digest": str(self.digest),  # as text: JSON readers may not keep 64-bit integers exact
+            "metrics": self.metrics,
+            "rolling": self.rolling,
+            "cells": self.cube_state["cells"],
+            "totals": self.portfolio_state["totals"],
+        }
+        arrays = {
+            "meta": np.array(json.dumps(meta, default=_plain)),
+            "trade_ids": self.trade_ids,
+            "curve_dates": self.curve.dates, "curve_equity": self.curve.equity,
+            "curve_drawdown": self.curve.drawdown, "curve_underwater": self.curve.underwater,
+        }
+        arrays.update({f"portfolio_{key}": value for key, value in self.portfolio_state.items() if key != "totals"})
+        arrays.update({f"cube_{key}": value for key, value in self.cube_state.items() if key != "cells"})
+        atomic_write(path, lambda tmp: np.savez(tmp, **arrays))
+
+    @classmethod
+    def load(cls, path):
+        """Reads a snapshot saved by save(); None if there is none or it can't be used."""
+        try:
+            with np.load(path, allow_pickle=False) as f:
+                meta = json.loads(str(f["meta"]))
+                if meta.get("version") != VERSION:
+                    return None
+                curve = timeseries.EquitySeries(f["curve_dates"], f["curve_equity"], f["curve_drawdown"],
+                                                f["curve_underwater"])
+                portfolio_state = {key: f[f"portfolio_{key}"] for key in ("dates", "pnls", "equity")}
+                portfolio_state["totals"] = meta["totals"]
+                cube_state = {key: f[f"cube_{key}"] for key in ("sums", "exit", "pnl", "cell")}
+                cube_state["cells"] = meta["cells"]
+                return cls(f["trade_ids"], int(meta["digest"]), meta["metrics"], curve, meta["rolling"],
+                           portfolio_state, cube_state)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+
+
+# Timings when TRADE_JOURNAL_PROFILE is set
+instrumentation.instrument_module(globals(), "snapshot", exclude=("path_for",))
+instrumentation.instrument_class(AnalyticsSnapshot, "snapshot.AnalyticsSnapshot",
+                                 names=("build", "new_trades", "fold", "save", "load"))
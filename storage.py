@@ -0,0 +1,916 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import pandas as pd
+
+import instrumentation
+
+TABLE = "trades"
+META_TABLE = "meta"
+
+# Rows per DataFrame chunk when streaming the journal
+CHUNKSIZE = 5000
+
+
+def _quote(name):
+    """Quotes a column name for SQL (several journal columns contain '%')."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _sql_value(value):
+    """Converts pandas/numpy scalars into something sqlite3 can bind."""
+    if value is None:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d")
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if hasattr(value, "item"):
+        # numpy scalar -> python scalar
+        return value.item()
+    return value
+
+
+def _filter(df, where):
+    """Applies equality predicates {column: value} to a DataFrame."""
+    for col, value in (where or {}).items():
+        if col not in df.columns:
+            return df.iloc[0:0]
+        df = df[df[col] == value]
+    return df
+
+
+def iter_excel_rows(path, columns=None, where=None):
+    """
+    Streams rows of a journal workbook as dicts.
+
+    Uses openpyxl's read_only mode, so cells are parsed as they are
+    iterated instead of the whole workbook being loaded into memory.
+
+    columns: only return these columns (missing ones come back as None).
+    where: {column: value} equality predicates a row must match.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    instrumentation.record(bytes_read=instrumentation.file_size(path))
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        positions = {name: i for i, name in enumerate(header) if name is not None}
+        wanted = [(c, positions.get(c)) for c in (columns or positions)]
+        checks = [(positions.get(c), v) for c, v in (where or {}).items()]
+
+        def cell(values, i):
+            return values[i] if i is not None and i < len(values) else None
+
+        for values in rows:
+            if all(v is None for v in values):
+                continue
+            if any(cell(values, i) != v for i, v in checks):
+                continue
+            instrumentation.record(rows=1)
+            yield {c: cell(values, i) for c, i in wanted}
+    finally:
+        wb.close()
+
+
+def iter_excel_chunks(path, columns=None, where=None, chunksize=CHUNKSIZE):
+    """Like iter_excel_rows, but yields DataFrames of up to chunksize rows."""
+    batch = []
+    for row in iter_excel_rows(path, columns, where):
+        batch.append(row)
+        if len(batch) >= chunksize:
+            yield pd.DataFrame(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch)
+
+
+def _fsync_dir(path):
+    """Makes a rename or delete in path's directory durable (no-op where directories can't be opened)."""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, write):
+    """
+    Replaces path with a file written by write(tmp_path), so a crash or a
+    full disk midway leaves the old file intact. The temp file is fsynced
+    before it is renamed over path.
+    """
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.{os.getpid()}.tmp{ext}"  # keep the extension: pandas picks the Excel engine from it
+    try:
+        write(tmp)
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+        instrumentation.record(bytes_written=instrumentation.file_size(tmp))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    _fsync_dir(path)
+
+
+class ConflictError(RuntimeError):
+    """The journal changed since the generation a compare-and-swap write expected."""
+
+
+class StoreLock:
+    """
+    Advisory lock around writes to a store, shared with other processes
+    through a sidecar file (<store>.lock), plus the store's generation.
+
+    The generation is a counter kept in the lock file: a writer makes it odd
+    while its write is in progress and even again when it is done, so a
+    reader that sees the same even value before and after reading knows it
+    got a consistent snapshot without having taken the lock. The lock is
+    re-entrant within a process.
+    """
+
+    # Byte range locked on Windows, past the generation text so readers can still read it
+    LOCK_OFFSET = 64
+
+    def __init__(self, path, timeout=10.0):
+        self.path = path
+        self.timeout = timeout
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def _try_lock(self):
+        if os.name == "nt":
+            import msvcrt
+            self._file.seek(self.LOCK_OFFSET)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock(self):
+        if os.name == "nt":
+            import msvcrt
+            self._file.seek(self.LOCK_OFFSET)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                open(self.path, "ab").close()
+                self._file = open(self.path, "r+b")
+                deadline = time.monotonic() + self.timeout
+                while True:
+                    try:
+                        self._try_lock()
+                        break
+                    except OSError:
+                        if time.monotonic() > deadline:
+                            raise TimeoutError(f"Timed out waiting for {self.path}; another process is writing the journal.")
+                        time.sleep(0.05)
+                if self.generation() % 2:
+                    self._set_generation(self.generation() + 1)  # a writer died mid-write
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                self._unlock()
+            finally:
+                self._file.close()
+                self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def generation(self):
+        """Returns the store's generation (0 if it has never been written under a lock)."""
+        try:
+            with open(self.path, "rb") as f:
+                text = f.read(32).split(b"\n", 1)[0].strip()
+        except FileNotFoundError:
+            return 0
+        try:
+            return int(text)
+        except ValueError:
+            return 0
+
+    def _set_generation(self, value):
+        self._file.seek(0)
+        self._file.write(b"%-20d\n" % value)
+        self._file.flush()
+
+    def begin_write(self, expected_generation=None):
+        """Takes the lock and marks a write in progress. Raises ConflictError if expected_generation is stale."""
+        self.acquire()
+        try:
+            if self._depth == 1:
+                current = self.generation()
+                if expected_generation is not None and current != expected_generation:
+                    raise ConflictError(
+                        f"The journal was changed by someone else (generation {current}, expected {expected_generation}). Reload and try again."
+                    )
+                self._set_generation(current + 1)
+        except BaseException:
+            self.release()
+            raise
+
+    def end_write(self):
+        try:
+            if self._depth == 1:
+                self._set_generation(self.generation() + 1)
+        finally:
+            self.release()
+
+
+class WriteAheadLog:
+    """
+    Append-only log of pending inserts and updates, one JSON record per line.
+
+    Each record is fsynced before append()/update() return, so a write can
+    be acknowledged before the (slow) rewrite of the store file. A torn last
+    line from a crash mid-append is ignored when the log is read back.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _write(self, records):
+        created = not os.path.exists(self.path)
+        text = "".join(json.dumps(record) + "\n" for record in records)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if created:
+            _fsync_dir(self.path)
+        instrumentation.record(bytes_written=len(text))
+
+    def insert(self, rows):
+        self._write([{"op": "insert", "row": {c: _sql_value(v) for c, v in row.items()}} for row in rows])
+
+    def update(self, updates):
+        self._write([
+            {"op": "update", "id": _sql_value(trade_id), "fields": {c: _sql_value(v) for c, v in fields.items()}}
+            for trade_id, fields in updates
+        ])
+
+    def records(self):
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break  # torn write: nothing after it was acknowledged
+        return records
+
+    def replay(self, df, records=None):
+        """Returns df with the logged inserts and updates (default: the ones in the log now) applied."""
+        records = self.records() if records is None else records
+        if not records:
+            return df
+        ids = set(pd.to_numeric(df['Trade_ID'], errors='coerce').dropna()) if 'Trade_ID' in df else set()
+        # Inserts already in the file were checkpointed before a crash cleared the log
+        rows = [r["row"] for r in records if r["op"] == "insert" and r["row"].get("Trade_ID") not in ids]
+        if rows:
+            new = pd.DataFrame(rows)
+            columns = list(df.columns) + [c for c in new.columns if c not in df.columns]
+            if df.empty:
+                df = new.reindex(columns=columns)
+            else:
+                # All-blank columns (e.g. the exit fields of new trades) are left for reindex to fill,
+                # so they don't take part in working out the result's dtypes
+                df = pd.concat([df, new.dropna(axis=1, how="all")], ignore_index=True).reindex(columns=columns)
+        updates = [(r["id"], r["fields"]) for r in records if r["op"] == "update"]
+        return _apply_updates(df, updates) if updates else df
+
+    def pending(self):
+        """True if the log holds records (cheaper than records(): only stats the file)."""
+        return self.stamp()[1] > 0
+
+    def stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return (0, 0)
+        return (st.st_mtime_ns, st.st_size)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+            _fsync_dir(self.path)
+
+
+def _apply_updates(df, updates):
+    """Sets fields on rows of df by Trade_ID; updates is a list of (trade_id, fields)."""
+    ids = df['Trade_ID']
+    first = ~ids.duplicated()
+    rows = dict(zip(ids[first], df.index[first]))
+    labels = []
+    for trade_id, _ in updates:
+        if trade_id not in rows:
+            raise ValueError(f"Trade ID {trade_id} not found.")
+        labels.append(rows[trade_id])
+    # Each updated column is widened to object once, so any value fits, rather than once per field set
+    for key in {key for _, fields in updates for key in fields if key in df.columns}:
+        df[key] = df[key].astype(object)
+    for label, (_, fields) in zip(labels, updates):
+        for key, value in fields.items():
+            if key in df.columns:
+                df.at[label, key] = value
+    return df
+
+
+class StorageBackend:
+    """
+    Interface for the on-disk journal store.
+
+    data_manager only talks to the store through these methods, so the
+    file format can change without touching the GUI or analytics code.
+    """
+
+    # Only stores with a write-ahead log can acknowledge a write before the store file is rewritten
+    defer_checkpoint = False
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = StoreLock(path + ".lock")
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def stamp(self):
+        """Returns (mtime, size) of the store file, used to detect changes made outside this process."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def initialize(self, columns):
+        """Creates an empty store with the given columns."""
+        raise NotImplementedError
+
+    def load(self):
+        """Returns the whole journal as a DataFrame."""
+        raise NotImplementedError
+
+    def iter_chunks(self, columns=None, where=None, chunksize=CHUNKSIZE):
+        """
+        Yields the journal as DataFrames of up to chunksize rows.
+
+        columns: column projection; where: {column: value} row predicates.
+        Backends override this to avoid materializing the whole journal.
+        """
+        df = _filter(self.load(), where)
+        if columns is not None:
+            df = df.reindex(columns=columns)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+
+    def append(self, row):
+        """Adds one trade (dict of column -> value)."""
+        raise NotImplementedError
+
+    def append_many(self, df):
+        """Adds several trades in one write."""
+        if df.empty:
+            return
+        current = self.load()
+        self.replace(pd.concat([current, df], ignore_index=True) if not current.empty else df)
+
+    def update(self, trade_id, fields):
+        """Sets fields on the trade with the given Trade_ID."""
+        raise NotImplementedError
+
+    def update_many(self, updates):
+        """
+        Applies several updates, a list of (trade_id, fields), in one write.
+        Raises ValueError (and writes nothing) if any Trade_ID doesn't exist.
+        """
+        if updates:
+            self.replace(_apply_updates(self.load(), updates))
+
+    def replace(self, df):
+        """Overwrites the store with the contents of df."""
+        raise NotImplementedError
+
+    def max_trade_id(self):
+        """Returns the highest numeric Trade_ID, or None if there are no trades."""
+        df = self.load()
+        if df.empty:
+            return None
+        max_id = pd.to_numeric(df['Trade_ID'], errors='coerce').max()
+        return None if pd.isna(max_id) else int(max_id)
+
+    def allocate_trade_id(self):
+        """Returns the next Trade_ID to use."""
+        max_id = self.max_trade_id()
+        return 1 if max_id is None else max_id + 1
+
+    def allocate_trade_ids(self, count):
+        """
+        Reserves `count` consecutive Trade_IDs and returns the first one.
+        The block is only taken once the trades using it are appended.
+        """
+        return self.allocate_trade_id()
+
+    def needs_checkpoint(self):
+        """True if checkpoint() has logged writes to fold in."""
+        return False
+
+    def checkpoint(self):
+        """Folds logged writes into the store file. Stores without a write-ahead log have nothing to do."""
+
+    def export_excel(self, path):
+        """Writes the journal out as an Excel workbook."""
+        df = self.load()
+        atomic_write(path, lambda tmp: df.to_excel(tmp, index=False))
+
+
+class ExcelBackend(StorageBackend):
+    """
+    The original storage: the journal is a single workbook.
+
+    Every change is first recorded in a write-ahead log next to the
+    workbook (<path>.wal), then the whole workbook is rewritten to a temp
+    file and renamed into place. A crash at any point leaves either the old
+    or the new workbook, and logged changes that never made it into the
+    workbook are replayed on the next checkpoint(). Reads apply the log, so
+    they always see every acknowledged write.
+
+    With defer_checkpoint set, append() and update() return as soon as the
+    log record is on disk and the rewrite waits for checkpoint(); neither
+    reads the workbook.
+
+    The last Trade_ID handed out is kept in <path>.seq, so IDs are never
+    reused after a delete and allocating one doesn't read the workbook.
+    Like the other stores' sequences it is moved on by the writes
+    themselves, under the store lock.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.log = WriteAheadLog(path + ".wal")
+        self.seq_path = path + ".seq"
+
+    def _seq(self):
+        """The last Trade_ID handed out, or None for a workbook from before the sequence file."""
+        try:
+            with open(self.seq_path, encoding="utf-8") as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _move_seq(self, trade_ids):
+        # Before the rows are logged or written, so a crash in between can only leave a gap
+        ids = pd.to_numeric(pd.Series(list(trade_ids), dtype=object), errors="coerce").dropna()
+        current = self._seq()
+        last = max(current or 0, int(ids.max()) if len(ids) else 0)
+        if last != current:
+            def write(tmp):
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(f"{last}\n")
+            atomic_write(self.seq_path, write)
+
+    def allocate_trade_id(self):
+        seq = self._seq()
+        if seq is None:
+            seq = self.max_trade_id() or 0  # read the workbook once; the first write then records it
+        return seq + 1
+
+    def stamp(self):
+        stamp = super().stamp()
+        if stamp is None:
+            return None
+        log_mtime, log_size = self.log.stamp()
+        return (max(stamp[0], log_mtime), stamp[1], log_size)
+
+    def initialize(self, columns):
+        self.replace(pd.DataFrame(columns=columns))
+
+    def load(self):
+        # Log first: a checkpoint between the two reads then only means a replayed record is already in the file
+        records = self.log.records()
+        df = pd.read_excel(self.path)
+        instrumentation.record(rows=len(df), bytes_read=instrumentation.file_size(self.path))
+        return self.log.replay(df, records)
+
+    def iter_chunks(self, columns=None, where=None, chunksize=CHUNKSIZE):
+        if self.log.records():
+            return super().iter_chunks(columns, where, chunksize)
+        return iter_excel_chunks(self.path, columns, where, chunksize)
+
+    def append(self, row):
+        self._move_seq([row.get('Trade_ID')])
+        self.log.insert([row])
+        if not self.defer_checkpoint:
+            self.checkpoint()
+
+    def append_many(self, df):
+        if df.empty:
+            return
+        self._move_seq(df['Trade_ID'] if 'Trade_ID' in df else [])
+        self.log.insert(df.to_dict('records'))
+        if not self.defer_checkpoint:
+            self.checkpoint()
+
+    def update(self, trade_id, fields):
+        self.update_many([(trade_id, fields)])
+
+    def update_many(self, updates):
+        if not updates:
+            return
+        if self.defer_checkpoint:
+            # Only the log is written, so the caller checks the IDs (data_manager does, against its cache)
+            self.log.update(updates)
+            return
+        df = _apply_updates(self.load(), updates)  # raises before anything is logged
+        self.log.update(updates)
+        self.replace(df)
+
+    def replace(self, df):
+        self._move_seq(df['Trade_ID'] if 'Trade_ID' in df else [])
+        atomic_write(self.path, lambda tmp: df.to_excel(tmp, index=False))
+        self.log.clear()
+
+    def needs_checkpoint(self):
+        return self.log.pending()
+
+    def checkpoint(self):
+        if self.log.records():
+            self.replace(self.load())
+
+    def export_excel(self, path):
+        if os.path.abspath(path) != os.path.abspath(self.path):
+            super().export_excel(path)
+        else:
+            self.checkpoint()
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Append-only SQLite store.
+
+    A new trade is a single INSERT and closing a trade is a single UPDATE
+    through an index on Trade_ID, so writes no longer scale with the size
+    of the journal.
+    """
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path))
+
+    def _columns(self, conn):
+        rows = conn.execute(f"PRAGMA table_info({TABLE})").fetchall()
+        return [r[1] for r in rows]
+
+    def exists(self):
+        if not os.path.exists(self.path):
+            return False
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name=?", (TABLE,)
+            ).fetchone()
+        return row is not None
+
+    def initialize(self, columns):
+        # Columns are declared without a type so values keep whatever
+        # type they were written with (dates stay text, prices stay real).
+        col_sql = ", ".join(_quote(c) for c in columns)
+        with self._connect() as conn, conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {TABLE} ({col_sql})")
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_trade_id ON {TABLE} ({_quote('Trade_ID')})"
+            )
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value)")
+
+    def load(self):
+        with self._connect() as conn:
+            df = pd.read_sql_query(f"SELECT * FROM {TABLE} ORDER BY rowid", conn)
+        instrumentation.record(rows=len(df))
+        return df
+
+    def iter_chunks(self, columns=None, where=None, chunksize=CHUNKSIZE):
+        # Projection and predicates are pushed down into the query
+        with self._connect() as conn:
+            known = set(self._columns(conn))
+            if columns is None:
+                select = "*"
+            else:
+                select = ", ".join(_quote(c) if c in known else f"NULL AS {_quote(c)}" for c in columns)
+            where = where or {}
+            if any(c not in known for c in where):
+                return
+            clause = " AND ".join(f"{_quote(c)} = ?" for c in where)
+            sql = f"SELECT {select} FROM {TABLE}" + (f" WHERE {clause}" if clause else "") + " ORDER BY rowid"
+            params = [_sql_value(v) for v in where.values()]
+            for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=chunksize):
+                instrumentation.record(rows=len(chunk))
+                yield chunk
+
+    def append(self, row):
+        cols = list(row.keys())
+        sql = (
+            f"INSERT INTO {TABLE} ({', '.join(_quote(c) for c in cols)}) "
+            f"VALUES ({', '.join('?' for _ in cols)})"
+        )
+        with self._connect() as conn, conn:
+            conn.execute(sql, [_sql_value(row[c]) for c in cols])
+
+    def update(self, trade_id, fields):
+        with self._connect() as conn, conn:
+            known = set(self._columns(conn))
+            cols = [c for c in fields if c in known]
+            where = f"{_quote('Trade_ID')} = ?"
+            if not cols:
+                if conn.execute(f"SELECT 1 FROM {TABLE} WHERE {where}", [_sql_value(trade_id)]).fetchone() is None:
+                    raise ValueError(f"Trade ID {trade_id} not found.")
+                return
+            assignments = ", ".join(f"{_quote(c)} = ?" for c in cols)
+            params = [_sql_value(fields[c]) for c in cols] + [_sql_value(trade_id)]
+            cur = conn.execute(f"UPDATE {TABLE} SET {assignments} WHERE {where}", params)
+            if cur.rowcount == 0:
+                raise ValueError(f"Trade ID {trade_id} not found.")
+
+    def update_many(self, updates):
+        # One transaction: either every trade is updated or none is
+        with self._connect() as conn, conn:
+            known = set(self._columns(conn))
+            where = f"{_quote('Trade_ID')} = ?"
+            for trade_id, fields in updates:
+                cols = [c for c in fields if c in known]
+                if cols:
+                    assignments = ", ".join(f"{_quote(c)} = ?" for c in cols)
+                    params = [_sql_value(fields[c]) for c in cols] + [_sql_value(trade_id)]
+                    found = conn.execute(f"UPDATE {TABLE} SET {assignments} WHERE {where}", params).rowcount
+                else:
+                    found = conn.execute(f"SELECT 1 FROM {TABLE} WHERE {where}", [_sql_value(trade_id)]).fetchone()
+                if not found:
+                    raise ValueError(f"Trade ID {trade_id} not found.")
+
+    def _insert_frame(self, conn, df):
+        known = self._columns(conn)
+        cols = [c for c in df.columns if c in known]
+        sql = (
+            f"INSERT INTO {TABLE} ({', '.join(_quote(c) for c in cols)}) "
+            f"VALUES ({', '.join('?' for _ in cols)})"
+        )
+        conn.executemany(
+            sql, ([_sql_value(v) for v in row] for row in df[cols].itertuples(index=False))
+        )
+
+    def append_many(self, df):
+        with self._connect() as conn, conn:
+            self._insert_frame(conn, df)
+
+    def replace(self, df):
+        with self._connect() as conn, conn:
+            conn.execute(f"DELETE FROM {TABLE}")
+            self._insert_frame(conn, df)
+
+    def max_trade_id(self):
+        with self._connect() as conn:
+            # Served from idx_trade_id without scanning the table.
+            row = conn.execute(f"SELECT MAX({_quote('Trade_ID')}) FROM {TABLE}").fetchone()
+        return None if row[0] is None else int(row[0])
+
+    def allocate_trade_id(self):
+        """
+        Hands out the next Trade_ID from a sequence stored in the meta table.
+
+        IDs are never reused, even if trades are deleted. The sequence is
+        kept at or above MAX(Trade_ID) so rows written by save_db() or an
+        older version of the app can't collide with it.
+        """
+        return self.allocate_trade_ids(1)
+
+    def allocate_trade_ids(self, count):
+        """Moves the sequence on by `count` in one transaction; returns the first ID."""
+        if count < 1:
+            raise ValueError("count must be at least 1.")
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value)")
+                row = conn.execute(f"SELECT value FROM {META_TABLE} WHERE key = 'trade_id_seq'").fetchone()
+                max_id = conn.execute(f"SELECT MAX({_quote('Trade_ID')}) FROM {TABLE}").fetchone()[0]
+                if not isinstance(max_id, (int, float)):
+                    max_id = 0  # empty table, or only text IDs left by manual edits
+                last = max(int(row[0]) if row else 0, int(max_id))
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {META_TABLE} (key, value) VALUES ('trade_id_seq', ?)", (last + count,)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return last + 1
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.compute
+    except ImportError:
+        raise ImportError("The Feather journal store needs pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def _text(value):
+    value = _sql_value(value)
+    return None if value is None else str(value)
+
+
+class FeatherBackend(StorageBackend):
+    """
+    Columnar store: an Arrow IPC (Feather v2) file with a fixed schema.
+
+    Reads are memory-mapped and only touch the columns asked for, which
+    makes loading and scanning much faster than the workbook. Every write
+    rewrites the whole file (to a temp file, then rename): append() of one
+    trade costs a read and a write of the full table, so add trades in
+    batches with append_many() where possible. This store suits read-heavy
+    use; SQLiteBackend is cheaper for frequent single inserts.
+
+    Opt-in (TRADE_JOURNAL_STORE=feather): pyarrow is not a requirement of
+    the app, and opening a Feather store without it raises ImportError.
+
+    The Arrow type of each column follows its pandas dtype in `dtypes`
+    (data_manager.DTYPES). The Trade_ID sequence is kept in the file's
+    schema metadata.
+    """
+
+    SEQ_KEY = b"trade_id_seq"
+
+    def __init__(self, path, columns, dtypes=None):
+        _require_pyarrow()  # fail when the store is opened, not at its first read
+        super().__init__(path)
+        self.columns = list(columns)
+        self.dtypes = dict(dtypes or {})
+
+    def _arrow_type(self, col):
+        pa = _require_pyarrow()
+        dtype = self.dtypes.get(col, "Float64")
+        if dtype.startswith("datetime64"):
+            return pa.timestamp("ns")
+        if dtype == "Int64":
+            return pa.int64()
+        if dtype == "boolean":
+            return pa.bool_()
+        if dtype in ("category", "string"):
+            return pa.string()
+        return pa.float64()
+
+    def schema(self, metadata=None):
+        pa = _require_pyarrow()
+        return pa.schema([pa.field(c, self._arrow_type(c)) for c in self.columns], metadata=metadata)
+
+    def _to_table(self, df, seq=None):
+        pa = _require_pyarrow()
+        df = df.reindex(columns=self.columns)
+        arrays = []
+        for field in self.schema():
+            col = df[field.name]
+            if pa.types.is_string(field.type):
+                values = [_text(v) for v in col]
+            elif pa.types.is_timestamp(field.type):
+                values = pd.to_datetime(col, errors='coerce')
+            elif pa.types.is_boolean(field.type):
+                values = pd.to_numeric(col, errors='coerce').astype("boolean")
+            elif pa.types.is_integer(field.type):
+                values = pd.to_numeric(col, errors='coerce').astype("Int64")
+            else:
+                values = pd.to_numeric(col, errors='coerce').astype("float64")
+            arrays.append(pa.array(values, type=field.type, from_pandas=True))
+        metadata = {self.SEQ_KEY: str(seq).encode()} if seq is not None else None
+        return pa.Table.from_arrays(arrays, schema=self.schema(metadata))
+
+    def _read(self, columns=None, memory_map=True):
+        pa = _require_pyarrow()
+        table = pa.feather.read_table(self.path, columns=columns, memory_map=memory_map)
+        instrumentation.record(rows=table.num_rows, bytes_read=table.nbytes)
+        return table
+
+    def _write(self, table):
+        pa = _require_pyarrow()
+        atomic_write(self.path, lambda tmp: pa.feather.write_feather(table, tmp, compression="uncompressed"))
+
+    def _seq(self):
+        pa = _require_pyarrow()
+        with pa.memory_map(self.path) as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+        value = metadata.get(self.SEQ_KEY)
+        return int(value) if value else 0
+
+    def initialize(self, columns):
+        self.columns = list(columns)
+        self._write(self._to_table(pd.DataFrame(columns=self.columns), seq=0))
+
+    def load(self):
+        return self._read().to_pandas()
+
+    def iter_chunks(self, columns=None, where=None, chunksize=CHUNKSIZE):
+        pa = _require_pyarrow()
+        where = where or {}
+        if any(c not in self.columns for c in where):
+            return
+        wanted = list(columns) if columns is not None else self.columns
+        read_cols = [c for c in dict.fromkeys(wanted + list(where)) if c in self.columns]
+        table = self._read(read_cols)
+        for col, value in where.items():
+            table = table.filter(pa.compute.equal(table[col], pa.scalar(value, type=table.schema.field(col).type)))
+        for start in range(0, table.num_rows, chunksize):
+            yield table.slice(start, chunksize).to_pandas().reindex(columns=wanted)
+
+    def append(self, row):
+        self.append_many(pd.DataFrame([row]))
+
+    def append_many(self, df):
+        if df.empty:
+            return
+        pa = _require_pyarrow()
+        current = self._read(memory_map=False)
+        ids = pd.to_numeric(df['Trade_ID'], errors='coerce') if 'Trade_ID' in df else pd.Series(dtype=float)
+        seq = max(self._seq(), int(ids.max()) if ids.notna().any() else 0)
+        new = self._to_table(df, seq=seq)
+        if not current.schema.equals(new.schema, check_metadata=False):
+            # Written with an older schema: convert the whole file once
+            current = self._to_table(current.to_pandas(), seq=seq)
+        self._write(pa.concat_tables([current.replace_schema_metadata(new.schema.metadata), new]))
+
+    def update(self, trade_id, fields):
+        self.update_many([(trade_id, fields)])
+
+    def update_many(self, updates):
+        df = _apply_updates(self._read(memory_map=False).to_pandas(), updates)
+        self._write(self._to_table(df, seq=self._seq()))
+
+    def replace(self, df):
+        seq = self._seq() if self.exists() else 0
+        self._write(self._to_table(df, seq=seq))
+
+    def max_trade_id(self):
+        pa = _require_pyarrow()
+        max_id = pa.compute.max(self._read(['Trade_ID'])['Trade_ID']).as_py()
+        return None if max_id is None else int(max_id)
+
+    def allocate_trade_id(self):
+        return max(self._seq(), self.max_trade_id() or 0) + 1
+
+
+# Per-backend timings when TRADE_JOURNAL_PROFILE is set
+for _cls in (ExcelBackend, SQLiteBackend, FeatherBackend):
+    instrumentation.instrument_class(_cls, f"storage.{_cls.__name__}", names=(
+        "load", "append", "append_many", "update", "update_many", "replace",
+        "allocate_trade_id", "allocate_trade_ids", "checkpoint", "export_excel",
+    ))
+
+
+def backend_for_path(path, columns=(), dtypes=None):
+    """Picks a backend from a store's file extension (.db/.sqlite, .arrow/.feather, .xlsx)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".db", ".sqlite", ".sqlite3"):
+        return SQLiteBackend(path)
+    if ext in (".arrow", ".feather"):
+        return FeatherBackend(path, columns, dtypes)
+    if ext in (".xlsx", ".xlsm"):
+        return ExcelBackend(path)
+    raise ValueError(f"Don't know how to open a journal stored as '{ext}'.")
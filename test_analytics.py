@@ -1,5 +1,9 @@
+import numpy as np
 import pandas as pd
-from analytics import calculate_trade_metrics, calculate_portfolio_metrics
+from analytics import calculate_trade_metrics, calculate_trade_metrics_batch, calculate_portfolio_metrics, PortfolioAccumulator, rolling_metrics
+from timeseries import EquitySeries, lttb
+from cube import AnalyticsCube
+import benchmark
 
 def test_analytics():
     print("Testing calculate_trade_metrics...")
@@ -55,5 +59,184 @@ def test_analytics():
     assert abs(p_metrics['Expectancy'] - 83.333) < 0.1
     print("Portfolio metrics passed.")
 
+def test_trade_metrics_batch_parity():
+    print("Testing calculate_trade_metrics_batch against the scalar version...")
+    entries = pd.DataFrame({
+        'Entry_Date': ['2023-01-01', '2023-02-01', '2023-03-01', '2023-04-01'],
+        'Lots': [1, 2, 3, 1],
+        'Spread_Entry_Price': [2.00, 1.35, 0.80, 3.10],
+        'Credit_Received': [2.00, 1.35, 0.0, 3.10],
+        'Max_Loss': [300, 730, 660, 0],
+        'Margin_Used': [300, 730, 0, 690]
+    })
+    exits = pd.DataFrame({
+        'Exit_Date': ['2023-01-10', '2023-02-15', '2023-03-20', '2023-04-02'],
+        'Spread_Exit_Price': [1.00, 4.70, 0.05, 3.10]
+    })
+    
+    batch = calculate_trade_metrics_batch(entries, exits)
+    
+    for i in range(len(entries)):
+        scalar = calculate_trade_metrics(entries.iloc[i], exits.iloc[i].to_dict())
+        for key, value in scalar.items():
+            assert batch.iloc[i][key] == value, (i, key, batch.iloc[i][key], value)
+    print("Batch metrics match.")
+
+def test_portfolio_accumulator():
+    print("Testing PortfolioAccumulator against calculate_portfolio_metrics...")
+    df = pd.DataFrame({
+        'Exit_Date': pd.to_datetime(['2023-01-01', '2023-01-02', '2023-01-03', '2023-01-05', '2023-01-08']),
+        'Realized_PnL': [100.0, -50.0, 200.0, -300.0, 75.0]
+    })
+    
+    acc = PortfolioAccumulator()
+    for _, row in df.iterrows():
+        acc.add_trade(row['Realized_PnL'], row['Exit_Date'])
+    assert acc.rebuilds == 0
+    
+    # Closed out of Exit_Date order: forces a rebuild
+    late = pd.DataFrame({'Exit_Date': [pd.Timestamp('2023-01-04')], 'Realized_PnL': [-120.0]})
+    acc.add_trade(-120.0, '2023-01-04')
+    assert acc.rebuilds == 1
+    
+    df_all = pd.concat([df, late], ignore_index=True)
+    expected = calculate_portfolio_metrics(df_all)
+    restored = PortfolioAccumulator.from_state(acc.state())
+    for metrics in (acc.metrics(), PortfolioAccumulator.from_frame(df_all).metrics(), restored.metrics()):
+        for key, value in expected.items():
+            if key == 'Equity_Curve':
+                assert metrics[key] == value
+            else:
+                assert abs(metrics[key] - value) < 1e-9, (key, metrics[key], value)
+    
+    assert acc.metrics(curve_tail=2)['Equity_Curve'] == expected['Equity_Curve'][-2:]
+    # A restored accumulator keeps folding trades in like the original
+    for a in (acc, restored):
+        a.add_trade(40.0, '2023-01-09')
+        a.add_trade(-10.0, '2023-01-06')
+    assert restored.metrics() == acc.metrics() and restored.series().equity.tolist() == acc.series().equity.tolist()
+    assert PortfolioAccumulator().metrics()['Total_Trades'] == 0
+    print("Accumulator metrics match.")
+
+def test_equity_series():
+    print("Testing EquitySeries per trade...")
+    dates = ['2023-01-05', '2023-01-02', '2023-01-03', '2023-01-16', '2023-01-03', '2023-02-20']
+    pnls = [-300.0, 100.0, -50.0, 75.0, 200.0, None]
+    df = pd.DataFrame({'Exit_Date': pd.to_datetime(dates), 'Realized_PnL': pnls})
+    expected = calculate_portfolio_metrics(df.dropna())
+    
+    trades = EquitySeries.from_trades(dates, pnls)
+    assert trades.equity.tolist() == [100.0, 50.0, 250.0, -50.0, 25.0, 25.0]  # missing PnL counts as 0
+    assert trades.equity[:-1].tolist() == expected['Equity_Curve']
+    assert trades.max_drawdown == expected['Max_Drawdown']
+    assert trades.drawdown.tolist() == [0.0, -50.0, 0.0, -300.0, -225.0, -225.0]
+    assert trades.underwater.tolist() == [0.0, 1.0, 0.0, 2.0, 13.0, 48.0]
+    assert PortfolioAccumulator.from_frame(df).series().equity.tolist() == trades.equity.tolist()
+    
+    print("Testing daily, weekly and monthly resampling...")
+    daily = EquitySeries.from_trades(dates, pnls, "D")
+    assert len(daily) == 50 and daily.dates[0] == np.datetime64('2023-01-02')
+    assert daily.equity[:4].tolist() == [100.0, 250.0, 250.0, -50.0]  # Jan 4 repeats Jan 3
+    weekly = EquitySeries.from_trades(dates, pnls, "W")
+    assert list(weekly.dates[:3]) == [np.datetime64(d) for d in ('2023-01-02', '2023-01-09', '2023-01-16')]  # Mondays
+    assert weekly.equity.tolist()[:3] == [-50.0, -50.0, 25.0]
+    assert weekly.drawdown.tolist()[:3] == [0.0, 0.0, 0.0]  # the dip inside the first week is not visible weekly
+    monthly = EquitySeries.from_trades(dates, pnls, "M")
+    assert monthly.equity.tolist() == [25.0, 25.0]
+    assert monthly.dates[1] == np.datetime64('2023-02-01')
+    assert len(EquitySeries.from_trades([], [], "W")) == 0
+    undated = EquitySeries.from_trades(dates + [None], pnls + [500.0], "D")  # e.g. a legacy row without an Exit_Date
+    assert undated.equity.tolist() == daily.equity.tolist()
+    
+    print("Testing LTTB downsampling...")
+    y = np.zeros(1000)
+    y[437] = 50.0  # a spike every-n-th sampling would miss
+    keep = lttb(np.arange(1000), y, 20)
+    assert len(keep) == 20 and keep[0] == 0 and keep[-1] == 999 and 437 in keep
+    assert (np.diff(keep) > 0).all()
+    assert lttb(np.arange(10), np.arange(10), 50).tolist() == list(range(10))
+    small = daily.downsample(10)
+    assert len(small) == 10 and small.dates[-1] == daily.dates[-1]
+    print("Equity series passed.")
+
+def test_rolling_metrics():
+    print("Testing rolling_metrics...")
+    df = pd.DataFrame({
+        'Exit_Date': pd.to_datetime(['2023-01-20', '2023-01-01', '2023-01-02', '2023-01-02', '2023-02-15']),
+        'Realized_PnL': [-30.0, 100.0, -50.0, None, 40.0],
+        'Risk_Utilization_%': [70.0, 10.0, 20.0, None, 5.0],
+        'Rule_Violation_Flag': pd.array([True, False, False, None, False], dtype="boolean"),
+    }, index=[10, 11, 12, 13, 14])
+    rolling = rolling_metrics(df, windows=(2, "30D"))
+    assert list(rolling.index) == [11, 12, 13, 10, 14]  # Exit_Date order, same-day trades kept in order
+    assert np.isnan(rolling['Win_Rate_2'].iloc[0])
+    assert rolling['Win_Rate_2'].tolist()[1:] == [50.0, 0.0, 0.0, 50.0]
+    assert rolling['Expectancy_2'].tolist()[1:] == [25.0, -25.0, -15.0, 5.0]
+    assert rolling['Risk_Utilization_2'].tolist()[1:] == [15.0, 20.0, 70.0, 37.5]
+    assert rolling['Violation_Rate_2'].tolist()[1:] == [0.0, 0.0, 100.0, 50.0]
+    # Day windows cover Exit_Date - 30 days (exclusive) up to the trade
+    assert np.allclose(rolling['Win_Rate_30D'], [100.0, 50.0, 100 / 3, 25.0, 50.0])
+    assert np.allclose(rolling['Expectancy_30D'], [100.0, 25.0, 50 / 3, 5.0, 5.0])
+    
+    print("Testing rolling_metrics against calculate_portfolio_metrics per window...")
+    trades = benchmark.generate_trades(2000)
+    closed = trades[trades['Trade_Status'] == 'CLOSED']
+    rolling = rolling_metrics(closed, windows=(50, "90D"))
+    ordered = closed.loc[rolling.index]
+    for i in (49, 700, len(ordered) - 1):
+        last_50 = ordered.iloc[i - 49:i + 1]
+        last_90d = ordered.iloc[:i + 1][ordered['Exit_Date'].iloc[:i + 1] > ordered['Exit_Date'].iloc[i] - pd.Timedelta(days=90)]
+        for window, subset in ((50, last_50), ("90D", last_90d)):
+            expected = calculate_portfolio_metrics(subset)
+            assert abs(rolling[f'Win_Rate_{window}'].iloc[i] - expected['Win_Rate']) < 1e-9
+            assert abs(rolling[f'Expectancy_{window}'].iloc[i] - expected['Expectancy']) < 1e-6
+            assert abs(rolling[f'Risk_Utilization_{window}'].iloc[i] - subset['Risk_Utilization_%'].astype(float).mean()) < 1e-6
+    print("Rolling metrics passed.")
+
+def test_analytics_cube():
+    print("Testing AnalyticsCube slices against PortfolioAccumulator...")
+    trades = benchmark.generate_trades(3000)
+    closed = trades[trades['Trade_Status'] == 'CLOSED'].reset_index(drop=True)
+    # Build from most trades, fold the rest in one at a time (out of Exit_Date order)
+    cube = AnalyticsCube.from_frame(closed.iloc[:2400])
+    for _, row in closed.iloc[2400:2500].sample(frac=1, random_state=0).iterrows():
+        cube.add_trade(row)
+    cube.add_trades(closed.iloc[2500:].sample(frac=1, random_state=1))
+    assert len(cube) == len(closed)
+    
+    def check(metrics, subset):
+        expected = PortfolioAccumulator.from_frame(subset).metrics()
+        for key in ('Total_Trades', 'Win_Rate', 'Expectancy', 'Cumulative_PnL', 'Max_Drawdown'):
+            assert abs(metrics[key] - expected[key]) < 1e-6, (key, metrics[key], expected[key])
+        assert abs(metrics['Avg_Return_on_Margin_%'] - subset['Return_on_Margin_%'].astype(float).mean()) < 1e-9
+        assert abs(metrics['Avg_Exit_Efficiency_%'] - subset['Exit_Efficiency_%'].astype(float).mean()) < 1e-9
+    
+    check(cube.slice(), closed)
+    check(cube.slice(Strategy="Iron Condor", Symbol=["SPX", "RUT"]),
+          closed[(closed['Strategy'] == "Iron Condor") & closed['Symbol'].isin(["SPX", "RUT"])])
+    check(cube.slice(Entry_Confidence=4, IV_Bucket="20-40"),
+          closed[(closed['Entry_Confidence'] == 4) & closed['IV_Percentile_Entry'].between(20, 40, inclusive="right")])
+    check(cube.slice(Entry_Month="2021-03"), closed[closed['Entry_Date'].dt.strftime("%Y-%m") == "2021-03"])
+    assert cube.slice(Symbol="NONE")['Total_Trades'] == 0
+    
+    print("Testing AnalyticsCube breakdowns...")
+    by_direction = cube.breakdown("Direction", Strategy="Credit Spread")
+    assert list(by_direction.index) == ["Bearish", "Bullish"]
+    check(by_direction.loc["Bullish"], closed[(closed['Strategy'] == "Credit Spread") & (closed['Direction'] == "Bullish")])
+    two_way = cube.breakdown(["Symbol", "Strategy"])
+    assert len(two_way) == len(benchmark.SYMBOLS) * 2 and two_way['Total_Trades'].sum() == len(closed)
+    assert cube.breakdown("Symbol", Symbol="NONE").empty
+    try:
+        cube.slice(Color="red")
+        raise AssertionError("unknown dimensions should be rejected")
+    except ValueError:
+        pass
+    print("Analytics cube passed.")
+
 if __name__ == "__main__":
     test_analytics()
+    test_trade_metrics_batch_parity()
+    test_portfolio_accumulator()
+    test_equity_series()
+    test_rolling_metrics()
+    test_analytics_cube()
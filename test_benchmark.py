@@ -0,0 +1,37 @@
+import numpy as np
+from benchmark import generate_trades, run_size
+import data_manager
+
+def test_generate_trades():
+    print("Testing generate_trades...")
+    df = generate_trades(500, seed=1)
+    assert list(df.columns) == data_manager.COLUMNS
+    assert df['Trade_ID'].is_unique
+    assert set(df['Strategy']) == {"Credit Spread", "Iron Condor"}
+    
+    # Leg prices add up to the spread price
+    spreads = df[df['Strategy'] == "Credit Spread"]
+    legs = spreads['Short_Leg_Entry'] - spreads['Long_Leg_Entry']
+    assert np.allclose(legs.astype(float), spreads['Spread_Entry_Price'].astype(float))
+    condors = df[df['Strategy'] == "Iron Condor"]
+    legs = (condors['Short_Call_Entry'] - condors['Long_Call_Entry']
+            + condors['Short_Put_Entry'] - condors['Long_Put_Entry'])
+    assert np.allclose(legs.astype(float), condors['Spread_Entry_Price'].astype(float))
+    
+    closed = df[df['Trade_Status'] == "CLOSED"]
+    assert closed['Realized_PnL'].notna().all()
+    assert (closed['Exit_Date'] >= closed['Entry_Date']).all()
+    print("generate_trades passed.")
+
+def test_run_size():
+    print("Testing run_size...")
+    results = run_size(200, calls=2)
+    operations = {r['operation'] for r in results}
+    assert {"save_new_trade", "get_open_trades", "update_trade_to_closed",
+            "calculate_trade_metrics", "calculate_portfolio_metrics"} <= operations
+    assert all(r['size'] == 200 and r['mean_ms'] >= 0 for r in results)
+    print("run_size passed.")
+
+if __name__ == "__main__":
+    test_generate_trades()
+    test_run_size()
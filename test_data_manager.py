@@ -1,51 +1,400 @@
+import importlib.util
 import os
+import tempfile
 import pandas as pd
-from data_manager import initialize_db, save_new_trade, get_open_trades, update_trade_to_closed, load_db, DB_FILE
+from data_manager import initialize_db, save_new_trade, get_open_trades, update_trade_to_closed, load_db, save_db, export_to_excel, EXCEL_FILE
+import data_manager
+from storage import iter_excel_rows, atomic_write
+from analytics import calculate_trade_metrics
+import validation
 
 def test_data_manager():
-    # Setup: Remove existing DB
-    if os.path.exists(DB_FILE):
-        os.remove(DB_FILE)
-        
-    print("Testing initialize_db...")
-    initialize_db()
-    assert os.path.exists(DB_FILE)
+    for store_format, store_file in data_manager.STORE_FILES.items():
+        if store_format == "feather" and importlib.util.find_spec("pyarrow") is None:
+            print("pyarrow not installed, skipping the Feather store")
+            continue
+        print(f"Testing the {store_format} store...")
+        check_journal(store_file)
+
+def check_journal(store_file):
+    # A scratch journal, and export path (which initialize_db would otherwise migrate in)
+    previous, excel_file = data_manager.get_backend(), data_manager.EXCEL_FILE
+    with tempfile.TemporaryDirectory() as folder:
+        store = os.path.join(folder, os.path.basename(store_file))
+        data_manager.EXCEL_FILE = os.path.join(folder, os.path.basename(EXCEL_FILE))
+        data_manager.set_backend(data_manager.open_store(store))
+        try:
+            print("Testing initialize_db...")
+            initialize_db()
+            assert os.path.exists(store)
+            
+            print("Testing save_new_trade...")
+            entry_data = {
+                "Entry_Date": "2023-10-27",
+                "Symbol": "SPX",
+                "Strategy": "Iron Condor",
+                "Direction": "Neutral",
+                "Lots": 1,
+                "Spread_Entry_Price": 5.00
+            }
+            trade_id = save_new_trade(entry_data)
+            print(f"Trade saved with ID: {trade_id}")
+            
+            print("Testing get_open_trades...")
+            open_trades = get_open_trades()
+            assert len(open_trades) == 1
+            assert open_trades.iloc[0]['Symbol'] == "SPX"
+            assert open_trades.iloc[0]['Trade_Status'] == "OPEN"
+            
+            print("Testing update_trade_to_closed...")
+            exit_data = {
+                "Exit_Date": "2023-11-01",
+                "Spread_Exit_Price": 2.00
+            }
+            computed_metrics = {
+                "Realized_PnL": 300.00
+            }
+            update_trade_to_closed(trade_id, exit_data, computed_metrics)
+            
+            df = load_db()
+            trade = df[df['Trade_ID'] == trade_id].iloc[0]
+            assert trade['Trade_Status'] == "CLOSED"
+            assert trade['Spread_Exit_Price'] == 2.00
+            assert trade['Realized_PnL'] == 300.00
+            
+            print("Testing save_new_trade allocates the next ID...")
+            second_id = save_new_trade({"Symbol": "RUT", "Strategy": "Credit Spread"})
+            assert second_id == trade_id + 1
+            assert len(load_db()) == 2
+            
+            print("Testing the journal cache...")
+            misses = data_manager.cache_stats()['misses']
+            get_open_trades()
+            data_manager.get_trade(second_id)
+            assert data_manager.cache_stats()['misses'] == misses
+            # A write from outside the module (another process) forces a reload
+            data_manager.get_backend().update(second_id, {"Symbol": "NDX"})
+            assert data_manager.get_trade(second_id)['Symbol'] == "NDX"
+            assert data_manager.cache_stats()['misses'] == misses + 1
+            
+            print("Testing the typed schema...")
+            df = load_db()
+            for col, dtype in data_manager.DTYPES.items():
+                assert str(df[col].dtype).startswith(dtype), (col, df[col].dtype, dtype)
+            assert df.loc[df['Trade_ID'] == trade_id, 'Exit_Date'].iloc[0] == pd.Timestamp("2023-11-01")
+            try:
+                save_new_trade({"Symbol": "SPX", "Entry_Date": "not a date"})
+                assert False, "invalid date accepted"
+            except ValueError:
+                pass
+            
+            print("Testing Trade_ID index and sequence...")
+            assert data_manager.journal_issues() == []
+            df = load_db()
+            save_db(df[df['Trade_ID'] != second_id])
+            third_id = save_new_trade({"Symbol": "SPX", "Strategy": "Credit Spread"})
+            assert third_id == second_id + 1  # IDs are not reused after a delete
+            df = load_db()
+            save_db(pd.concat([df, df.tail(1)], ignore_index=True))
+            assert any("Duplicate" in issue for issue in data_manager.journal_issues())
+            save_db(df)
+            
+            print("Testing streaming reads...")
+            streamed = get_open_trades(columns=['Trade_ID', 'Symbol'], stream=True)
+            assert list(streamed.columns) == ['Trade_ID', 'Symbol']
+            assert list(streamed['Trade_ID']) == list(get_open_trades()['Trade_ID']) == [third_id]
+            chunks = list(data_manager.iter_trades(columns=['Trade_ID'], chunksize=1))
+            assert [len(c) for c in chunks] == [1, 1]
+            
+            print("Testing export_to_excel...")
+            export_to_excel()
+            exported = pd.read_excel(data_manager.EXCEL_FILE)
+            assert list(exported['Trade_ID']) == [trade_id, third_id]
+            closed = list(iter_excel_rows(data_manager.EXCEL_FILE, columns=['Trade_ID', 'Realized_PnL'], where={'Trade_Status': 'CLOSED'}))
+            assert closed == [{'Trade_ID': trade_id, 'Realized_PnL': 300}]
+        finally:
+            data_manager.set_backend(previous)
+            data_manager.EXCEL_FILE = excel_file
     
-    print("Testing save_new_trade...")
-    entry_data = {
-        "Entry_Date": "2023-10-27",
-        "Symbol": "SPX",
-        "Strategy": "Iron Condor",
-        "Direction": "Neutral",
-        "Lots": 1,
-        "Spread_Entry_Price": 5.00
-    }
-    trade_id = save_new_trade(entry_data)
-    print(f"Trade saved with ID: {trade_id}")
+    print("All tests passed!")
+
+def test_feather_store():
+    try:
+        import pyarrow
+    except ImportError:
+        print("pyarrow not installed, skipping Feather store test")
+        return
     
-    print("Testing get_open_trades...")
-    open_trades = get_open_trades()
-    assert len(open_trades) == 1
-    assert open_trades.iloc[0]['Symbol'] == "SPX"
-    assert open_trades.iloc[0]['Trade_Status'] == "OPEN"
+    print("Testing migrate_store into a Feather store...")
+    source = "test_migrate_source.xlsx"
+    target = "test_migrate_target.arrow"
+    for path in (source, target):
+        if os.path.exists(path):
+            os.remove(path)
+    pd.DataFrame([
+        {"Trade_ID": 1, "Trade_Status": "CLOSED", "Entry_Date": "2023-10-02", "Symbol": "SPX", "Realized_PnL": 120.0},
+        {"Trade_ID": 2, "Trade_Status": "OPEN", "Entry_Date": "2023-10-05", "Symbol": "RUT", "Lots": 2},
+    ]).to_excel(source, index=False)
     
-    print("Testing update_trade_to_closed...")
-    exit_data = {
-        "Exit_Date": "2023-11-01",
-        "Spread_Exit_Price": 2.00
-    }
-    computed_metrics = {
-        "Realized_PnL": 300.00
-    }
-    update_trade_to_closed(trade_id, exit_data, computed_metrics)
+    assert data_manager.migrate_store(source, target) == 2
+    store = data_manager.open_store(target)
+    df = store.load()
+    assert list(df['Trade_ID']) == [1, 2]
+    assert list(df.columns) == data_manager.COLUMNS
     
-    df = load_db()
-    trade = df[df['Trade_ID'] == trade_id].iloc[0]
-    assert trade['Trade_Status'] == "CLOSED"
-    assert trade['Spread_Exit_Price'] == 2.00
-    assert trade['Realized_PnL'] == 300.00
+    print("Testing Feather writes and column-pruned reads...")
+    assert store.allocate_trade_id() == 3
+    store.append({"Trade_ID": 3, "Trade_Status": "OPEN", "Symbol": "NDX"})
+    store.update(2, {"Trade_Status": "CLOSED", "Exit_Date": "2023-10-20", "Realized_PnL": -40.0})
+    open_rows = pd.concat(store.iter_chunks(columns=['Trade_ID', 'Symbol'], where={'Trade_Status': 'OPEN'}))
+    assert list(open_rows['Trade_ID']) == [3]
+    assert list(open_rows.columns) == ['Trade_ID', 'Symbol']
+    assert store.load().set_index('Trade_ID').loc[2, 'Realized_PnL'] == -40.0
+    store.append_many(pd.DataFrame([{"Trade_ID": 4, "Symbol": "SPX"}, {"Trade_ID": 5, "Symbol": "IWM"}]))
+    assert list(store.load()['Trade_ID']) == [1, 2, 3, 4, 5] and store.allocate_trade_id() == 6
     
-    print("All tests passed!")
+    for path in (source, target, target + ".lock"):
+        os.remove(path)
+    print("Feather store passed.")
+
+def test_bulk_import():
+    print("Testing bulk_import...")
+    store = "test_import.db"
+    csv_path = "test_import.csv"
+    for path in (store, csv_path):
+        if os.path.exists(path):
+            os.remove(path)
+    pd.DataFrame([
+        {"Entry_Date": "2023-10-02", "Symbol": "SPX", "Strategy": "Iron Condor", "Direction": "Neutral",
+         "Lots": 1, "Width": 25, "Credit_Received": 5, "Max_Loss": 2000, "Margin_Used": 2000,
+         "DTE_Entry": 30, "Spread_Entry_Price": 5, "Short_Call_Entry": 3.1, "Broker_Ref": "A1"},
+        {"Entry_Date": "2023-10-03", "Symbol": "RUT", "Strategy": "Credit Spread", "Direction": "Bullish",
+         "Lots": 2, "Width": 10, "Credit_Received": 2, "Max_Loss": 1600, "Margin_Used": 1600,
+         "DTE_Entry": "", "Spread_Entry_Price": 2, "Broker_Ref": "A2"},
+        {"Entry_Date": "2023-13-45", "Symbol": "NDX", "Strategy": "Credit Spread", "Direction": "Bearish",
+         "Lots": 1, "Width": 50, "Credit_Received": 10, "Max_Loss": 4000, "Margin_Used": 4000,
+         "DTE_Entry": 21, "Spread_Entry_Price": 10, "Broker_Ref": "A3"},
+        {"Entry_Date": "2023-10-05", "Symbol": "SPY", "Strategy": "Credit Spread", "Direction": "Bearish",
+         "Lots": 3, "Width": 5, "Credit_Received": 1, "Max_Loss": 1200, "Margin_Used": 1200,
+         "DTE_Entry": 14, "Spread_Entry_Price": 1, "Short_Leg_Entry": 1.6, "Long_Leg_Entry": 0.6},
+    ]).to_csv(csv_path, index=False)
+    
+    previous = data_manager.get_backend()
+    backend = data_manager.open_store(store)
+    backend.initialize(data_manager.COLUMNS)  # don't migrate trade_journal.xlsx into it
+    data_manager.set_backend(backend)
+    try:
+        first = save_new_trade({"Symbol": "QQQ", "Strategy": "Credit Spread"})
+        report = data_manager.bulk_import(csv_path)
+        assert report['imported'] == [first + 1, first + 2]
+        assert [line for line, _ in report['rejected']] == [3, 4]
+        assert "DTE_Entry" in report['rejected'][0][1]
+        assert report['ignored_columns'] == ["Broker_Ref"]
+        assert report['rows'] == 4
+        
+        df = load_db()
+        assert list(df['Symbol']) == ["QQQ", "SPX", "SPY"]
+        assert (df['Trade_Status'] == "OPEN").all()
+        spx = data_manager.get_trade(first + 1)
+        assert spx['Short_Call_Entry'] == 3.1 and spx['Entry_Confidence'] == 3
+        assert data_manager.get_backend().allocate_trade_id() == first + 3
+    finally:
+        data_manager.set_backend(previous)
+        for path in (store, store + ".lock", csv_path):
+            os.remove(path)
+    print("bulk_import passed.")
+
+def test_close_trades_batch():
+    print("Testing close_trades_batch...")
+    store = "test_batch.db"
+    if os.path.exists(store):
+        os.remove(store)
+    previous = data_manager.get_backend()
+    backend = data_manager.open_store(store)
+    backend.initialize(data_manager.COLUMNS)
+    data_manager.set_backend(backend)
+    try:
+        ids = data_manager.save_new_trades([
+            {"Entry_Date": "2023-10-02", "Symbol": sym, "Strategy": "Credit Spread", "Lots": lots,
+             "Credit_Received": 2.0, "Max_Loss": 800.0, "Margin_Used": 800.0, "Spread_Entry_Price": 2.0}
+            for sym, lots in [("SPX", 1), ("RUT", 2), ("NDX", 3)]
+        ])
+        closes = [(ids[0], {"Exit_Date": "2023-10-20", "Spread_Exit_Price": 0.0}),
+                  (ids[2], {"Exit_Date": "2023-10-20", "Spread_Exit_Price": 3.5, "Exit_Emotion": "Fear"})]
+        expected = {tid: calculate_trade_metrics(data_manager.get_trade(tid), exit_data) for tid, exit_data in closes}
+        
+        events = []
+        listener = lambda event, row: events.append((event, None if row is None else row['Trade_ID']))
+        data_manager.add_listener(listener)
+        try:
+            metrics = data_manager.close_trades_batch(closes)
+        finally:
+            data_manager.remove_listener(listener)
+        assert events == [("close", ids[0]), ("close", ids[2])]
+        assert metrics.loc[ids[0], 'Realized_PnL'] == expected[ids[0]]['Realized_PnL'] == 200.0
+        assert metrics.loc[ids[2], 'Realized_PnL'] == expected[ids[2]]['Realized_PnL'] == -450.0
+        
+        assert list(get_open_trades()['Trade_ID']) == [ids[1]]
+        stored = data_manager.open_store(store).load().set_index('Trade_ID')
+        assert stored.loc[ids[2], 'Trade_Status'] == "CLOSED"
+        assert stored.loc[ids[2], 'Exit_Emotion'] == "Fear"
+        assert stored.loc[ids[0], 'Rule_Violation_Flag'] == 0
+        
+        # Nothing is written if any trade in the batch is unknown
+        try:
+            data_manager.close_trades_batch([(ids[1], {"Exit_Date": "2023-10-21", "Spread_Exit_Price": 1.0}),
+                                             (9999, {"Exit_Date": "2023-10-21", "Spread_Exit_Price": 1.0})])
+            assert False, "unknown trade accepted"
+        except ValueError:
+            pass
+        assert list(get_open_trades()['Trade_ID']) == [ids[1]]
+        
+        # An exit without a readable Exit_Date is rejected before it reaches the store
+        assert validation.parse_exit({"Exit_Date": " 2023-10-21 ", "Spread_Exit_Price": "1"}, None)["Exit_Date"] == "2023-10-21"
+        for exit_date in ("", None, "21/10/2023", "soon"):
+            try:
+                validation.parse_exit({"Exit_Date": exit_date, "Spread_Exit_Price": "1"}, None)
+                assert False, f"Exit_Date {exit_date!r} accepted"
+            except ValueError:
+                pass
+    finally:
+        data_manager.set_backend(previous)
+        os.remove(store)
+        os.remove(store + ".lock")
+    print("close_trades_batch passed.")
+
+def test_excel_write_ahead_log():
+    print("Testing the Excel store's write-ahead log...")
+    store = "test_wal.xlsx"
+    for path in (store, store + ".wal", store + ".seq"):
+        if os.path.exists(path):
+            os.remove(path)
+    previous = data_manager.get_backend()
+    backend = data_manager.open_store(store)
+    backend.initialize(data_manager.COLUMNS)
+    data_manager.set_backend(backend)
+    try:
+        data_manager.defer_checkpoints()
+        first = save_new_trade({"Entry_Date": "2023-10-02", "Symbol": "SPX", "Strategy": "Iron Condor"})
+        second = save_new_trade({"Entry_Date": "2023-10-03", "Symbol": "RUT", "Strategy": "Credit Spread"})
+        update_trade_to_closed(first, {"Exit_Date": "2023-10-20", "Spread_Exit_Price": 1.0}, {"Realized_PnL": 150.0})
+        # Acknowledged but not yet in the workbook
+        assert pd.read_excel(store).empty
+        assert list(get_open_trades()['Trade_ID']) == [second]
+        
+        # A crash before the checkpoint: the log is replayed by the next initialize_db
+        with open(store + ".wal", "a") as f:
+            f.write('{"op": "insert", "row": {"Trade_ID": 9')  # torn last record
+        data_manager.set_backend(data_manager.open_store(store))
+        initialize_db()
+        assert not os.path.exists(store + ".wal")
+        workbook = pd.read_excel(store).set_index('Trade_ID')
+        assert list(workbook.index) == [first, second]
+        assert workbook.loc[first, 'Trade_Status'] == "CLOSED"
+        assert workbook.loc[first, 'Realized_PnL'] == 150.0
+        
+        # A failed rewrite leaves the old workbook in place
+        def fail(tmp):
+            with open(tmp, "w") as f:
+                f.write("partial")
+            raise OSError("disk full")
+        try:
+            atomic_write(store, fail)
+            assert False, "write error swallowed"
+        except OSError:
+            pass
+        assert len(pd.read_excel(store)) == 2
+        assert not [f for f in os.listdir(".") if f.startswith("test_wal.") and f.endswith(".tmp.xlsx")]
+        
+        # checkpoint() only takes the lock (moving the generation on) when there is something logged
+        generation = data_manager.journal_generation()
+        data_manager.checkpoint()
+        assert data_manager.journal_generation() == generation
+        update_trade_to_closed(second, {"Exit_Date": "2023-10-21", "Spread_Exit_Price": 0.5}, {"Realized_PnL": 75.0})
+        generation = data_manager.journal_generation()
+        data_manager.checkpoint()
+        assert data_manager.journal_generation() == generation + 2 and not os.path.exists(store + ".wal")
+        assert pd.read_excel(store)['Trade_Status'].tolist() == ["CLOSED", "CLOSED"]
+        
+        # With the cache warm, a deferred save or close only appends to the log
+        get_open_trades()
+        read_excel = pd.read_excel
+        def no_read(*args, **kwargs):
+            raise AssertionError("workbook read during a deferred write")
+        pd.read_excel = no_read
+        try:
+            third = save_new_trade({"Entry_Date": "2023-10-04", "Symbol": "NDX", "Strategy": "Iron Condor"})
+            fourth = save_new_trade({"Entry_Date": "2023-10-05", "Symbol": "SPX", "Strategy": "Credit Spread"})
+            update_trade_to_closed(third, {"Exit_Date": "2023-10-22", "Spread_Exit_Price": 0.8}, {"Realized_PnL": 40.0})
+            data_manager.close_trades_batch([(fourth, {"Exit_Date": "2023-10-23", "Spread_Exit_Price": 0.2})])
+            try:
+                update_trade_to_closed(99, {"Exit_Date": "2023-10-23"}, {})
+                assert False, "unknown Trade_ID logged"
+            except ValueError:
+                pass
+        finally:
+            pd.read_excel = read_excel
+        assert third == 3 and fourth == 4
+        data_manager.checkpoint()
+        workbook = pd.read_excel(store).set_index('Trade_ID')
+        assert list(workbook.index) == [first, second, third, fourth]
+        assert (workbook['Trade_Status'] == "CLOSED").all() and workbook.loc[third, 'Realized_PnL'] == 40.0
+    finally:
+        data_manager.defer_checkpoints(False)
+        data_manager.set_backend(previous)
+        for path in (store, store + ".lock", store + ".seq", store + ".wal"):
+            if os.path.exists(path):
+                os.remove(path)
+    print("Write-ahead log passed.")
+
+def _save_trades_in_process(store, count):
+    data_manager.set_backend(data_manager.open_store(store))
+    return [save_new_trade({"Symbol": "SPX", "Strategy": "Credit Spread"}) for _ in range(count)]
+
+def test_concurrent_writers():
+    print("Testing concurrent writers on a shared store...")
+    from concurrent.futures import ProcessPoolExecutor
+    store = "test_shared.xlsx"
+    for path in (store, store + ".lock", store + ".wal", store + ".seq"):
+        if os.path.exists(path):
+            os.remove(path)
+    backend = data_manager.open_store(store)
+    backend.initialize(data_manager.COLUMNS)
+    previous = data_manager.get_backend()
+    try:
+        # Each process allocates IDs from the workbook: without the lock they would collide
+        with ProcessPoolExecutor(max_workers=3) as pool:
+            results = list(pool.map(_save_trades_in_process, [store] * 3, [4] * 3))
+        ids = [i for result in results for i in result]
+        assert sorted(ids) == list(range(1, 13))
+        assert sorted(pd.read_excel(store)['Trade_ID']) == list(range(1, 13))
+        
+        print("Testing compare-and-swap writes...")
+        data_manager.set_backend(data_manager.open_store(store))
+        df, generation = data_manager.load_snapshot()
+        assert generation == data_manager.journal_generation() and generation % 2 == 0
+        _save_trades_in_process(store, 1)  # someone else writes in between
+        data_manager.set_backend(data_manager.open_store(store))
+        try:
+            save_db(df, expected_generation=generation)
+            assert False, "stale write accepted"
+        except data_manager.ConflictError:
+            pass
+        assert len(load_db()) == 13
+        df, generation = data_manager.load_snapshot()
+        save_db(df[df['Trade_ID'] != 13], expected_generation=generation)
+        assert len(load_db()) == 12
+        assert data_manager.journal_generation() == generation + 2
+    finally:
+        data_manager.set_backend(previous)
+        for path in (store, store + ".lock", store + ".seq"):
+            os.remove(path)
+    print("Concurrent writers passed.")
 
 if __name__ == "__main__":
     test_data_manager()
+    test_feather_store()
+    test_bulk_import()
+    test_close_trades_batch()
+    test_excel_write_ahead_log()
+    test_concurrent_writers()
@@ -0,0 +1,55 @@
+import datetime
+import pandas as pd
+import benchmark
+import expiries
+from expiries import ExpiryIndex
+from trade_view import with_expiry
+
+def brute_force(df):
+    dates = expiries.expiry_dates(df)
+    return sorted((d.date(), int(i)) for i, d in zip(df["Trade_ID"], dates) if pd.notna(d))
+
+def test_expiry_index():
+    print("Testing ExpiryIndex against a scan of the frame...")
+    df = benchmark.generate_trades(4000, seed=5)
+    df_open = df[df["Trade_Status"] == "OPEN"]
+    index = ExpiryIndex.from_frame(df_open)
+    expected = brute_force(df_open)
+    assert len(index) == len(expected) == len(df_open)
+    start, end = expected[len(expected) // 3][0], expected[2 * len(expected) // 3][0]
+    assert index.between(start, end) == [k for k in expected if start <= k[0] <= end]
+    assert index.between(pd.Timestamp(start), str(start)) == [k for k in expected if k[0] == start]
+    assert index.between(None, None) == expected and index.between(end, start) == []
+
+    groups = index.next_expiries(5, start=start)
+    dates = sorted({d for d, _ in expected if d >= start})[:5]
+    assert [d for d, _ in groups] == dates
+    assert all(ids == [i for d, i in expected if d == day] for day, ids in groups)
+    assert index.next_expiries(3)[0][0] == expected[0][0]
+
+    print("Testing add_trade and remove_trade...")
+    closing = [i for _, i in expected[::3]]
+    for trade_id in closing:
+        index.remove_trade(trade_id)
+    index.remove_trade(10**9)  # unknown: ignored
+    assert index.between(None, None) == brute_force(df_open[~df_open["Trade_ID"].isin(closing)])
+    rows = df_open[df_open["Trade_ID"].isin(closing)].to_dict("records")
+    for row in rows:
+        index.add_trade(row)
+    index.add_trade(rows[0])  # already indexed: not added twice
+    assert index.between(None, None) == expected
+    index.add_trade({"Trade_ID": rows[0]["Trade_ID"], "Entry_Date": "2030-01-01", "DTE_Entry": 9})
+    assert index.expiry(rows[0]["Trade_ID"]) == datetime.date(2030, 1, 10)
+    assert index.between("2030-01-10", "2030-01-10") == [(datetime.date(2030, 1, 10), rows[0]["Trade_ID"])]
+    index.add_trade({"Trade_ID": 10**9, "Entry_Date": None, "DTE_Entry": 30})
+    assert 10**9 not in index and len(index) == len(expected)
+
+    print("Testing expiry cells...")
+    today = datetime.date(2024, 3, 1)
+    cells = with_expiry({1: ("a",), 2: ("b",)}, {1: datetime.date(2024, 3, 15)}, today)
+    assert cells == {1: ("a", "2024-03-15", 14), 2: ("b", None, None)}
+    assert expiries.days_left(datetime.date(2024, 2, 28), today) == -2
+    print("ExpiryIndex passed.")
+
+if __name__ == "__main__":
+    test_expiry_index()
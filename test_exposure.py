@@ -0,0 +1,107 @@
+import os
+import tempfile
+import numpy as np
+import benchmark
+import data_manager
+import exposure
+from exposure import ExposureBook
+
+def same_book(a, b):
+    assert len(a) == len(b)
+    for key, value in a.totals().items():
+        assert abs(value - b.totals()[key]) < 1e-6, key
+    for group in exposure.GROUPS:
+        rows_a, rows_b = dict(a.concentration(group)), dict(b.concentration(group))
+        assert rows_a.keys() == rows_b.keys(), group
+        for value, row in rows_a.items():
+            assert all(abs(row[key] - rows_b[value][key]) < 1e-6 for key in row), (group, value)
+
+def test_exposure_book():
+    print("Testing ExposureBook.from_frame against adding trades one by one...")
+    df = benchmark.generate_trades(3000, seed=4)
+    df_open = df[df["Trade_Status"] == "OPEN"]
+    book = ExposureBook.from_frame(df_open)
+    one_by_one = ExposureBook()
+    for row in df_open.to_dict("records"):
+        one_by_one.add_trade(row)
+    same_book(book, one_by_one)
+    assert book.totals()["Open_Trades"] == len(df_open)
+    assert abs(book.totals()["Margin_Used"] - df_open["Margin_Used"].sum()) < 1e-6
+    assert sum(row["Margin_%"] for _, row in book.concentration("Symbol")) > 99.999
+
+    print("Testing remove_trade...")
+    closing = list(df_open["Trade_ID"])[::2]
+    for trade_id in closing:
+        book.remove_trade(trade_id)
+    book.remove_trade(10**9)  # unknown: ignored
+    same_book(book, ExposureBook.from_frame(df_open[~df_open["Trade_ID"].isin(closing)]))
+    for trade_id in list(df_open["Trade_ID"]):
+        book.remove_trade(trade_id)
+    assert book.totals() == {"Open_Trades": 0, "Margin_Used": 0.0, "Max_Loss": 0.0, "Net_Delta": 0.0}
+    assert all(book.concentration(group) == [] for group in exposure.GROUPS)
+
+    print("Testing the delta proxy and expiry groups...")
+    book = ExposureBook()
+    book.add_trade({"Trade_ID": 1, "Symbol": "SPX", "Strategy": "Credit Spread", "Direction": "Bullish",
+                    "Entry_Date": "2024-03-01", "DTE_Entry": 14, "Lots": 2, "Margin_Used": 1000.0,
+                    "Max_Loss": 900.0, "Sell_Strike_Delta": -0.2})
+    book.add_trade({"Trade_ID": 2, "Symbol": "SPX", "Strategy": "Iron Condor", "Direction": "Neutral",
+                    "Entry_Date": "2024-03-01", "DTE_Entry": 14, "Lots": 1, "Margin_Used": 3000.0,
+                    "Max_Loss": 2500.0, "Sell_Strike_Delta": 0.15})
+    book.add_trade({"Trade_ID": 3, "Symbol": "RUT", "Strategy": "Credit Spread", "Direction": "Bearish",
+                    "Entry_Date": None, "DTE_Entry": None, "Lots": 1, "Margin_Used": 500.0,
+                    "Max_Loss": 450.0, "Sell_Strike_Delta": 0.1})
+    assert abs(book.totals()["Net_Delta"] - 0.3) < 1e-9  # +0.4 bullish, 0 neutral, -0.1 bearish
+    assert [value for value, _ in book.concentration("Expiry")] == ["2024-03-15", exposure.MISSING]
+    spx = dict(book.concentration("Symbol"))["SPX"]
+    assert spx["Open_Trades"] == 2 and spx["Margin_Used"] == 4000.0 and abs(spx["Margin_%"] - 4000 / 45) < 1e-9
+
+    print("Testing limit checks...")
+    limits = exposure.parse_limits("Margin_Used=5000, Net_Delta=0.5,Symbol_Margin=4500")
+    assert limits == {"Margin_Used": 5000.0, "Net_Delta": 0.5, "Symbol_Margin": 4500.0}
+    new = {"Symbol": "SPX", "Strategy": "Credit Spread", "Direction": "Bullish", "Entry_Date": "2024-03-04",
+           "DTE_Entry": 11, "Lots": 1, "Margin_Used": 600.0, "Max_Loss": 500.0, "Sell_Strike_Delta": 0.25}
+    warnings = book.check(new, limits)
+    assert len(warnings) == 3 and "Net_Delta" in warnings[1] and "Symbol SPX" in warnings[2]
+    assert book.check(dict(new, Symbol="IWM", Lots=0, Margin_Used=100.0), limits) == []
+    assert book.check(new, {}) == [] and len(book) == 3  # nothing added
+    for bad in ("Margin=1", "Max_Loss=lots", "Max_Loss"):
+        try:
+            exposure.parse_limits(bad)
+            raise AssertionError(f"{bad!r} accepted")
+        except ValueError:
+            pass
+    print("ExposureBook passed.")
+
+def test_exposure_follows_journal():
+    print("Testing an ExposureBook kept up to date by journal events...")
+    previous = data_manager.get_backend()
+    with tempfile.TemporaryDirectory() as folder:
+        backend = data_manager.open_store(os.path.join(folder, "exposure.db"))
+        backend.initialize(data_manager.COLUMNS)
+        data_manager.set_backend(backend)
+        book = ExposureBook.from_frame(data_manager.get_open_trades(columns=exposure.COLUMNS))
+
+        def on_event(event, row):
+            if event == "insert":
+                book.add_trade(row)
+            elif event == "close":
+                book.remove_trade(row["Trade_ID"])
+
+        data_manager.add_listener(on_event)
+        try:
+            rng = np.random.default_rng(2)
+            ids = data_manager.save_new_trades([benchmark.sample_entry(rng) for _ in range(20)])
+            ids.append(data_manager.save_new_trade(benchmark.sample_entry(rng)))
+            data_manager.close_trades_batch([(i, {"Exit_Date": "2024-06-28", "Spread_Exit_Price": 0.5})
+                                             for i in ids[:8]])
+            same_book(book, ExposureBook.from_frame(data_manager.get_open_trades(columns=exposure.COLUMNS)))
+            assert len(book) == 13
+        finally:
+            data_manager.remove_listener(on_event)
+            data_manager.set_backend(previous)
+    print("Journal events passed.")
+
+if __name__ == "__main__":
+    test_exposure_book()
+    test_exposure_follows_journal()
@@ -0,0 +1,88 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import instrumentation
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def test_instrumentation():
+    print("Testing timed() when turned off...")
+    def plain(n):
+        return list(range(n))
+    assert instrumentation.ENABLED or instrumentation.timed("plain")(plain) is plain
+
+    enabled, cprofile = instrumentation.ENABLED, instrumentation.CPROFILE
+    instrumentation.ENABLED, instrumentation.CPROFILE = True, ["slow_*"]
+    instrumentation.reset()
+    try:
+        print("Testing calls, rows, bytes and errors...")
+        namespace = {"__name__": __name__, "plain": plain, "_private": plain}
+        instrumentation.instrument_module(namespace, "fake")
+        assert namespace["_private"] is plain
+        assert namespace["plain"](5) == [0, 1, 2, 3, 4]
+        namespace["plain"](3)
+
+        class Store:
+            def load(self):
+                instrumentation.record(rows=7, bytes_read=1024)
+                return "df"
+
+            def fail(self):
+                raise KeyError("missing")
+
+            @staticmethod
+            def slow_sum(n):
+                return sum(i * i for i in range(n))
+        instrumentation.instrument_class(Store, "store")
+        assert Store().load() == "df"
+        try:
+            Store().fail()
+            raise AssertionError("fail() should raise")
+        except KeyError:
+            pass
+        assert Store.slow_sum(10) == 285
+
+        stats = instrumentation.snapshot()
+        assert stats["fake.plain"]["calls"] == 2
+        assert stats["fake.plain"]["rows"] == 8  # from the returned lists
+        assert sum(stats["fake.plain"]["histogram"].values()) == 2
+        assert stats["store.load"]["rows"] == 7 and stats["store.load"]["bytes_read"] == 1024
+        assert stats["store.fail"]["errors"] == 1
+        assert "store.slow_sum" in instrumentation.format_table()
+
+        print("Testing dump_json with cProfile output...")
+        with tempfile.TemporaryDirectory() as folder:
+            path = instrumentation.dump_json(os.path.join(folder, "stats.json"))
+            with open(path) as f:
+                dumped = json.load(f)
+            assert dumped["operations"]["store.load"]["calls"] == 1
+            assert sorted(os.listdir(folder)) == ["stats.json", "store.slow_sum.prof"]
+    finally:
+        instrumentation.ENABLED, instrumentation.CPROFILE = enabled, cprofile
+        instrumentation.reset()
+
+    print("Testing the journal modules with TRADE_JOURNAL_PROFILE=1...")
+    with tempfile.TemporaryDirectory() as folder:
+        out = os.path.join(folder, "profile.json")
+        script = (
+            "import data_manager, storage\n"
+            f"backend = storage.ExcelBackend({os.path.join(folder, 'journal.xlsx')!r})\n"
+            "backend.initialize(data_manager.COLUMNS)\n"
+            "data_manager.set_backend(backend)\n"
+            "data_manager.save_new_trade({'Symbol': 'SPX', 'Strategy': 'Credit Spread'})\n"
+            "data_manager.get_open_trades()\n"
+        )
+        env = dict(os.environ, TRADE_JOURNAL_PROFILE="1", TRADE_JOURNAL_PROFILE_OUT=out)
+        subprocess.run([sys.executable, "-c", script], cwd=HERE, env=env, check=True)
+        with open(out) as f:
+            operations = json.load(f)["operations"]
+        assert operations["data_manager.save_new_trade"]["calls"] == 1
+        assert operations["data_manager.save_new_trade"]["bytes_written"] > 0
+        assert operations["data_manager.get_open_trades"]["rows"] == 1
+        assert operations["storage.ExcelBackend.load"]["bytes_read"] > 0
+    print("Instrumentation passed.")
+
+if __name__ == "__main__":
+    test_instrumentation()
@@ -0,0 +1,79 @@
+import threading
+import time
+from io_executor import IOExecutor
+
+class FakeRoot:
+    """Stands in for tk.Tk: runs after() callbacks when pump() is called."""
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, ms, callback):
+        self.callbacks.append(callback)
+
+    def pump(self, timeout=5):
+        deadline = time.time() + timeout
+        while self.callbacks and time.time() < deadline:
+            callback = self.callbacks.pop(0)
+            time.sleep(0.01)
+            callback()
+
+def test_io_executor():
+    print("Testing IOExecutor...")
+    root = FakeRoot()
+    busy = []
+    errors = []
+    executor = IOExecutor(root, on_busy_changed=busy.append, on_error=errors.append)
+    
+    order = []
+    results = []
+    main_thread = threading.current_thread()
+    
+    def job(n):
+        order.append(n)
+        return n * 2
+    
+    def on_success(value):
+        assert threading.current_thread() is main_thread
+        results.append(value)
+    
+    for n in range(5):
+        executor.submit(job, n, on_success=on_success)
+    executor.submit(lambda: 1 / 0)
+    
+    root.pump()
+    
+    # Jobs ran one at a time, in submission order
+    assert order == [0, 1, 2, 3, 4]
+    assert results == [0, 2, 4, 6, 8]
+    assert len(errors) == 1 and isinstance(errors[0], ZeroDivisionError)
+    assert executor.pending == 0
+    assert busy[0] == 1 and busy[-1] == 0
+    
+    print("Testing a callback that raises...")
+    def broken(value):
+        raise KeyError(value)
+    executor.submit(job, 5, on_success=broken)
+    executor.submit(job, 6, on_success=on_success)
+    root.pump()
+    assert isinstance(errors[-1], KeyError) and results[-1] == 12
+    assert executor.pending == 0 and busy[-1] == 0
+    executor.shutdown()
+    
+    # Without an on_error handler the exception reaches Tk, but the next result still arrives
+    root = FakeRoot()
+    busy = []
+    executor = IOExecutor(root, on_busy_changed=busy.append)
+    executor.submit(job, 7, on_success=broken)
+    executor.submit(job, 8, on_success=on_success)
+    executor.submit(job, 9, on_success=on_success)
+    try:
+        root.pump()
+    except KeyError:
+        root.pump()
+    assert results[-2:] == [16, 18]
+    assert executor.pending == 0 and busy[-1] == 0
+    executor.shutdown()
+    print("IOExecutor passed.")
+
+if __name__ == "__main__":
+    test_io_executor()
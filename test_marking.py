@@ -0,0 +1,96 @@
+import asyncio
+import math
+import os
+import tempfile
+import pandas as pd
+import marking
+from marking import MarkBook, MarkToMarketService, Quote
+from trade_view import with_marks
+
+def positions():
+    return pd.DataFrame({
+        "Trade_ID": [7, 3, 5],
+        "Strategy": ["Iron Condor", "Credit Spread", "Credit Spread"],
+        "Spread_Entry_Price": [2.0, 1.5, 1.0],
+        "Lots": [1.0, 2.0, 1.0],
+        "Max_Loss": [800.0, 700.0, 0.0],
+        "Credit_Received": [2.0, 1.5, 1.0],
+        "Planned_Exit_Percent": [50.0, 50.0, None],
+    })
+
+def test_mark_book():
+    print("Testing MarkBook repricing...")
+    book = MarkBook()
+    book.set_positions(positions())
+    assert len(book) == 3 and book.take_changes().keys() == {3, 5, 7}
+    assert all(math.isnan(v) for v in book.marks([3])[3])  # not quoted yet
+
+    used = book.apply([
+        Quote(3, "Short_Leg", 2.0), Quote(3, "Long_Leg", 0.9), Quote(3, "Long_Leg", 1.25),  # last quote wins
+        Quote(7, "Short_Call", 1.0), Quote(7, "Long_Call", 0.4), Quote(7, "Short_Put", 0.8),
+        Quote(99, "Short_Leg", 1.0), Quote(5, "Butterfly", 1.0),
+    ])
+    assert used == 6 and book.ignored == 2
+    changes = book.take_changes()
+    assert changes.keys() == {3, 7}
+    mark, unrealized, risk, captured, target = changes[3]
+    assert mark == 0.75 and unrealized == 150.0  # (1.5 - 0.75) x 2 lots x 100
+    assert abs(risk - 150 / 700 * 100) < 1e-9 and captured == 50.0 and target == 100.0
+    assert math.isnan(changes[7][0])  # Long_Put still missing
+
+    book.apply([Quote(7, "Long_Put", 0.2), Quote(5, "Spread", 1.4)])
+    marks = book.marks()
+    assert abs(marks[7][0] - 1.2) < 1e-9 and abs(marks[7][1] - 80.0) < 1e-9
+    assert abs(marks[5][1] + 40.0) < 1e-9 and marks[5][2] == 0.0  # no Max_Loss
+    assert math.isnan(marks[5][4])  # no planned exit, no target
+
+    print("Testing set_positions keeps quotes of trades still open...")
+    book.set_positions(positions()[positions()["Trade_ID"] != 7])
+    assert set(book.marks()) == {3, 5} and book.marks([3])[3][0] == 0.75
+    assert list(book.frame().index) == [3, 5]
+
+    rows = with_marks({3: ("a",), 9: ("b",)}, book.marks())
+    assert rows[3] == ("a", 0.75, 150.0, 21.43, 100.0) and rows[9] == ("b", None, None, None, None)
+    print("MarkBook passed.")
+
+def test_mark_to_market_service():
+    print("Testing the service with a CSV replay...")
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "quotes.csv")
+        with open(path, "w") as f:
+            f.write("Time,Trade_ID,Leg,Price\n")
+            for i in range(3000):
+                f.write(f"{i / 3000},3,{'Short_Leg' if i % 2 else 'Long_Leg'},{1 + i / 1000}\n")
+            f.write("3.0,3,Short_Leg,oops\n")
+        book = MarkBook()
+        book.set_positions(positions())
+        book.take_changes()
+        updates = []
+        service = MarkToMarketService(book, marking.csv_replay(path, batch_size=100), updates.append, interval=0.01)
+        asyncio.run(service.run())
+        assert service.quotes == 3000
+        assert 1 <= len(updates) < 30  # 30 batches, coalesced into far fewer updates
+        assert abs(updates[-1][3][0] - (3.999 - 3.998)) < 1e-9  # the last quotes of each leg
+
+    print("Testing the socket source...")
+    async def replay():
+        async def serve(reader, writer):
+            writer.write(b"5,Spread,0.5\n5,Spr")
+            await writer.drain()
+            await asyncio.sleep(0.05)
+            writer.write(b"ead,0.25\nbad line\n")
+            await writer.drain()
+            writer.close()
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        received = []
+        async with server:
+            async for batch in marking.source_from_spec(f"127.0.0.1:{port}"):
+                received.extend(batch)
+        return received
+    assert asyncio.run(replay()) == [Quote(5, "Spread", 0.5), Quote(5, "Spread", 0.25)]
+    print("Mark-to-market service passed.")
+
+if __name__ == "__main__":
+    test_mark_book()
+    test_mark_to_market_service()
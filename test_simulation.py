@@ -0,0 +1,57 @@
+import math
+import numpy as np
+import pandas as pd
+import simulation
+
+def test_simulation():
+    print("Testing simulate with a one-trade distribution...")
+    up = simulation.simulate([100.0, None], 1000, paths=50, horizon=5, seed=1, workers=1)
+    assert len(up) == 50 and up.risk_of_ruin == 0
+    assert (up.final_equity == 1500).all() and (up.max_drawdown == 0).all() and (up.recovery == 0).all()
+    down = simulation.simulate([-100.0], 250, paths=10, horizon=5, seed=1, workers=1)
+    assert down.risk_of_ruin == 100 and (down.max_drawdown == -500).all()
+    assert np.isnan(down.recovery).all() and down.summary()["Unrecovered_%"] == 100
+    starved = simulation.simulate_trades(pd.DataFrame({"Realized_PnL": [10.0], "Margin_Used": [1000.0]}), 500,
+                                         paths=5, horizon=3, workers=1)
+    assert starved.ruined.all()  # can never put up the margin
+
+    print("Testing simulate_batch against a per-path loop...")
+    pnls = np.array([250.0, -400.0, 120.0, -90.0, 300.0])
+    margins = np.array([500.0, 800.0, 500.0, 300.0, 900.0])
+    seed = np.random.SeedSequence(3)
+    batch = simulation.simulate_batch(pnls, margins, 1000.0, 12, 200, 0.0, seed)
+    picks = np.random.default_rng(seed).integers(0, len(pnls), size=(200, 12))
+    for p in range(200):
+        equity, peak, worst, worst_peak, trough, ruined = 1000.0, 1000.0, 0.0, 1000.0, -1, False
+        curve = []
+        for i, k in enumerate(picks[p]):
+            ruined |= equity < margins[k]
+            equity += pnls[k]
+            ruined |= equity <= 0
+            curve.append(equity)
+            peak = max(peak, equity)
+            if equity - peak < worst:
+                worst, worst_peak, trough = equity - peak, peak, i
+        back = [i for i in range(trough + 1, 12) if curve[i] >= worst_peak]
+        recovery = 0 if worst == 0 else (back[0] - trough if back else math.nan)
+        assert batch["max_drawdown"][p] == worst and batch["ruined"][p] == ruined
+        assert batch["final_equity"][p] == equity
+        assert batch["recovery"][p] == recovery or (math.isnan(recovery) and np.isnan(batch["recovery"][p]))
+        if worst:
+            assert abs(batch["max_drawdown_pct"][p] - worst / worst_peak * 100) < 1e-9
+
+    print("Testing the process pool gives the same paths...")
+    one = simulation.simulate(pnls, 2000, paths=900, seed=11, workers=1, batch_size=300)
+    pool = simulation.simulate(pnls, 2000, paths=900, seed=11, workers=2, batch_size=300)
+    assert np.array_equal(one.final_equity, pool.final_equity)
+    assert np.array_equal(one.recovery, pool.recovery, equal_nan=True)
+    assert np.array_equal(one.ruined, pool.ruined)
+    try:
+        simulation.simulate([None], 1000)
+        raise AssertionError("simulate should need at least one PnL")
+    except ValueError:
+        pass
+    print("Simulation passed.")
+
+if __name__ == "__main__":
+    test_simulation()
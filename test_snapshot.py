@@ -0,0 +1,70 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import analytics
+import benchmark
+import cube
+import snapshot
+from snapshot import AnalyticsSnapshot
+
+def build(df_closed):
+    trade_ids, hashes = snapshot.fingerprint(df_closed)
+    portfolio = analytics.PortfolioAccumulator.from_frame(df_closed)
+    return AnalyticsSnapshot.build(trade_ids, hashes, portfolio, cube.AnalyticsCube.from_frame(df_closed),
+                                   df_closed, 200)
+
+def test_snapshot():
+    print("Testing AnalyticsSnapshot save and load...")
+    df = benchmark.generate_trades(3000, seed=6)
+    df_closed = df[df["Trade_Status"] == "CLOSED"].reindex(columns=snapshot.COLUMNS)
+    older, newer = df_closed.iloc[:-40], df_closed.iloc[-40:]
+    with tempfile.TemporaryDirectory() as folder:
+        path = snapshot.path_for(os.path.join(folder, "journal.db"))
+        build(older).save(path)
+        saved = AnalyticsSnapshot.load(path)
+        assert saved is not None and len(saved) == len(older)
+        results, expected = saved.results(), build(older).results()
+        for key in ("Total_Trades", "Cumulative_PnL", "Max_Drawdown", "Win_Rate", "Longest_Underwater"):
+            assert abs(results[key] - expected[key]) < 1e-9, key
+        assert results["Equity_Curve"] == expected["Equity_Curve"]
+        assert np.array_equal(results["Curve"].equity, expected["Curve"].equity)
+        pd.testing.assert_series_equal(results["Rolling"], expected["Rolling"])
+        pd.testing.assert_frame_equal(saved.restore_cube().breakdown("Symbol"),
+                                      cube.AnalyticsCube.from_frame(older).breakdown("Symbol"))
+
+        print("Testing new_trades...")
+        assert not saved.new_trades(*snapshot.fingerprint(older)).any()
+        shuffled = older.sample(frac=1, random_state=1)
+        assert not saved.new_trades(*snapshot.fingerprint(shuffled)).any()  # row order doesn't matter
+        new = saved.new_trades(*snapshot.fingerprint(df_closed))
+        assert new.sum() == len(newer) and new[-len(newer):].all()
+        edited = older.copy()
+        edited.iloc[5, edited.columns.get_loc("Realized_PnL")] += 1.0
+        assert saved.new_trades(*snapshot.fingerprint(edited)) is None
+        assert saved.new_trades(*snapshot.fingerprint(older.iloc[1:])) is None  # a trade reopened
+
+        print("Testing fold against a rebuild...")
+        cube_, portfolio = saved.fold(df_closed[new])
+        rebuilt = analytics.PortfolioAccumulator.from_frame(df_closed).metrics(curve_tail=8)
+        for key, value in portfolio.metrics(curve_tail=8).items():
+            assert np.allclose(value, rebuilt[key], equal_nan=True), key
+        pd.testing.assert_frame_equal(cube_.breakdown("Strategy"),
+                                      cube.AnalyticsCube.from_frame(df_closed).breakdown("Strategy"))
+
+        print("Testing unusable snapshots...")
+        assert AnalyticsSnapshot.load(os.path.join(folder, "missing.analytics.npz")) is None
+        with open(path, "wb") as f:
+            f.write(b"not a snapshot")
+        assert AnalyticsSnapshot.load(path) is None
+        previous = snapshot.VERSION
+        build(older).save(path)
+        snapshot.VERSION = previous + 1
+        try:
+            assert AnalyticsSnapshot.load(path) is None
+        finally:
+            snapshot.VERSION = previous
+    print("AnalyticsSnapshot passed.")
+
+if __name__ == "__main__":
+    test_snapshot()
@@ -0,0 +1,49 @@
+import pandas as pd
+from trade_view import OpenTradesModel, rows_from_frame
+import data_manager
+
+def test_open_trades_model():
+    print("Testing rows_from_frame...")
+    df = data_manager.apply_schema(pd.DataFrame({
+        "Trade_ID": [3, 1, 2],
+        "Entry_Date": ["2023-10-05", "2023-10-02", None],
+        "Symbol": ["RUT", "SPX", "NDX"],
+        "Strategy": ["Credit Spread", "Iron Condor", "Credit Spread"],
+        "Lots": [2, 1, None],
+        "Spread_Entry_Price": [1.5, 5.0, 10.0],
+    }))
+    rows = rows_from_frame(df)
+    assert rows[1] == (1, "2023-10-02", "SPX", "Iron Condor", 1.0, 5.0)
+    assert rows[2][1] is None and rows[2][4] is None
+
+    print("Testing diffs by Trade_ID...")
+    model = OpenTradesModel()
+    assert model.update(rows) == ([3, 1, 2], [], [])
+    assert model.update(dict(rows)) == ([], [], [])
+    changed = dict(rows)
+    del changed[3]
+    changed[2] = changed[2][:4] + (4.0,) + changed[2][5:]
+    changed[7] = (7, "2023-10-09", "SPY", "Credit Spread", 1.0, 0.5)
+    assert model.update(changed) == ([7], [3], [2])
+    assert sorted(model.rows) == [1, 2, 7]
+
+    print("Testing sorting, filtering and windowing...")
+    assert model.order == [1, 2, 7]
+    model.sort_by(2)  # Symbol
+    assert model.order == [2, 1, 7]
+    model.sort_by(2)
+    assert model.order == [7, 1, 2]
+    model.sort_by(1)  # Date: the trade without one goes last
+    assert model.order == [1, 7, 2]
+    model.sort_by(1)
+    assert model.order == [7, 1, 2]
+    model.set_filter("credit")
+    assert model.order == [7, 2]
+    model.set_filter("")
+    assert model.window(1, 5) == [(1, model.rows[1]), (2, model.rows[2])]
+    model.remove([1])
+    assert len(model) == 2
+    print("OpenTradesModel passed.")
+
+if __name__ == "__main__":
+    test_open_trades_model()
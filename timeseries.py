@@ -0,0 +1,151 @@
+"""
+Equity curve and drawdown time series for closed trades.
+
+EquitySeries.from_trades() turns (Exit_Date, Realized_PnL) pairs into NumPy
+arrays of equity (cumulative PnL), drawdown from the running peak and
+underwater duration, either one point per trade or resampled to days,
+weeks or months. lttb() picks a fixed number of points that keep the
+curve's shape, so a chart can show years of history cheaply.
+"""
+import numpy as np
+import pandas as pd
+import instrumentation
+
+# Resampling frequencies: one point per trade, per day, per week (starting Monday) or per month
+FREQUENCIES = (None, "D", "W", "M")
+
+_DAY = np.timedelta64(1, "D")
+
+
+def _periods(dates, freq):
+    """The first day of the period (freq) that each date falls in, as datetime64[D]."""
+    days = dates.astype("datetime64[D]")
+    if freq == "D":
+        return days
+    if freq == "W":
+        n = days.astype(np.int64)
+        return (n - (n + 3) % 7).astype("datetime64[D]")  # 1970-01-01 was a Thursday
+    return dates.astype("datetime64[M]").astype("datetime64[D]")
+
+
+def _period_range(first, last, freq):
+    if freq == "D":
+        return np.arange(first, last + 1)
+    if freq == "W":
+        return np.arange(first, last + 7, 7)
+    months = np.arange(first.astype("datetime64[M]"), last.astype("datetime64[M]") + 1)
+    return months.astype("datetime64[D]")
+
+
+class EquitySeries:
+    """
+    Parallel NumPy arrays, oldest first:
+
+    dates:      datetime64[ns] exit date of each trade, or the first day of each period
+    equity:     cumulative Realized_PnL
+    drawdown:   equity minus its running peak (0 at a new peak, negative below it),
+                as in calculate_portfolio_metrics
+    underwater: days since the last peak (0 at a peak)
+    """
+
+    def __init__(self, dates, equity, drawdown, underwater):
+        self.dates = dates
+        self.equity = equity
+        self.drawdown = drawdown
+        self.underwater = underwater
+
+    @classmethod
+    def from_trades(cls, exit_dates, pnls, freq=None):
+        """
+        Builds the series from closed trades in any order (same-day trades keep
+        their order). Missing PnL counts as 0; trades without an Exit_Date
+        can't be placed on the curve and are left out.
+
+        freq: None for one point per trade, or "D", "W" or "M" for the equity at
+              the end of each day/week/month. Periods without trades repeat the
+              previous equity, so the dates are evenly spaced.
+        """
+        if freq not in FREQUENCIES:
+            raise ValueError(f"freq must be one of {FREQUENCIES}, got {freq!r}")
+        dates = pd.to_datetime(pd.Series(exit_dates)).to_numpy(dtype="datetime64[ns]")
+        pnls = pd.to_numeric(pd.Series(pnls)).to_numpy(dtype=float, na_value=np.nan)
+        if len(dates) != len(pnls):
+            raise ValueError("exit_dates and pnls must have the same length.")
+        dated = ~np.isnat(dates)
+        dates, pnls = dates[dated], pnls[dated]
+
+        order = np.argsort(dates, kind="stable")
+        dates = dates[order]
+        pnls = np.nan_to_num(pnls[order], nan=0.0)
+
+        if freq is not None and len(dates):
+            periods = _periods(dates, freq)
+            labels = _period_range(periods[0], periods[-1], freq)
+            pnls = np.bincount(np.searchsorted(labels, periods), weights=pnls, minlength=len(labels))
+            dates = labels.astype("datetime64[ns]")
+
+        equity = np.cumsum(pnls)
+        peak = np.maximum.accumulate(equity) if len(equity) else equity
+        drawdown = equity - peak
+
+        # Index of the most recent point that was at the peak
+        at_peak = np.where(drawdown == 0, np.arange(len(equity)), 0)
+        last_peak = np.maximum.accumulate(at_peak) if len(equity) else at_peak
+        underwater = (dates - dates[last_peak]) / _DAY
+
+        return cls(dates, equity, drawdown, underwater)
+
+    def __len__(self):
+        return len(self.equity)
+
+    @property
+    def max_drawdown(self):
+        return float(self.drawdown.min()) if len(self) else 0.0
+
+    @property
+    def longest_underwater(self):
+        """Longest time (days) spent below a previous peak so far."""
+        return float(self.underwater.max()) if len(self) else 0.0
+
+    def downsample(self, points):
+        """A copy with at most `points` points, picked from the equity curve by lttb()."""
+        keep = lttb(self.dates.astype(np.int64), self.equity, points)
+        return EquitySeries(self.dates[keep], self.equity[keep], self.drawdown[keep], self.underwater[keep])
+
+
+def lttb(x, y, points):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of at most `points` samples of (x, y), x ascending:
+    the first and last points plus, from each of points - 2 equal buckets in
+    between, the point forming the largest triangle with the point kept
+    before it and the average of the next bucket. Peaks and troughs survive,
+    unlike taking every n-th point.
+    """
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # Bucket i covers [edges[i], edges[i + 1]); the last bucket is the final point alone
+    edges = np.linspace(1, n - 1, points - 1).astype(np.intp)
+    edges = np.append(edges, n)
+    keep = np.empty(points, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2]
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+# Timings when TRADE_JOURNAL_PROFILE is set
+instrumentation.instrument_module(globals(), "timeseries")
+instrumentation.instrument_class(EquitySeries, "timeseries.EquitySeries", names=("from_trades", "downsample"))
@@ -1,11 +1,53 @@
+import time
+START = time.perf_counter()
+
+import argparse
+import sys
 import tkinter as tk
 from gui import TradeJournalGUI
-import data_manager
 
-def main():
-    data_manager.initialize_db()
+class StartupTimer:
+    """Records how long each startup phase takes (--startup-timing)."""
+    def __init__(self, start):
+        self.start = self.last = start
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last, now - self.start))
+        self.last = now
+
+    def report(self, file):
+        for phase, took, total in self.phases:
+            print(f"{phase:<22}{took * 1000:9.1f} ms   (total {total * 1000:9.1f} ms)", file=file)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trade journal")
+    parser.add_argument("--startup-timing", nargs="?", const="-", metavar="FILE",
+                        help="time each startup phase, write the report (to stderr or FILE) and exit")
+    args = parser.parse_args(argv)
+
+    timer = StartupTimer(START)
+    timer.mark("import gui")
     root = tk.Tk()
+    timer.mark("create window")
     app = TradeJournalGUI(root)
+    timer.mark("build widgets")
+    root.update()  # paint the window before any journal work
+    timer.mark("first paint")
+
+    def loaded():
+        timer.mark("show open trades")
+        if args.startup_timing:
+            # The windowed PyInstaller build has no stderr
+            if args.startup_timing == "-" and sys.stderr is not None:
+                timer.report(sys.stderr)
+            else:
+                path = "startup_timing.txt" if args.startup_timing == "-" else args.startup_timing
+                with open(path, "w") as f:
+                    timer.report(f)
+            root.destroy()
+    app.load_journal(timer, on_done=loaded)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    hiddenimports=['data_manager', 'analytics', 'cube', 'marking', 'exposure', 'expiries', 'snapshot'],  # imported by name after the window is up (gui.load_journal)
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,283 @@
+from tkinter import ttk
+
+# Open Trades list: (heading, journal field)
+OPEN_TRADE_COLUMNS = [
+    ("ID", "Trade_ID"), ("Date", "Entry_Date"), ("Symbol", "Symbol"),
+    ("Strategy", "Strategy"), ("Lots", "Lots"), ("Spread Price", "Spread_Entry_Price"),
+]
+
+# Expiry columns (Entry_Date + DTE_Entry, and calendar days until then), from expiries.ExpiryIndex
+EXPIRY_COLUMNS = [("Expiry", "Expiry"), ("Days Left", "Days_Left")]
+
+# Extra columns while a quote feed is marking the open trades (from marking.MARK_FIELDS)
+MARK_COLUMNS = [
+    ("Mark", "Mark"), ("Unrealized", "Unrealized_PnL"), ("Risk %", "Risk_Utilization_%"),
+    ("Target %", "Target_Progress_%"),
+]
+_MARK_POSITIONS = [0, 1, 2, 4]  # where each MARK_COLUMNS field sits in a marking.MARK_FIELDS tuple
+
+
+def with_expiry(rows, dates, today):
+    """
+    Appends the EXPIRY_COLUMNS cells to rows ({Trade_ID: values}) from dates
+    ({Trade_ID: expiry date}); None where a trade has no expiry.
+    """
+    out = {}
+    for trade_id, values in rows.items():
+        expiry = dates.get(trade_id)
+        if expiry is None:
+            out[trade_id] = values + (None, None)
+        else:
+            out[trade_id] = values + (expiry.isoformat(), (expiry - today).days)
+    return out
+
+
+def with_marks(rows, marks):
+    """
+    Appends the MARK_COLUMNS cells to rows ({Trade_ID: values}) from marks
+    ({Trade_ID: marking.MARK_FIELDS tuple}), rounded to cents; None where a
+    trade has no mark yet.
+    """
+    blank = (None,) * len(MARK_COLUMNS)
+    out = {}
+    for trade_id, values in rows.items():
+        mark = marks.get(trade_id)
+        if mark is None:
+            out[trade_id] = values + blank
+        else:
+            out[trade_id] = values + tuple(None if mark[i] != mark[i] else round(mark[i], 2) for i in _MARK_POSITIONS)
+    return out
+
+
+def rows_from_frame(df, columns=OPEN_TRADE_COLUMNS):
+    """
+    Turns a DataFrame of trades into {Trade_ID: tuple of cell values} for
+    OpenTradesModel. Missing values become None and dates YYYY-MM-DD text.
+    Works column by column, so it is cheap enough to run on the I/O thread.
+    """
+    import pandas as pd  # not at module level: the GUI imports this module before pandas is needed
+    
+    if df.empty:
+        return {}
+    cells = []
+    for _, field in columns:
+        col = df[field]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            values = col.dt.strftime("%Y-%m-%d")
+        else:
+            values = col.astype(object)
+        cells.append(values.where(col.notna(), None).tolist())
+    ids = pd.to_numeric(df['Trade_ID'], errors='coerce').tolist()
+    return {int(i): row for i, row in zip(ids, zip(*cells)) if i == i}
+
+
+class OpenTradesModel:
+    """
+    The rows behind the Open Trades list, kept in memory.
+
+    update() diffs a new set of rows against the current ones by Trade_ID,
+    so only inserted, removed or changed trades are touched. Sorting and
+    filtering work on the rows in memory; window() returns the slice the
+    view actually shows.
+    """
+
+    def __init__(self, columns=OPEN_TRADE_COLUMNS):
+        self.headings = [heading for heading, _ in columns]
+        self.rows = {}
+        self.sort_column = 0
+        self.descending = False
+        self.filter_text = ""
+        self._order = None
+
+    def update(self, rows):
+        """
+        Replaces the rows with `rows` ({Trade_ID: values}).
+        Returns (added, removed, changed) Trade_ID lists.
+        """
+        added = [i for i in rows if i not in self.rows]
+        removed = [i for i in self.rows if i not in rows]
+        changed = [i for i, values in rows.items() if i in self.rows and self.rows[i] != values]
+        if added or removed or changed:
+            for i in removed:
+                del self.rows[i]
+            for i in added + changed:
+                self.rows[i] = rows[i]
+            self._order = None
+        return added, removed, changed
+
+    def remove(self, trade_ids):
+        for i in trade_ids:
+            self.rows.pop(i, None)
+        self._order = None
+
+    def sort_by(self, column):
+        """Sorts by column index; sorting by the same column again reverses the order."""
+        if column == self.sort_column:
+            self.descending = not self.descending
+        else:
+            self.sort_column, self.descending = column, False
+        self._order = None
+
+    def set_filter(self, text):
+        """Only shows rows where some cell contains text (case-insensitive)."""
+        self.filter_text = text.strip().lower()
+        self._order = None
+
+    def _matches(self, values):
+        return any(self.filter_text in str(v).lower() for v in values if v is not None)
+
+    @property
+    def order(self):
+        """Trade_IDs of the rows that pass the filter, in display order."""
+        if self._order is None:
+            ids = list(self.rows)
+            if self.filter_text:
+                ids = [i for i in ids if self._matches(self.rows[i])]
+            col = self.sort_column
+            missing = [i for i in ids if self.rows[i][col] is None]
+            present = [i for i in ids if self.rows[i][col] is not None]
+            # Numbers before text, so the two are never compared with each other
+            present.sort(key=lambda i: (isinstance(self.rows[i][col], str), self.rows[i][col], i),
+                         reverse=self.descending)
+            self._order = present + missing  # missing values last either way
+        return self._order
+
+    def __len__(self):
+        return len(self.order)
+
+    def window(self, start, count):
+        """Returns [(Trade_ID, values)] for up to count rows from position start."""
+        return [(i, self.rows[i]) for i in self.order[start:start + count]]
+
+
+class VirtualTreeview(ttk.Frame):
+    """
+    A Treeview that only holds the rows currently on screen.
+
+    Scrolling re-renders the visible window from an OpenTradesModel,
+    updating the items in place by Trade_ID, so the widget's cost doesn't
+    grow with the number of open trades. Clicking a heading sorts. The
+    selection is tracked by Trade_ID, so it survives scrolling, sorting and
+    filtering; on_select(ids) is called when it changes.
+    """
+
+    DEFAULT_ROW_HEIGHT = 20
+    HEADER_HEIGHT = 25
+
+    def __init__(self, parent, model, on_select=None, **tree_options):
+        super().__init__(parent)
+        self.model = model
+        self.on_select = on_select
+        self.top = 0
+        self.selected_ids = set()
+        self.visible_rows = tree_options.get("height", 10)
+
+        self.tree = ttk.Treeview(self, columns=model.headings, show="headings", **tree_options)
+        for i, heading in enumerate(model.headings):
+            self.tree.heading(heading, text=heading, command=lambda i=i: self.sort_by(i))
+            self.tree.column(heading, width=100)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", lambda e: self.yview("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.tree.bind("<Button-4>", lambda e: self.yview("scroll", -1, "units"))
+        self.tree.bind("<Button-5>", lambda e: self.yview("scroll", 1, "units"))
+        self.tree.bind("<Prior>", lambda e: self.yview("scroll", -1, "pages"))
+        self.tree.bind("<Next>", lambda e: self.yview("scroll", 1, "pages"))
+
+    def _on_resize(self, event):
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or self.DEFAULT_ROW_HEIGHT)
+        rows = max(1, (event.height - self.HEADER_HEIGHT) // row_height)
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self.render()
+
+    def yview(self, *args):
+        """Scrollbar/scroll-wheel protocol: ("moveto", fraction) or ("scroll", n, "units"|"pages")."""
+        total = len(self.model)
+        if args[0] == "moveto":
+            top = int(float(args[1]) * total)
+        else:
+            step = self.visible_rows if args[2] == "pages" else 1
+            top = self.top + int(args[1]) * step
+        self.top = max(0, min(top, total - self.visible_rows))
+        self.render()
+        return "break"
+
+    def sort_by(self, column):
+        self.model.sort_by(column)
+        for i, heading in enumerate(self.model.headings):
+            arrow = (" ▼" if self.model.descending else " ▲") if i == column else ""
+            self.tree.heading(heading, text=heading + arrow)
+        self.render()
+
+    def set_filter(self, text):
+        self.model.set_filter(text)
+        self.top = 0
+        self._set_selection(self.selected_ids)  # rows filtered out are deselected
+        self.render()
+
+    def set_rows(self, rows):
+        """Applies a new set of rows ({Trade_ID: values}) as a diff and re-renders."""
+        changes = self.model.update(rows)
+        self._set_selection(self.selected_ids)
+        self.render()
+        return changes
+
+    def remove(self, trade_ids):
+        self.model.remove(trade_ids)
+        self._set_selection(self.selected_ids)
+        self.render()
+
+    def select(self, trade_ids):
+        """Selects these trades (those the filter shows) and scrolls the first of them into view."""
+        self._set_selection(trade_ids)
+        positions = [pos for pos, i in enumerate(self.model.order) if i in self.selected_ids]
+        if positions and not self.top <= positions[0] < self.top + self.visible_rows:
+            self.top = positions[0]
+        self.render()
+
+    def render(self):
+        """Brings the Treeview items in line with the model's visible window."""
+        total = len(self.model)
+        self.top = max(0, min(self.top, total - self.visible_rows))
+        window = self.model.window(self.top, self.visible_rows + 1)  # +1: a partly visible last row
+        wanted = [str(i) for i, _ in window]
+
+        current = set(self.tree.get_children())
+        stale = current.difference(wanted)
+        if stale:
+            self.tree.delete(*stale)
+        for pos, (iid, (_, values)) in enumerate(zip(wanted, window)):
+            cells = ["" if v is None else v for v in values]
+            if iid in current:
+                if list(self.tree.item(iid, "values")) != [str(c) for c in cells]:
+                    self.tree.item(iid, values=cells)
+                if self.tree.index(iid) != pos:
+                    self.tree.move(iid, "", pos)
+            else:
+                self.tree.insert("", pos, iid=iid, values=cells)
+
+        selected = [iid for iid in wanted if int(iid) in self.selected_ids]
+        if set(self.tree.selection()) != set(selected):
+            self.tree.selection_set(selected)
+
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.visible_rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _on_tree_select(self, event):
+        visible = {int(iid) for iid in self.tree.get_children()}
+        chosen = {int(iid) for iid in self.tree.selection()}
+        self._set_selection((self.selected_ids - visible) | chosen)
+
+    def _set_selection(self, selected):
+        selected = set(selected).intersection(self.model.order)
+        if selected != self.selected_ids:
+            self.selected_ids = selected
+            if self.on_select is not None:
+                self.on_select(sorted(selected))
@@ -0,0 +1,111 @@
+"""
+Input rules for new trades and exits.
+
+The GUI forms, bulk_import and batch closes all go through these, so a
+trade is accepted or rejected the same way whichever path it comes in by.
+Raw values are usually strings (form fields, CSV cells); blanks count as
+missing.
+"""
+from datetime import datetime
+
+STRATEGIES = ["Credit Spread", "Iron Condor"]
+
+ENTRY_LEGS = {
+    "Credit Spread": ["Short_Leg_Entry", "Long_Leg_Entry"],
+    "Iron Condor": ["Short_Call_Entry", "Long_Call_Entry", "Short_Put_Entry", "Long_Put_Entry"],
+}
+
+EXIT_LEGS = {
+    "Credit Spread": ["Short_Leg_Exit", "Long_Leg_Exit"],
+    "Iron Condor": ["Short_Call_Exit", "Long_Call_Exit", "Short_Put_Exit", "Long_Put_Exit"],
+}
+
+# Fields that must be filled in, and fields that fall back to a default
+REQUIRED_FLOATS = ["Lots", "Width", "Credit_Received", "Max_Loss", "Margin_Used", "Spread_Entry_Price"]
+REQUIRED_INTS = ["DTE_Entry"]
+OPTIONAL_FLOATS = [
+    "Sell_Strike_Delta", "IV_Entry", "IV_Percentile_Entry", "IV_HV_Percent", "VIX_Entry",
+    "Planned_Exit_Percent",
+]
+TEXT_FIELDS = ["Entry_Date", "Symbol", "Strategy", "Direction"]
+EXIT_TEXT_FIELDS = ["Adjustment_Made", "Exit_Emotion", "Rule_Broken", "Rule_Broken_Which"]
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip()) or value != value
+
+
+def _float(raw, field, default=None):
+    value = raw.get(field)
+    if _blank(value):
+        if default is None:
+            raise ValueError(f"{field} is required.")
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field}: could not convert {value!r} to a number.")
+
+
+def _int(raw, field, default=None):
+    value = raw.get(field)
+    if _blank(value):
+        if default is None:
+            raise ValueError(f"{field} is required.")
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field}: could not convert {value!r} to a whole number.")
+
+
+def _date(raw, field):
+    value = _text(raw, field)
+    if not value:
+        raise ValueError(f"{field} is required.")
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{field}: could not read {value!r} as a date (YYYY-MM-DD).")
+    return value
+
+
+def _text(raw, field):
+    value = raw.get(field)
+    return "" if _blank(value) else str(value).strip()
+
+
+def parse_entry(raw):
+    """
+    Validates a new trade and returns the dict save_new_trade expects.
+    raw: dict of field -> value (strings are fine). Raises ValueError.
+    """
+    data = {field: _text(raw, field) for field in TEXT_FIELDS}
+    for field in REQUIRED_FLOATS:
+        data[field] = _float(raw, field)
+    for field in REQUIRED_INTS:
+        data[field] = _int(raw, field)
+    for field in OPTIONAL_FLOATS:
+        data[field] = _float(raw, field, default=0.0)
+    data["Entry_Confidence"] = _int(raw, "Entry_Confidence", default=3)
+
+    # Leg prices for the chosen strategy
+    for field in ENTRY_LEGS.get(data["Strategy"], []):
+        data[field] = _float(raw, field, default=0.0)
+
+    if not data['Symbol'] or not data['Strategy']:
+        raise ValueError("Symbol and Strategy are required.")
+    return data
+
+
+def parse_exit(raw, strategy):
+    """
+    Validates exit data for a trade of the given strategy and returns the
+    dict update_trade_to_closed expects. Raises ValueError.
+    """
+    data = {"Exit_Date": _date(raw, "Exit_Date")}
+    data.update({field: _text(raw, field) for field in EXIT_TEXT_FIELDS})
+    data["Spread_Exit_Price"] = _float(raw, "Spread_Exit_Price")
+    for field in EXIT_LEGS.get(strategy, []):
+        data[field] = _float(raw, field, default=0.0)
+    return data